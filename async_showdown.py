@@ -0,0 +1,199 @@
+import asyncio
+import json
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from showdown_wrapper import _droppable, debug_print
+
+# Blocks kept for ``async for``; callers that only use choose() never drain
+# the queue, so past this point the oldest spectator update is dropped
+MAX_QUEUED_BLOCKS = 256
+
+
+class AsyncShowdownWrapper:
+    """asyncio-native driver for a ``simulate-battle`` process.
+
+    Output is consumed by a reader task on the event loop instead of a
+    thread, so one loop can drive many battles. Iterate the wrapper with
+    ``async for`` to receive complete protocol blocks (lists of lines, as in
+    ShowdownWrapper), and use ``await choose(side, command)`` to send a choice
+    and wait for that side's next request. Past ``MAX_QUEUED_BLOCKS`` queued
+    blocks the oldest spectator ``update`` is dropped; requests, errors and
+    the result are always delivered (the same rule as ProtocolFramer).
+
+        sim = await AsyncShowdownWrapper.create(formatid="gen9randombattle")
+        await sim.send('>player p1 {"name":"P1"}')
+        req = await sim.choose("p1", "move 1")
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", formatid="gen7ou"):
+        self.ps_path = ps_path
+        self.formatid = formatid
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.requests: Dict[str, dict] = {}
+        self.ended = False
+        self._blocks: Deque[Optional[List[str]]] = deque()
+        self._block_ready = asyncio.Event()
+        self.dropped_blocks = 0
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._reader = None
+        self._err_reader = None
+
+    @classmethod
+    async def create(cls, ps_path="pokemon-showdown", formatid="gen7ou", seed=None) -> "AsyncShowdownWrapper":
+        """Spawn the simulator and start a battle in ``formatid`` (seeded with ``seed`` if given)."""
+        self = cls(ps_path, formatid)
+        self.proc = await asyncio.create_subprocess_exec(
+            "node", f"{ps_path}/pokemon-showdown", "simulate-battle",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=1 << 20,  # request JSON lines can be large
+        )
+        self._reader = asyncio.create_task(self._read_stdout())
+        self._err_reader = asyncio.create_task(self._read_stderr())
+        spec = {"formatid": formatid}
+        if seed is not None:
+            spec["seed"] = seed
+        await self.send(">start " + json.dumps(spec, separators=(",", ":")))
+        return self
+
+    async def _read_stdout(self):
+        block: List[str] = []
+        try:
+            while True:
+                raw = await self.proc.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8")
+                block.append(line)
+                if not line.strip():
+                    # Blank line terminates the current block
+                    if len(block) > 1:
+                        self._dispatch(block)
+                    block = []
+        except Exception as e:
+            debug_print(f"Error in async output reader: {e}", "ASYNC")
+        if block:
+            self._dispatch(block)
+        self.ended = True
+        self._resolve_all(None)
+        self._enqueue(None)
+
+    async def _read_stderr(self):
+        try:
+            while True:
+                raw = await self.proc.stderr.readline()
+                if not raw:
+                    break
+                debug_print(f"[stderr] {raw.decode('utf-8', 'replace').strip()}", "ASYNC")
+        except Exception as e:
+            debug_print(f"Error in async error reader: {e}", "ASYNC")
+
+    def _dispatch(self, block: List[str]):
+        """Resolve choose() waiters from a block, then queue it for iteration."""
+        kind = block[0].strip()
+        if kind == "sideupdate" and len(block) > 2:
+            side = block[1].strip()
+            for line in block[2:]:
+                if line.startswith("|request|"):
+                    try:
+                        req = json.loads(line[len("|request|"):])
+                    except json.JSONDecodeError as e:
+                        debug_print(f"Malformed request JSON for {side}: {e}", "ASYNC")
+                        continue
+                    self.requests[side] = req
+                    self._resolve(side, result=req)
+                elif line.startswith("|error|"):
+                    self._resolve(side, error=RuntimeError(line[len("|error|"):].strip()))
+        elif kind == "end":
+            self.ended = True
+            self._resolve_all(None)
+        self._enqueue(block)
+
+    def _enqueue(self, block: Optional[List[str]]):
+        """Queue a block for iteration, dropping the oldest droppable one when full."""
+        blocks = self._blocks
+        if len(blocks) >= MAX_QUEUED_BLOCKS:
+            for i, queued in enumerate(blocks):
+                if queued is not None and _droppable(queued):
+                    del blocks[i]
+                    self.dropped_blocks += 1
+                    debug_print(
+                        f"Block queue full, dropped an update block of {len(queued)} lines "
+                        f"({self.dropped_blocks} dropped so far)",
+                        "ASYNC",
+                    )
+                    break
+        blocks.append(block)
+        self._block_ready.set()
+
+    def _resolve(self, side: str, result=None, error: Optional[Exception] = None):
+        for fut in self._waiters.pop(side, []):
+            if fut.done():
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    def _resolve_all(self, result):
+        for side in list(self._waiters):
+            self._resolve(side, result=result)
+
+    async def send(self, msg: str):
+        if not msg.endswith("\n"):
+            msg += "\n"
+        debug_print(f"Sending: {msg.strip()}", "ASYNC")
+        self.proc.stdin.write(msg.encode("utf-8"))
+        await self.proc.stdin.drain()
+
+    def _register(self, side: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(side, []).append(fut)
+        return fut
+
+    def next_request(self, side: str) -> asyncio.Future:
+        """Future for the next ``|request|`` addressed to ``side``.
+
+        The waiter is registered when this is called, not when it is awaited,
+        so call it before sending whatever triggers the request.
+        """
+        if self.ended:
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(None)
+            return fut
+        return self._register(side)
+
+    async def choose(self, side: str, command: str, timeout: Optional[float] = None) -> Optional[dict]:
+        """Send ``>side command`` and resolve with that side's next request.
+
+        Raises RuntimeError if the simulator rejects the choice; resolves with
+        None once the battle has ended.
+        """
+        if self.ended:
+            return None
+        fut = self._register(side)
+        await self.send(f">{side} {command}")
+        return await asyncio.wait_for(fut, timeout)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> List[str]:
+        while not self._blocks:
+            self._block_ready.clear()
+            await self._block_ready.wait()
+        block = self._blocks.popleft()
+        if block is None:
+            self._enqueue(None)  # keep later iterators terminated too
+            raise StopAsyncIteration
+        return block
+
+    async def close(self):
+        if self.proc and self.proc.returncode is None:
+            try:
+                self.proc.terminate()
+                await self.proc.wait()
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,437 @@
+"""Typed battle state built from simulator protocol lines.
+
+BattleState holds both sides (every Pokemon seen so far, up to six each,
+with HP, status and boosts), side conditions with layer counts, weather,
+terrain and other field effects. BattleState.apply() takes one tokenized
+line (protocol.ProtocolLine) and dispatches on its tag.
+
+Every mutation ORs a CHANGED_* flag into ``changed`` and bumps
+``version``; UIs read and clear the flags with pop_changes(), and
+to_json() rebuilds its dict only when the version has moved.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+CHANGED_P1 = 1
+CHANGED_P2 = 2
+CHANGED_FIELD = 4
+
+HAZARDS = ("Stealth Rock", "Spikes", "Toxic Spikes", "Sticky Web", "G-Max Steelsurge")
+
+
+def parse_actor(token: str) -> Tuple[Optional[str], Optional[str]]:
+    # token like 'p1a: Charizard'
+    if ": " in token:
+        side_part, name = token.split(": ", 1)
+        side = side_part[:2] if side_part.startswith(("p1", "p2")) else None
+        return side, name
+    return None, None
+
+
+def parse_hp_token(
+    tok: str,
+) -> Tuple[Optional[int], Optional[int], Optional[int], bool]:
+    """Parse an HP token from Showdown stream.
+    Returns (hp, maxhp, hp_pct, fainted).
+
+    Handles forms like:
+      - "182/319"
+      - "182/319 slp" (status suffix)
+      - "75/100" (percentage style)
+      - "0 fnt" or "0/352 fnt" (fainted)
+    """
+    if not tok:
+        return None, None, None, False
+    s = tok.strip()
+    # Faint detection first
+    if "fnt" in s:
+        return 0, None, 0, True
+
+    # Keep only the first whitespace-separated token which should be the HP form
+    first = s.split(" ", 1)[0]
+
+    if "/" in first:
+        cur, maximum = first.split("/", 1)
+        try:
+            cur_i = int(cur)
+            max_i = int(maximum)
+        except ValueError:
+            return None, None, None, False
+        # Percentage style like 75/100
+        if max_i == 100:
+            return None, None, cur_i, False  # return percentage only
+        # Absolute style like 182/319
+        pct = int(round((cur_i / max_i) * 100)) if max_i else None
+        return cur_i, max_i, pct, False
+    else:
+        # Single number without '/', treat as current HP if purely numeric (rare)
+        try:
+            return int(first), None, None, False
+        except ValueError:
+            return None, None, None, False
+
+
+def _effect_name(token: str) -> str:
+    # "move: Stealth Rock" -> "Stealth Rock"
+    return token.split("move: ")[-1]
+
+
+@dataclass(slots=True)
+class PokemonState:
+    name: str
+    species: str = ""
+    hp: Optional[int] = None
+    maxhp: Optional[int] = None
+    hp_pct: Optional[int] = None
+    status: Optional[str] = None
+    fainted: bool = False
+    boosts: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def to_json(self) -> dict:
+        return {
+            "name": self.name,
+            "species": self.species,
+            "hp": self.hp,
+            "maxhp": self.maxhp,
+            "hp_pct": self.hp_pct,
+            "status": self.status,
+            "fainted": self.fainted,
+            "boosts": dict(self.boosts),
+        }
+
+
+@dataclass(slots=True)
+class SideState:
+    id: str
+    active: Optional[PokemonState] = None
+    pokemon: Dict[str, PokemonState] = dataclasses.field(default_factory=dict)
+    # Side conditions in the order they started -> layers (Spikes stacks to 3)
+    conditions: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def get(self, name: str) -> PokemonState:
+        """The Pokemon called ``name`` on this side, added the first time it is seen."""
+        mon = self.pokemon.get(name)
+        if mon is None:
+            mon = self.pokemon[name] = PokemonState(name)
+        return mon
+
+    @property
+    def hazards(self) -> Dict[str, int]:
+        return {name: layers for name, layers in self.conditions.items() if name in HAZARDS}
+
+    def to_json(self) -> dict:
+        """The active Pokemon's fields at the top level (what the frontend
+        reads), plus side conditions and the whole team seen so far."""
+        active = self.active
+        return {
+            "name": active.name if active else None,
+            "species": active.species if active else None,
+            "hp": active.hp if active else None,
+            "maxhp": active.maxhp if active else None,
+            "hp_pct": active.hp_pct if active else None,
+            "status": active.status if active else None,
+            "fainted": active.fainted if active else False,
+            "boosts": dict(active.boosts) if active else {},
+            "conditions": list(self.conditions),
+            "hazards": self.hazards,
+            "team": [mon.to_json() for mon in self.pokemon.values()],
+        }
+
+
+@dataclass(slots=True)
+class BattleState:
+    p1: SideState = dataclasses.field(default_factory=lambda: SideState("p1"))
+    p2: SideState = dataclasses.field(default_factory=lambda: SideState("p2"))
+    weather: Optional[str] = None
+    terrain: Optional[str] = None
+    # Field effects (terrain, Trick Room, ...) in the order they started
+    field: List[str] = dataclasses.field(default_factory=list)
+    ended: bool = False
+    changed: int = 0
+    version: int = 0
+    _json: Optional[dict] = dataclasses.field(default=None, repr=False, compare=False)
+    _json_version: int = dataclasses.field(default=-1, repr=False, compare=False)
+
+    def side(self, side_id: Optional[str]) -> Optional[SideState]:
+        if side_id == "p1":
+            return self.p1
+        if side_id == "p2":
+            return self.p2
+        return None
+
+    def mark(self, flag: int) -> bool:
+        self.changed |= flag
+        self.version += 1
+        return True
+
+    def pop_changes(self) -> int:
+        """CHANGED_* flags set since the last call, clearing them."""
+        changed, self.changed = self.changed, 0
+        return changed
+
+    def apply(self, event) -> bool:
+        """Apply one tokenized protocol line; True if the state changed."""
+        handler = STATE_HANDLERS.get(event.tag)
+        if handler is None:
+            return False
+        min_args, update = handler
+        if len(event.args) < min_args:
+            return False
+        return update(self, event.tag, event.args)
+
+    def to_json(self) -> dict:
+        """JSON-ready dict (``battle.p1/p2`` with name, hp, maxhp, hp_pct, status,
+        fainted). Cached until the next change, so do not mutate the result."""
+        if self._json_version != self.version:
+            self._json = {
+                "p1": self.p1.to_json(),
+                "p2": self.p2.to_json(),
+                "field": list(self.field),
+                "weather": self.weather,
+                "terrain": self.terrain,
+                "ended": self.ended,
+            }
+            self._json_version = self.version
+        return self._json
+
+
+_SIDE_FLAGS = {"p1": CHANGED_P1, "p2": CHANGED_P2}
+
+
+def _actor(battle: BattleState, token: str) -> Tuple[Optional[SideState], Optional[PokemonState]]:
+    # Same result as parse_actor() + side(), without the intermediate tuple
+    prefix, _, name = token.partition(": ")
+    if not name:
+        return None, None
+    side = battle.p1 if prefix[:2] == "p1" else battle.p2 if prefix[:2] == "p2" else None
+    if side is None:
+        return None, None
+    mon = side.pokemon.get(name)
+    return side, mon if mon is not None else side.get(name)
+
+
+def _set_hp(battle: BattleState, side: SideState, mon: PokemonState, token: str) -> bool:
+    # Inlined parse_hp_token(): "182/319", "182/319 slp", "75/100", "0 fnt"
+    if "fnt" in token:
+        new = (0, mon.maxhp, 0, True)
+    else:
+        cur, _, rest = token.partition("/")
+        try:
+            hp = int(cur)
+            maxhp = int(rest.partition(" ")[0])
+        except ValueError:
+            return False
+        if maxhp == 100:
+            # Percentage HP; keep a known absolute maxhp and derive hp from it
+            new = (int(round(hp * mon.maxhp / 100)) if mon.maxhp else mon.hp, mon.maxhp, hp, False)
+        elif maxhp:
+            # Absolute HP (the owning player's view)
+            new = (hp, maxhp, int(round(hp * 100 / maxhp)), False)
+        else:
+            return False
+    if (mon.hp, mon.maxhp, mon.hp_pct, mon.fainted) == new:
+        return False
+    mon.hp, mon.maxhp, mon.hp_pct, mon.fainted = new
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_ended(battle: BattleState, tag: str, args: List[str]) -> bool:
+    if battle.ended:
+        return False
+    battle.ended = True
+    return battle.mark(CHANGED_FIELD)
+
+
+def _on_weather(battle: BattleState, tag: str, args: List[str]) -> bool:
+    weather = None if args[0] == "none" else args[0]
+    if args[0] == "upkeep" or weather == battle.weather:
+        return False
+    battle.weather = weather
+    return battle.mark(CHANGED_FIELD)
+
+
+def _on_field(battle: BattleState, tag: str, args: List[str]) -> bool:
+    effect = _effect_name(args[0])
+    is_terrain = effect.endswith("Terrain")
+    if tag == "-fieldstart":
+        if effect in battle.field:
+            return False
+        if is_terrain:
+            # A new terrain replaces the old one
+            if battle.terrain in battle.field:
+                battle.field.remove(battle.terrain)
+            battle.terrain = effect
+        battle.field.append(effect)
+        return battle.mark(CHANGED_FIELD)
+    if effect not in battle.field:
+        return False
+    battle.field.remove(effect)
+    if battle.terrain == effect:
+        battle.terrain = None
+    return battle.mark(CHANGED_FIELD)
+
+
+def _on_side_condition(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side = battle.side(args[0][:2])
+    if side is None:
+        return False
+    effect = _effect_name(args[1])
+    if tag == "-sidestart":
+        side.conditions[effect] = side.conditions.get(effect, 0) + 1
+    elif effect in side.conditions:
+        del side.conditions[effect]
+    else:
+        return False
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_switch(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    if side is None:
+        return False
+    changed = False
+    if side.active is not mon:
+        if side.active is not None:
+            # Boosts do not survive switching out
+            side.active.boosts.clear()
+        side.active = mon
+        mon.fainted = False
+        changed = True
+    if len(args) >= 2 and not mon.species:
+        mon.species = args[1].split(",", 1)[0]
+        changed = True
+    if len(args) >= 3:
+        # "182/319 tox": the status rides along with the HP
+        hp, _, status = args[2].partition(" ")
+        if mon.status != (status or None) and status != "fnt":
+            mon.status = status or None
+            changed = True
+        if _set_hp(battle, side, mon, args[2]):
+            return True
+    return changed and battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_hp(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    if side is None:
+        return False
+    return _set_hp(battle, side, mon, args[1])
+
+
+def _on_faint(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    if side is None or mon.fainted:
+        return False
+    mon.fainted = True
+    mon.hp = 0
+    mon.hp_pct = 0
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_status(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    status = args[1] if tag == "-status" else None
+    if side is None or mon.status == status:
+        return False
+    mon.status = status
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_cure_team(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, _ = _actor(battle, args[0])
+    if side is None or not any(mon.status for mon in side.pokemon.values()):
+        return False
+    for mon in side.pokemon.values():
+        mon.status = None
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_boost(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    try:
+        amount = int(args[2])
+    except ValueError:
+        return False
+    if side is None:
+        return False
+    stat = args[1]
+    if tag == "-setboost":
+        value = amount
+    else:
+        value = mon.boosts.get(stat, 0) + (amount if tag == "-boost" else -amount)
+    value = max(-6, min(6, value))
+    if mon.boosts.get(stat, 0) == value:
+        return False
+    if value:
+        mon.boosts[stat] = value
+    else:
+        mon.boosts.pop(stat, None)
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_clear_boost(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    if side is None or not mon.boosts:
+        return False
+    if tag == "-clearnegativeboost":
+        kept = {stat: value for stat, value in mon.boosts.items() if value > 0}
+    elif tag == "-clearpositiveboost":
+        kept = {stat: value for stat, value in mon.boosts.items() if value < 0}
+    else:
+        kept = {}
+    if kept == mon.boosts:
+        return False
+    mon.boosts = kept
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+def _on_clear_all_boosts(battle: BattleState, tag: str, args: List[str]) -> bool:
+    changed = False
+    for side in (battle.p1, battle.p2):
+        if side.active is not None and side.active.boosts:
+            side.active.boosts.clear()
+            changed = battle.mark(_SIDE_FLAGS[side.id])
+    return changed
+
+
+def _on_details_change(battle: BattleState, tag: str, args: List[str]) -> bool:
+    side, mon = _actor(battle, args[0])
+    if side is None:
+        return False
+    species = args[1].split(",", 1)[0]
+    if mon.species == species:
+        return False
+    mon.species = species
+    return battle.mark(_SIDE_FLAGS[side.id])
+
+
+# tag -> (minimum number of arguments, handler(battle, tag, args) -> changed)
+STATE_HANDLERS = {
+    "win": (0, _on_ended),
+    "tie": (0, _on_ended),
+    "-weather": (1, _on_weather),
+    "-fieldstart": (1, _on_field),
+    "-fieldend": (1, _on_field),
+    "-sidestart": (2, _on_side_condition),
+    "-sideend": (2, _on_side_condition),
+    "switch": (1, _on_switch),
+    "drag": (1, _on_switch),
+    "-damage": (2, _on_hp),
+    "-heal": (2, _on_hp),
+    "-sethp": (2, _on_hp),
+    "faint": (1, _on_faint),
+    "-status": (2, _on_status),
+    "-curestatus": (1, _on_status),
+    "-cureteam": (1, _on_cure_team),
+    "-boost": (3, _on_boost),
+    "-unboost": (3, _on_boost),
+    "-setboost": (3, _on_boost),
+    "-clearboost": (1, _on_clear_boost),
+    "-clearnegativeboost": (1, _on_clear_boost),
+    "-clearpositiveboost": (1, _on_clear_boost),
+    "-clearallboost": (0, _on_clear_all_boosts),
+    "detailschange": (2, _on_details_change),
+    "-formechange": (2, _on_details_change),
+}
@@ -0,0 +1,501 @@
+"""The battle-line consumers as they were before protocol.py (user-016).
+
+A frozen copy of cli.py's raw-string ``_update_battle_state_from_line`` and
+``_humanize_line`` (with the helpers they call), so protocol_bench.py can
+measure the pre-tokenizer code on any tree. Do not fix or optimize this
+file: it is the baseline, not live code.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import showdown_wrapper
+
+
+def debug_print(msg: str, prefix: str = "DEBUG"):
+    """Print debug messages if debugging is enabled"""
+    if showdown_wrapper.DEBUG:
+        print(f"[{prefix}] {msg}")
+
+
+BattleSide = Dict[str, Optional[object]]  # name, hp, maxhp, status, fainted
+
+
+def _new_battle_state() -> Dict[str, BattleSide]:
+    return {
+        "p1": {
+            "name": None,
+            "hp": None,
+            "maxhp": None,
+            "hp_pct": None,
+            "status": None,
+            "fainted": False,
+        },
+        "p2": {
+            "name": None,
+            "hp": None,
+            "maxhp": None,
+            "hp_pct": None,
+            "status": None,
+            "fainted": False,
+            "conditions": [],
+        },
+        "field": [],
+        "weather": None,
+        "ended": False,
+    }
+
+
+def _parse_actor(token: str) -> Tuple[Optional[str], Optional[str]]:
+    # token like 'p1a: Charizard'
+    if ": " in token:
+        side_part, name = token.split(": ", 1)
+        side = side_part[:2] if side_part.startswith(("p1", "p2")) else None
+        return side, name
+    return None, None
+
+
+def _parse_hp_token(
+    tok: str,
+) -> Tuple[Optional[int], Optional[int], Optional[int], bool]:
+    """Parse an HP token from Showdown stream.
+    Returns (hp, maxhp, hp_pct, fainted).
+
+    Handles forms like:
+      - "182/319"
+      - "182/319 slp" (status suffix)
+      - "75/100" (percentage style)
+      - "0 fnt" or "0/352 fnt" (fainted)
+    """
+    if not tok:
+        return None, None, None, False
+    s = tok.strip()
+    # Faint detection first
+    if "fnt" in s:
+        return 0, None, 0, True
+
+    # Remove any trailing annotations (status, brackets info, etc.)
+    # Keep only the first whitespace-separated token which should be the HP form
+    first = s.split(" ", 1)[0]
+
+    # Now parse the HP form
+    if "/" in first:
+        cur, maximum = first.split("/", 1)
+        try:
+            cur_i = int(cur)
+            max_i = int(maximum)
+        except ValueError:
+            return None, None, None, False
+        # Percentage style like 75/100
+        if max_i == 100:
+            return None, None, cur_i, False  # return percentage only
+        # Absolute style like 182/319
+        pct = int(round((cur_i / max_i) * 100)) if max_i else None
+        return cur_i, max_i, pct, False
+    else:
+        # Single number without '/', treat as current HP if purely numeric (rare)
+        try:
+            cur_i = int(first)
+            # Without a max, we can't compute pct; leave unknown
+            return cur_i, None, None, False
+        except ValueError:
+            return None, None, None, False
+
+
+def _update_battle_state_from_line(
+    line: str, battle: Dict[str, BattleSide]
+) -> Tuple[bool, bool]:
+    """Update battle state from a battle line. Returns (changed, error_detected)."""
+    debug_print(f"Processing battle line: {line.strip()}", "BATTLE_STATE")
+    changed = False
+    error_detected = False
+    if not line or "|" not in line:
+        return False, False
+    parts = line.strip().split("|")
+    # parts[0] is '' usually for battle messages
+    if len(parts) < 2:
+        return False, False
+    tag = parts[1]
+    debug_print(f"Battle tag: {tag}, parts: {len(parts)}", "BATTLE_STATE")
+
+    # Handle error messages
+    if tag == "error" and len(parts) >= 3:
+        error_msg = parts[2]
+        debug_print(f"Battle error detected: {error_msg}", "BATTLE_STATE")
+        error_detected = True
+
+    # Handle win/tie
+    if tag in ("win", "tie"):
+        battle["ended"] = True
+        changed = True
+
+    # Handle weather and field conditions
+    if tag == "-weather" and len(parts) >= 3:
+        weather = parts[2]
+        if weather == "none" or weather == "upkeep":
+            pass # Keep it, or maybe 'none' clears it
+            if weather == "none":
+                battle["weather"] = None
+        else:
+            battle["weather"] = weather
+        changed = True
+
+    if tag == "-fieldstart" and len(parts) >= 3:
+        effect = parts[2].split("move: ")[-1] if "move: " in parts[2] else parts[2]
+        if "field" not in battle: battle["field"] = []
+        if effect not in battle["field"]:
+            battle["field"].append(effect)
+            changed = True
+            
+    if tag == "-fieldend" and len(parts) >= 3:
+        effect = parts[2].split("move: ")[-1] if "move: " in parts[2] else parts[2]
+        if "field" not in battle: battle["field"] = []
+        if effect in battle["field"]:
+            battle["field"].remove(effect)
+            changed = True
+
+    if tag == "-sidestart" and len(parts) >= 4:
+        side = parts[2][:2] # p1 or p2
+        effect = parts[3].split("move: ")[-1] if "move: " in parts[3] else parts[3]
+        if side in battle:
+            if "conditions" not in battle[side]: battle[side]["conditions"] = []
+            if effect not in battle[side]["conditions"]:
+                battle[side]["conditions"].append(effect)
+                changed = True
+
+    if tag == "-sideend" and len(parts) >= 4:
+        side = parts[2][:2]
+        effect = parts[3].split("move: ")[-1] if "move: " in parts[3] else parts[3]
+        if side in battle:
+            if "conditions" not in battle[side]: battle[side]["conditions"] = []
+            if effect in battle[side]["conditions"]:
+                battle[side]["conditions"].remove(effect)
+                changed = True
+
+    # Handle successful moves (reset AI error count)
+    if tag == "move" and len(parts) >= 3:
+        side, _ = _parse_actor(parts[2])
+        if side == "p2":
+            # AI successfully made a move, reset error count
+            debug_print("AI move successful, resetting error count", "BATTLE_STATE")
+            # Note: We can't directly access ai_error_count here, will handle in caller
+
+    if tag in ("switch", "drag") and len(parts) >= 3:
+        side, name = _parse_actor(parts[2])
+        debug_print(f"Pokemon switch/drag - Side: {side}, Name: {name}", "BATTLE_STATE")
+        if side in battle and name:
+            if battle[side].get("name") != name:
+                battle[side]["name"] = name
+                # Reset status on switch to avoid carrying over from previous Pokemon
+                if battle[side].get("status") is not None:
+                    battle[side]["status"] = None
+                # keep hp until we get a proper hp token; reset fainted
+                battle[side]["fainted"] = False
+                changed = True
+            # switch lines often include an HP token at parts[4]
+            if len(parts) >= 5:
+                hp, maxhp, hp_pct, fainted = _parse_hp_token(parts[4])
+                if fainted:
+                    if battle[side].get("fainted") is not True:
+                        battle[side]["fainted"] = True
+                        battle[side]["hp"] = 0
+                        changed = True
+                else:
+                    # For switch lines, we get both absolute and percentage HP
+                    # The first line usually has absolute HP, second has percentage
+                    if hp is not None and maxhp is not None and maxhp != 100:
+                        # This is absolute HP
+                        if battle[side].get("hp") != hp:
+                            battle[side]["hp"] = hp
+                            changed = True
+                        if battle[side].get("maxhp") != maxhp:
+                            battle[side]["maxhp"] = maxhp
+                            changed = True
+                        if hp_pct is not None and battle[side].get("hp_pct") != hp_pct:
+                            battle[side]["hp_pct"] = hp_pct
+                            changed = True
+                    elif hp_pct is not None and maxhp == 100:
+                        # This is percentage HP, don't overwrite maxhp if we already have absolute
+                        if battle[side].get("hp_pct") != hp_pct:
+                            battle[side]["hp_pct"] = hp_pct
+                            changed = True
+                        # Update absolute HP if we know maxhp
+                        known_max = battle[side].get("maxhp")
+                        if known_max and known_max != 100:
+                            abs_hp = int(round(hp_pct * known_max / 100))
+                            if battle[side].get("hp") != abs_hp:
+                                battle[side]["hp"] = abs_hp
+                                changed = True
+    elif tag in ("-damage", "-heal", "-sethp") and len(parts) >= 4:
+        side, _ = _parse_actor(parts[2])
+        debug_print(f"HP change - Side: {side}, Tag: {tag}", "BATTLE_STATE")
+        if side in battle:
+            hp, maxhp, hp_pct, fainted = _parse_hp_token(parts[3])
+            debug_print(
+                f"HP token parsed - HP: {hp}, MaxHP: {maxhp}, Fainted: {fainted}",
+                "BATTLE_STATE",
+            )
+            if fainted:
+                if battle[side].get("fainted") is not True:
+                    battle[side]["fainted"] = True
+                    battle[side]["hp"] = 0
+                    changed = True
+            else:
+                known_max = battle[side].get("maxhp")
+                # Handle percentage-style reports like 71/100
+                if hp_pct is not None and known_max and hp is None:
+                    # This is a percentage update, convert to absolute
+                    abs_hp = int(round(hp_pct * known_max / 100))
+                    if battle[side].get("hp") != abs_hp:
+                        battle[side]["hp"] = abs_hp
+                        changed = True
+                    if battle[side].get("hp_pct") != hp_pct:
+                        battle[side]["hp_pct"] = hp_pct
+                        changed = True
+                elif hp is not None and maxhp is not None:
+                    # Absolute HP update
+                    if battle[side].get("hp") != hp:
+                        battle[side]["hp"] = hp
+                        changed = True
+                    if battle[side].get("maxhp") != maxhp:
+                        battle[side]["maxhp"] = maxhp
+                        changed = True
+                    if hp_pct is not None and battle[side].get("hp_pct") != hp_pct:
+                        battle[side]["hp_pct"] = hp_pct
+                        changed = True
+    elif tag == "faint" and len(parts) >= 3:
+        side, _ = _parse_actor(parts[2])
+        if side in battle and battle[side].get("fainted") is not True:
+            battle[side]["fainted"] = True
+            battle[side]["hp"] = 0
+            changed = True
+    elif tag == "-status" and len(parts) >= 4:
+        side, _ = _parse_actor(parts[2])
+        status = parts[3]
+        if side in battle and battle[side].get("status") != status:
+            battle[side]["status"] = status
+            changed = True
+    elif tag == "-curestatus" and len(parts) >= 4:
+        side, _ = _parse_actor(parts[2])
+        if side in battle and battle[side].get("status") is not None:
+            battle[side]["status"] = None
+            changed = True
+    return changed, error_detected
+
+
+def _side_label(side: Optional[str]) -> str:
+    return side.upper() if side in ("p1", "p2") else "?"
+
+
+def _humanize_line(line: str) -> Optional[str]:
+    if "|" not in line:
+        return None
+    parts = line.strip().split("|")
+    if len(parts) < 2:
+        return None
+    tag = parts[1]
+
+    # Skip empty or technical messages
+    if tag in (
+        "",
+        "t:",
+        "gametype",
+        "gen",
+        "tier",
+        "rule",
+        "clearpoke",
+        "poke",
+        "teampreview",
+        "sideupdate",
+        "split",
+        "teamsize",
+        "start",
+        "upkeep",
+        "request",
+    ):
+        return None
+
+    if tag == "turn" and len(parts) >= 3:
+        return f"-- Turn {parts[2]} --"
+    if tag == "move" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        move = parts[3]
+        target = None
+        if len(parts) >= 5:
+            _, target_name = _parse_actor(parts[4])
+            target = target_name
+        base = f"{_side_label(side)} {name} used {move}"
+        if target:
+            base += f" on {target}"
+        return base
+    if tag in ("-supereffective", "-resisted", "-crit", "-miss", "-immune", "-fail"):
+        mapping = {
+            "-supereffective": "It's super effective!",
+            "-resisted": "It's not very effective...",
+            "-crit": "A critical hit!",
+            "-miss": "It missed!",
+            "-immune": "It had no effect.",
+            "-fail": "But it failed!",
+        }
+        return mapping.get(tag)
+    if tag in ("-damage", "-heal", "-sethp") and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        hp = parts[3]
+        if "fnt" in hp:
+            return f"{name} fainted!"
+        # Skip percentage-only updates to reduce noise
+        if hp.endswith("/100"):
+            return None
+        return f"{name}: {hp}"
+    if tag in ("-residual", "-recoil", "-drain") and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        if tag == "-residual":
+            return f"{name} was hurt by residual damage!"
+        if tag == "-recoil":
+            return f"{name} was hurt by recoil!"
+        if tag == "-drain":
+            return f"{name} absorbed health!"
+    if tag == "faint" and len(parts) >= 3:
+        _, name = _parse_actor(parts[2])
+        return f"{name} fainted!"
+    if tag in ("switch", "drag") and len(parts) >= 3:
+        side, name = _parse_actor(parts[2])
+        verb = "sent out" if tag == "switch" else "was dragged out"
+        msg = f"{_side_label(side)} {verb} {name}"
+        if len(parts) >= 5:
+            hp = parts[4]
+            if hp:
+                msg += f" ({hp})"
+        return msg
+    if tag == "mega" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        return f"{name} Mega-Evolved!"
+    if tag == "-formechange" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        new_form = parts[3]
+        return f"{name} transformed into {new_form}!"
+    if tag == "detailschange" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        details = parts[3]
+        return f"{name} changed to {details}!"
+    if tag == "-boost" and len(parts) >= 5:
+        side, name = _parse_actor(parts[2])
+        stat = parts[3]
+        amount = parts[4]
+        levels = "sharply " if int(amount) >= 2 else ""
+        return f"{name}'s {stat} {levels}rose!"
+    if tag == "-unboost" and len(parts) >= 5:
+        side, name = _parse_actor(parts[2])
+        stat = parts[3]
+        amount = parts[4]
+        levels = "sharply " if int(amount) >= 2 else ""
+        return f"{name}'s {stat} {levels}fell!"
+    if tag == "-clearboost" and len(parts) >= 3:
+        side, name = _parse_actor(parts[2])
+        return f"{name}'s stat changes were cleared!"
+    if tag == "-clearallboost":
+        return "All stat changes were reset!"
+    if tag == "-status" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        status = parts[3]
+        status_names = {
+            "par": "paralyzed",
+            "slp": "asleep",
+            "frz": "frozen",
+            "brn": "burned",
+            "psn": "poisoned",
+            "tox": "badly poisoned",
+        }
+        status_text = status_names.get(status, status)
+        return f"{name} was {status_text}!"
+    if tag == "-curestatus" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        status = parts[3]
+        return f"{name} was cured of {status}!"
+    if tag == "-start" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        effect = parts[3]
+        if effect == "typechange" and len(parts) >= 5:
+            return f"{name} became {parts[4]} type!"
+        elif "ability:" in effect:
+            ability_name = effect.split("ability: ")[1]
+            return f"{name}'s {ability_name} activated!"
+        return f"{name} started {effect}"
+    if tag == "-end" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        effect = parts[3]
+        return f"{name} ended {effect}"
+    if tag == "win" and len(parts) >= 3:
+        return f"🎉 Winner: {parts[2]} 🎉"
+    if tag == "tie":
+        return "The battle ended in a tie!"
+    if tag == "-weather" and len(parts) >= 3:
+        weather = parts[2]
+        weather_names = {
+            "sunnyday": "harsh sunlight",
+            "raindance": "rain",
+            "sandstorm": "sandstorm",
+            "hail": "hail",
+        }
+        weather_text = weather_names.get(weather, weather)
+        return f"The weather became {weather_text}!"
+    if tag == "-fieldstart" and len(parts) >= 3:
+        field_effect = parts[2]
+        if "Stealth Rock" in field_effect:
+            return "Stealth Rock was set up!"
+        elif "Spikes" in field_effect:
+            return "Spikes were set up!"
+        elif "Toxic Spikes" in field_effect:
+            return "Toxic Spikes were set up!"
+        elif "Sticky Web" in field_effect:
+            return "Sticky Web was set up!"
+        return f"Field effect: {field_effect}"
+    if tag == "-fieldend" and len(parts) >= 3:
+        field_effect = parts[2]
+        if "Stealth Rock" in field_effect:
+            return "Stealth Rock was removed!"
+        elif "Spikes" in field_effect:
+            return "Spikes were removed!"
+        elif "Toxic Spikes" in field_effect:
+            return "Toxic Spikes were removed!"
+        elif "Sticky Web" in field_effect:
+            return "Sticky Web was removed!"
+        return f"Field effect ended: {field_effect}"
+    if tag in ("-sidestart", "-sideend") and len(parts) >= 4:
+        side = parts[2]
+        effect = parts[3]
+        if "move:" in effect:
+            effect = effect.split("move: ")[1]
+        if tag == "-sidestart":
+            return f"{effect} protected {_side_label(side)}'s team."
+        return f"{_side_label(side)}'s {effect} wore off."
+    if tag in ("-item", "-enditem") and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        item = parts[3]
+        if tag == "-item":
+            return f"{name} obtained {item}!"
+        return f"{name} consumed its {item}!"
+    if tag in ("-ability", "ability") and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        ability = parts[3]
+        if tag == "ability":
+            return f"{name}'s {ability} was revealed!"
+        return f"{name}'s {ability} activated!"
+    if tag == "cant" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        reason = parts[3]
+        if reason == "flinch":
+            return f"{name} flinched and couldn't move!"
+        elif reason == "par":
+            return f"{name} is paralyzed and can't move!"
+        elif reason == "slp":
+            return f"{name} is fast asleep!"
+        return f"{name} can't move due to {reason}!"
+    if tag == "-activate" and len(parts) >= 4:
+        side, name = _parse_actor(parts[2])
+        effect = parts[3]
+        if "ability:" in effect:
+            ability_name = effect.split("ability: ")[1]
+            return f"{name}'s {ability_name} activated!"
+        return None  # Skip other activation messages as they're often too technical
+
+    return None
@@ -0,0 +1,140 @@
+"""Lines per second through the battle-line consumers, raw vs. pre-tokenized.
+
+Feeds the omniscient channel of recorded simulator output through the
+per-line consumers (battle state, humanized feed and turn/win checks):
+
+  before     the pre-tokenizer consumers (frozen in pre_tokenizer.py)
+  raw        today's consumers, each given the raw line
+  tokenized  each line is split once into a ProtocolLine and shared
+
+Usage (from the repo root):
+  python benchmarks/protocol_bench.py [LOG ...] [--repeat N] [--rounds N]
+
+LOG files hold raw simulator output as read from the process (defaults to
+benchmarks/sample_battle.log). The script only needs cli.py, so it also runs
+on a checkout from before the tokenizer; there, tokenized is skipped and
+before and raw measure the same code.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cli  # noqa: E402
+import pre_tokenizer  # noqa: E402
+
+try:
+    from protocol import tokenize
+except ImportError:
+    tokenize = None
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_battle.log")
+
+
+def omniscient_lines(lines):
+    """The omniscient channel of raw output: update/end payloads, secret halves of |split| pairs."""
+    out = []
+    kind = None
+    split = 0
+    for line in lines:
+        text = line.rstrip("\r\n")
+        if not text:
+            kind = None
+            split = 0
+            continue
+        if kind is None:
+            kind = text
+            continue
+        if kind == "sideupdate":
+            continue
+        if split:
+            # Secret half is kept, public half skipped
+            if split == 2:
+                out.append(line)
+            split -= 1
+            continue
+        if text.startswith("|split|"):
+            split = 2
+            continue
+        out.append(line)
+    return out
+
+
+def load_lines(paths):
+    lines = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(f.readlines())
+    return omniscient_lines(lines)
+
+
+def run_before(lines):
+    battle = pre_tokenizer._new_battle_state()
+    for line in lines:
+        if "|turn|" in line:
+            int(line.split("|turn|")[1].strip())
+        pre_tokenizer._update_battle_state_from_line(line, battle)
+        pre_tokenizer._humanize_line(line)
+        if "|win|" in line:
+            line.split("|win|", 1)[1].strip()
+
+
+def run_raw(lines):
+    battle = cli._new_battle_state()
+    for line in lines:
+        if "|turn|" in line:
+            int(line.split("|turn|")[1].strip())
+        cli._update_battle_state_from_line(line, battle)
+        cli._humanize_line(line)
+        if "|win|" in line:
+            line.split("|win|", 1)[1].strip()
+
+
+def run_tokenized(lines):
+    battle = cli._new_battle_state()
+    for event in tokenize(lines):
+        if event.tag == "turn":
+            int(event.args[0])
+        cli._update_battle_state_from_line(event, battle)
+        cli._humanize_line(event)
+        if event.tag == "win":
+            "|".join(event.args).strip()
+
+
+def bench(runs, lines, repeat, rounds):
+    """Best lines/s per mode; modes take turns every round so machine noise hits them alike."""
+    for run in runs.values():
+        run(lines)  # warm up
+    best = dict.fromkeys(runs, float("inf"))
+    for _ in range(rounds):
+        for name, run in runs.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                run(lines)
+            best[name] = min(best[name], time.perf_counter() - start)
+    return {name: len(lines) * repeat / seconds for name, seconds in best.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("logs", nargs="*", default=[DEFAULT_LOG])
+    parser.add_argument("--repeat", type=int, default=50, help="Passes over the lines per timed round")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed rounds per mode; the best is reported")
+    args = parser.parse_args()
+
+    lines = load_lines(args.logs)
+    print(f"{len(lines)} omniscient lines x {args.repeat}")
+    runs = {"before": run_before, "raw": run_raw}
+    if tokenize is not None:
+        runs["tokenized"] = run_tokenized
+    rates = bench(runs, lines, args.repeat, args.rounds)
+    for name, rate in rates.items():
+        note = f"  ({rate / rates['before']:.2f}x before)" if name != "before" else ""
+        print(f"{name + ':':<10} {rate:>12,.0f} lines/s{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from showdown_wrapper import debug_print
+
+DEFAULT_CACHE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "calc.sqlite3")
+CALC_PACKAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "node_modules", "@smogon", "calc", "package.json")
+
+_NON_ID = re.compile(r"[^a-z0-9]")
+# Request fields that name a species or move; canonicalized like Showdown ids
+_NAME_FIELDS = ("name", "move")
+
+
+def calc_version(package_json=CALC_PACKAGE) -> str:
+    """Installed @smogon/calc version; every cache key depends on it."""
+    try:
+        with open(package_json, "r", encoding="utf-8") as f:
+            return json.load(f).get("version", "")
+    except (OSError, ValueError):
+        return ""
+
+
+def _canonical(value):
+    """Request with ids dropped, names reduced to ids and empty fields removed,
+    so "Fire Blast" and "fireblast" or a missing and an empty ``details`` hit
+    the same entry."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k == "id" or v is None or v == {} or v == []:
+                continue
+            if k in _NAME_FIELDS and isinstance(v, str):
+                out[k] = _NON_ID.sub("", v.lower())
+            elif k == "moves" and isinstance(v, list):
+                out[k] = [_NON_ID.sub("", m.lower()) if isinstance(m, str) else m for m in v]
+            else:
+                out[k] = _canonical(v)
+        return out
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    return value
+
+
+class CalcCache:
+    """Memoizes calc server answers by request.
+
+    Keys are sha256(canonical request, @smogon/calc version). A bounded
+    in-memory LRU sits in front of an optional sqlite store that any number
+    of processes can share; the store drops everything when it is opened
+    with a different calc version.
+    """
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_CACHE_DB, max_entries=4096, version=None):
+        self.version = calc_version() if version is None else version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                self._db = self._open(db_path)
+            except (OSError, sqlite3.Error) as e:
+                debug_print(f"Calc cache store unavailable, memory only: {e}", "CALC_CACHE")
+
+    def _open(self, db_path: str) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        db = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS calcs (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL)")
+        row = db.execute("SELECT value FROM meta WHERE name = 'calc_version'").fetchone()
+        if row is None or row[0] != self.version:
+            with db:
+                db.execute("DELETE FROM calcs")
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('calc_version', ?)", (self.version,))
+            debug_print(f"Calc cache reset for @smogon/calc {self.version or '?'}", "CALC_CACHE")
+        return db
+
+    def key(self, op: str, request: dict) -> str:
+        canonical = json.dumps([op, _canonical(request), self.version], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """A copy of the cached response for ``key`` (see key()), or None on a miss."""
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(value)
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value FROM calcs WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    debug_print(f"Calc cache read failed: {e}", "CALC_CACHE")
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return copy.deepcopy(value)
+
+    def put(self, key: str, value: dict):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO calcs VALUES (?, ?, ?)", (key, json.dumps(value), time.time())
+                    )
+                except sqlite3.Error as e:
+                    debug_print(f"Calc cache write failed: {e}", "CALC_CACHE")
+
+    def _remember(self, key: str, value: dict):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM calcs")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "version": self.version,
+                "persistent": self._db is not None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_calc_cache() -> CalcCache:
+    """Shared CalcCache; CALC_CACHE_DB overrides the sqlite path ("none" keeps it in memory)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            db_path = os.getenv("CALC_CACHE_DB", DEFAULT_CACHE_DB)
+            _cache = CalcCache(None if db_path.lower() in ("", "none") else db_path)
+        return _cache
+
+
+def log_calc_cache_stats(label: str = "battle"):
+    """debug_print the shared cache's hit rates, if anything has used it."""
+    with _cache_lock:
+        cache = _cache
+    if cache is not None:
+        debug_print(f"Calc cache after {label}: {cache.stats()}", "CALC_CACHE")
@@ -0,0 +1,318 @@
+import itertools
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field as dataclass_field
+from typing import Callable, Iterable, List, Optional, Union
+
+import numpy as np
+
+from calc_cache import CalcCache, get_calc_cache
+from showdown_wrapper import debug_print
+
+CALC_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calc_server.js")
+
+
+@dataclass
+class DamageMatrix:
+    """Damage for every attacker x defender x move, from one "matrix" request.
+
+    Arrays are indexed ``[attacker, defender, move]``; ``moves[a]`` names the
+    move columns of attacker ``a``, and columns past the end of a moveset
+    (or calcs that failed) are NaN, with ``ko_hits`` 0. ``ko_hits`` is the
+    number of hits needed to KO (0 if more than four) and ``ko_chance`` the
+    chance of doing so in that many hits. Defenders are keyed by label, so
+    several candidate sets of one species can sit side by side.
+
+    A description left as None is built by ``describer(a, d, m)`` the first
+    time description() asks for it.
+    """
+
+    attackers: List[str]
+    defenders: List[str]
+    moves: List[List[str]]
+    min_damage: np.ndarray
+    max_damage: np.ndarray
+    ko_chance: np.ndarray
+    ko_hits: np.ndarray
+    defender_hp: np.ndarray
+    descriptions: List[List[List[Optional[str]]]]
+    describer: Optional[Callable[[int, int, int], str]] = dataclass_field(default=None, repr=False)
+
+    @property
+    def min_percent(self) -> np.ndarray:
+        return self.min_damage / self.defender_hp[None, :, None] * 100
+
+    @property
+    def max_percent(self) -> np.ndarray:
+        return self.max_damage / self.defender_hp[None, :, None] * 100
+
+    def index(self, attacker: str, defender: str, move: Optional[str] = None):
+        """``(a, d)`` or ``(a, d, m)`` array indices for labels and a move name."""
+        a = self.attackers.index(attacker)
+        d = self.defenders.index(defender)
+        if move is None:
+            return a, d
+        return a, d, self.moves[a].index(move)
+
+    def description(self, attacker: str, defender: str, move: str) -> str:
+        try:
+            a, d, m = self.index(attacker, defender, move)
+        except ValueError:
+            return ""
+        text = self.descriptions[a][d][m]
+        if text is None:
+            text = self.descriptions[a][d][m] = self.describer(a, d, m) if self.describer else ""
+        return text
+
+    def best_move(self, attacker: str, defender: str):
+        """``(move, min %, max %)`` of the attacker's hardest-hitting move, or None."""
+        a, d = self.index(attacker, defender)
+        row = self.max_percent[a, d]
+        if not self.moves[a] or np.isnan(row).all():
+            return None
+        m = int(np.nanargmax(row))
+        return self.moves[a][m], float(self.min_percent[a, d, m]), float(row[m])
+
+
+def _entry(entry: Union[str, dict]) -> dict:
+    return {"name": entry, "details": {}} if isinstance(entry, str) else entry
+
+
+class CalcClient:
+    """Client for calc_server.js, a Node process that keeps @smogon/calc
+    loaded between requests and spreads them over a pool of worker threads.
+
+    Any number of requests can be in flight at once (from any thread); each
+    gets a Future that resolves to the server's answer for its id. With a
+    ``cache``, calc() and damage_matrix() answer repeated requests from it.
+    """
+
+    def __init__(self, workers: Optional[int] = None, script: str = CALC_SERVER, cache: Optional[CalcCache] = None):
+        self.cache = cache
+        cmd = ["node", script]
+        if workers:
+            cmd.append(str(workers))
+        debug_print(f"Starting calc server: {' '.join(cmd)}", "CALC")
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = {}
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        try:
+            for line in self.proc.stdout:
+                try:
+                    response = json.loads(line)
+                except json.JSONDecodeError as e:
+                    debug_print(f"Malformed calc server response: {e}", "CALC")
+                    continue
+                with self._lock:
+                    future = self._pending.pop(response.get("id"), None)
+                if future is not None:
+                    future.set_result(response)
+        except Exception as e:
+            debug_print(f"Error in calc server reader: {e}", "CALC")
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("Calc server exited"))
+
+    def _read_stderr(self):
+        try:
+            for line in self.proc.stderr:
+                debug_print(f"[calc server stderr] {line.strip()}", "CALC")
+        except Exception:
+            pass
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def submit(self, op: str = "calc", **request) -> Future:
+        """Send one request; the Future resolves to the raw response dict."""
+        future = Future()
+        with self._lock:
+            if not self.alive():
+                raise RuntimeError("Calc server is not running (is @smogon/calc installed?)")
+            request_id = next(self._ids)
+            future.request_id = request_id
+            self._pending[request_id] = future
+            try:
+                self.proc.stdin.write(json.dumps({"id": request_id, "op": op, **request}) + "\n")
+                self.proc.stdin.flush()
+            except OSError as e:
+                del self._pending[request_id]
+                raise RuntimeError(f"Calc server is not accepting requests: {e}")
+        return future
+
+    def cancel(self, futures: Iterable[Future]):
+        """Abandon submit() requests that have not been answered. The server
+        drops queued ones and replaces any worker still running one, so the
+        Futures resolve to a "Cancelled" error."""
+        ids = [f.request_id for f in futures if not f.done() and getattr(f, "request_id", None) is not None]
+        if not ids:
+            return
+        with self._lock:
+            try:
+                self.proc.stdin.write(json.dumps({"op": "cancel", "ids": ids}) + "\n")
+                self.proc.stdin.flush()
+            except (OSError, ValueError) as e:
+                debug_print(f"Could not cancel calc requests: {e}", "CALC")
+
+    @staticmethod
+    def result(future: Future, timeout=30.0) -> dict:
+        """Wait for a submit() Future; raises RuntimeError on errors and timeouts."""
+        try:
+            response = future.result(timeout=timeout)
+        except TimeoutError:
+            raise RuntimeError(f"Calc server did not answer within {timeout}s")
+        if "error" in response:
+            raise RuntimeError(f"Calc error: {response['error']}")
+        return response
+
+    def submit_cached(self, op: str, request: dict) -> Future:
+        """submit(), but answered from the cache when it can be; successful
+        answers are cached as they arrive, even if nobody waits for them."""
+        if self.cache is None:
+            return self.submit(op, **request)
+        key = self.cache.key(op, request)
+        response = self.cache.get(key)
+        if response is not None:
+            future = Future()
+            future.set_result(response)
+            return future
+        future = self.submit(op, **request)
+
+        def store(done: Future):
+            if done.exception() is None and "error" not in done.result():
+                response = dict(done.result())
+                response.pop("id", None)
+                self.cache.put(key, response)
+
+        future.add_done_callback(store)
+        return future
+
+    def _request(self, op: str, request: dict, timeout) -> dict:
+        return self.result(self.submit_cached(op, request), timeout)
+
+    def calc(
+        self,
+        attacker: str,
+        defender: str,
+        move: Union[str, dict],
+        gen: int = 9,
+        attacker_details: Optional[dict] = None,
+        defender_details: Optional[dict] = None,
+        field: Optional[dict] = None,
+        timeout=30.0,
+    ) -> dict:
+        """One damage calc: ``{"damage_range": ..., "description": str}``.
+        ``move`` is a name or ``{"name", ...}`` with @smogon/calc Move options."""
+        request = {
+            "gen": gen,
+            "attacker": {"name": attacker, "details": attacker_details or {}},
+            "defender": {"name": defender, "details": defender_details or {}},
+            "move": move,
+        }
+        if field:
+            request["field"] = field
+        return self._request("calc", request, timeout)
+
+    def damage_matrix(
+        self,
+        attackers: Iterable[dict],
+        defenders: Iterable[Union[str, dict]],
+        gen: int = 9,
+        field: Optional[dict] = None,
+        crit: bool = False,
+        timeout=30.0,
+    ) -> DamageMatrix:
+        """Calc every attacker's moves into every defender in one round trip.
+
+        ``attackers`` are ``{"name", "moves", "details"?, "label"?}`` dicts,
+        ``defenders`` species names or ``{"name", "details"?, "label"?}``
+        dicts; labels default to the species name. ``crit`` calcs every
+        move as a critical hit.
+        """
+        attackers = [_entry(a) for a in attackers]
+        defenders = [_entry(d) for d in defenders]
+        request = {
+            "gen": gen,
+            "attackers": [
+                {"name": a["name"], "details": a.get("details") or {}, "moves": list(a.get("moves") or ())}
+                for a in attackers
+            ],
+            "defenders": [{"name": d["name"], "details": d.get("details") or {}} for d in defenders],
+        }
+        if field:
+            request["field"] = field
+        if crit:
+            request["crit"] = True
+        response = self._request("matrix", request, timeout)
+        shape = (len(attackers), len(defenders), max((len(a["moves"]) for a in request["attackers"]), default=0))
+
+        def array(key, dtype=float):
+            return np.array(response[key], dtype=dtype).reshape(shape)
+
+        return DamageMatrix(
+            attackers=[a.get("label") or a["name"] for a in attackers],
+            defenders=[d.get("label") or d["name"] for d in defenders],
+            moves=[a["moves"] for a in request["attackers"]],
+            min_damage=array("min"),
+            max_damage=array("max"),
+            ko_chance=array("ko_chance"),
+            ko_hits=array("ko_hits", np.int8),
+            defender_hp=np.array(response["max_hp"], dtype=float).reshape(len(defenders)),
+            descriptions=response["desc"],
+        )
+
+    def scenarios(self, scenarios: Iterable[dict], deadline=5.0) -> List[Optional[dict]]:
+        """Run 1-ply turn scenarios (see simulate_turn.js) side by side.
+
+        All of them are sent at once and spread over the server's workers;
+        any not answered within ``deadline`` seconds, or that failed, come
+        back as None so a slow one cannot hold up the turn. Late ones are
+        cancelled on the server too, freeing their workers for the next turn.
+        """
+        futures = [self.submit_cached("scenario", scenario) for scenario in scenarios]
+        wait(futures, timeout=deadline)
+        self.cancel(futures)
+        results = []
+        for future in futures:
+            if future.done() and future.exception() is None and "error" not in future.result():
+                results.append(future.result())
+            else:
+                results.append(None)
+        return results
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.terminate()
+        except Exception:
+            pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_calc_client() -> CalcClient:
+    """Shared CalcClient (with the shared calc cache), respawned if its server has died."""
+    global _client
+    with _client_lock:
+        if _client is None or not _client.alive():
+            _client = CalcClient(cache=get_calc_cache())
+        return _client
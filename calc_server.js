@@ -0,0 +1,278 @@
+// calc_server.js
+// Long-lived damage calculator: loads @smogon/calc once per worker thread so a
+// calc does not pay a Node cold start each time.
+// Reads one JSON request per line on stdin and answers with one JSON line:
+//   {"id": 1, "op": "calc", "gen": 9, "move": "Earthquake",
+//    "attacker": {"name": "Garchomp", "details": {}},
+//    "defender": {"name": "Heatran", "details": {}}, "field": {}}
+//   -> {"id": 1, "damage_range": [...], "description": "..."}
+// The "matrix" op takes {"attackers": [{"name", "details", "moves": [...]}, ...],
+// "defenders": [{"name", "details"}, ...]} and answers with min/max damage,
+// KO chance, hits to KO and description for every attacker x defender x move,
+// plus each defender's max HP ("crit": true makes every move a critical hit).
+// The "scenario" op runs simulate_turn.js's 1-ply turn simulation on
+// {"p1": {...}, "p2": {...}} and answers {log, p1_hp, p2_hp}.
+// The "dex" op exports a generation's species, moves and type chart.
+// {"op": "cancel", "ids": [...]} abandons those requests: queued ones are
+// dropped and a worker running one is terminated and replaced; each answers
+// {"id": ..., "error": "Cancelled"}.
+// A request that cannot be processed gets {"id": ..., "error": "..."}.
+// Requests are spread over a pool of worker threads, so answers come back in
+// completion order; match them up by id.
+// Usage: node calc_server.js [workers]
+import os from 'os';
+import readline from 'readline';
+import { Worker, isMainThread, parentPort } from 'worker_threads';
+
+if (isMainThread) {
+    const size = Math.max(1, parseInt(process.argv[2], 10) ||
+        (os.availableParallelism ? os.availableParallelism() : os.cpus().length));
+    // A worker that dies mid-request is replaced after a growing delay; more
+    // than MAX_RESPAWNS deaths in a row, or any worker failing before it is
+    // ready (e.g. @smogon/calc is not installed), shuts the server down.
+    const MAX_RESPAWNS = 5;
+    const pending = [];
+    const idle = [];
+    let open = 0;
+    let closing = false;
+    let respawns = 0;
+
+    function reply(response) {
+        process.stdout.write(JSON.stringify(response) + '\n');
+    }
+
+    function dispatch() {
+        while (idle.length && pending.length) {
+            const worker = idle.pop();
+            worker.current = pending.shift();
+            open++;
+            worker.postMessage(worker.current);
+        }
+        if (closing && open === 0 && pending.length === 0) process.exit(0);
+    }
+
+    function fail(message) {
+        process.stderr.write(message + '\n');
+        process.exit(1);
+    }
+
+    function spawn() {
+        const worker = track(new Worker(new URL(import.meta.url)));
+        worker.current = null;
+        worker.ready = false;
+        worker.on('message', (response) => {
+            if (response.ready) {
+                worker.ready = true;
+                return;
+            }
+            respawns = 0;
+            worker.current = null;
+            open--;
+            reply(response);
+            idle.push(worker);
+            dispatch();
+        });
+        worker.on('error', (err) => {
+            if (!worker.ready) fail(`Calc worker failed to start: ${err.message}`);
+            if (worker.current) {
+                open--;
+                reply({ id: worker.current.id, error: `Calc worker failed: ${err.message}` });
+                worker.current = null;
+            }
+        });
+        worker.on('exit', () => {
+            const i = idle.indexOf(worker);
+            if (i >= 0) idle.splice(i, 1);
+            if (worker.current) {
+                open--;
+                reply({ id: worker.current.id, error: worker.cancelled ? 'Cancelled' : 'Calc worker exited' });
+                worker.current = null;
+            }
+            if (closing) {
+                dispatch();
+                return;
+            }
+            if (worker.cancelled) {
+                idle.push(spawn());
+                dispatch();
+                return;
+            }
+            if (!worker.ready) fail('Calc worker exited before it was ready');
+            if (++respawns > MAX_RESPAWNS) fail(`Calc workers died ${respawns} times in a row, giving up`);
+            setTimeout(() => {
+                idle.push(spawn());
+                dispatch();
+            }, Math.min(100 * 2 ** (respawns - 1), 5000));
+        });
+        return worker;
+    }
+
+    const workers = new Set();
+    const track = (worker) => {
+        workers.add(worker);
+        worker.on('exit', () => workers.delete(worker));
+        return worker;
+    };
+
+    function cancel(ids) {
+        const wanted = new Set(ids);
+        for (let i = pending.length - 1; i >= 0; i--) {
+            if (wanted.has(pending[i].id)) {
+                reply({ id: pending[i].id, error: 'Cancelled' });
+                pending.splice(i, 1);
+            }
+        }
+        for (const worker of workers) {
+            if (worker.current && wanted.has(worker.current.id) && !worker.cancelled) {
+                worker.cancelled = true;
+                worker.terminate();
+            }
+        }
+    }
+
+    for (let i = 0; i < size; i++) idle.push(spawn());
+
+    const rl = readline.createInterface({ input: process.stdin });
+    rl.on('line', (line) => {
+        if (!line.trim()) return;
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (err) {
+            reply({ id: null, error: `Bad request: ${err.message}` });
+            return;
+        }
+        if (request.op === 'cancel') {
+            cancel(request.ids || []);
+            return;
+        }
+        pending.push(request);
+        dispatch();
+    });
+    rl.on('close', () => {
+        closing = true;
+        dispatch();
+    });
+} else {
+    const { calculate, Generations, Pokemon, Move, Field } = await import('@smogon/calc');
+    const { simulateTurn } = await import('./simulate_turn.js');
+
+    function runCalc(request) {
+        const gen = Generations.get(request.gen || 9);
+        const attacker = new Pokemon(gen, request.attacker.name, request.attacker.details || {});
+        const defender = new Pokemon(gen, request.defender.name, request.defender.details || {});
+        // "move" is a name or {"name", ...Move options} (e.g. isCrit)
+        const move = typeof request.move === 'string'
+            ? new Move(gen, request.move) : new Move(gen, request.move.name, request.move);
+        const field = request.field ? new Field(request.field) : new Field();
+        const result = calculate(gen, attacker, defender, move, field);
+        return { damage_range: result.damage, description: result.desc() };
+    }
+
+    // Every attacker's moves into every defender in one request. Results are
+    // [attacker][defender][move] arrays padded to the longest moveset; a cell
+    // (or a whole row, for an unknown species) that fails is null / 0.
+    function runMatrix(request) {
+        const gen = Generations.get(request.gen || 9);
+        const field = request.field ? new Field(request.field) : new Field();
+        const attackers = request.attackers || [];
+        const options = request.crit ? { isCrit: true } : {};
+        const width = Math.max(0, ...attackers.map(a => (a.moves || []).length));
+        const make = (entry) => {
+            try {
+                return new Pokemon(gen, entry.name, entry.details || {});
+            } catch (err) {
+                return null;
+            }
+        };
+        const defenders = (request.defenders || []).map(make);
+        const out = { min: [], max: [], ko_chance: [], ko_hits: [], desc: [] };
+        out.max_hp = defenders.map(d => (d ? d.maxHP() : null));
+        for (const entry of attackers) {
+            const attacker = make(entry);
+            const moves = (entry.moves || []).map((name) => {
+                try {
+                    return new Move(gen, name, options);
+                } catch (err) {
+                    return null;
+                }
+            });
+            const rows = { min: [], max: [], ko_chance: [], ko_hits: [], desc: [] };
+            for (const defender of defenders) {
+                const cells = { min: [], max: [], ko_chance: [], ko_hits: [], desc: [] };
+                for (let m = 0; m < width; m++) {
+                    let cell = { min: null, max: null, ko_chance: null, ko_hits: 0, desc: '' };
+                    if (attacker && defender && moves[m]) {
+                        try {
+                            const result = calculate(gen, attacker, defender, moves[m], field);
+                            const [lo, hi] = result.range();
+                            cell = { min: lo, max: hi, ko_chance: 0, ko_hits: 0, desc: '' };
+                            cell.desc = result.desc();
+                            if (hi > 0) {
+                                const ko = result.kochance();
+                                cell.ko_hits = ko.n || 0;
+                                cell.ko_chance = ko.n ? (ko.chance ?? 1) : 0;
+                            }
+                        } catch (err) {
+                            // Leave the cell empty; one odd move should not sink the matrix
+                        }
+                    }
+                    for (const key in cells) cells[key].push(cell[key]);
+                }
+                for (const key in rows) rows[key].push(cells[key]);
+            }
+            for (const key in rows) out[key].push(rows[key]);
+        }
+        return out;
+    }
+
+    const toID = (text) => ('' + text).toLowerCase().replace(/[^a-z0-9]+/g, '');
+
+    // The generation's species, moves and type chart, for damage_engine.py
+    function exportDex(request) {
+        const gen = Generations.get(request.gen || 9);
+        const species = {};
+        for (const s of gen.species) {
+            species[toID(s.name)] = {
+                name: s.name,
+                types: s.types,
+                stats: s.baseStats,
+                // The calc's default when a request names no ability
+                ability: s.abilities ? s.abilities[0] : undefined,
+                nfe: !!s.nfe,
+            };
+        }
+        const moves = {};
+        for (const m of gen.moves) {
+            moves[toID(m.name)] = {
+                name: m.name,
+                bp: m.basePower ?? m.bp ?? 0,
+                type: m.type,
+                category: m.category || 'Status',
+                priority: m.priority || 0,
+                // Anything here sends the move to the Node calc
+                special: !!(m.multihit || m.multiaccuracy || m.overrideOffensiveStat ||
+                    m.overrideDefensiveStat || m.overrideOffensivePokemon ||
+                    m.overrideDefensivePokemon || m.ignoreDefensive || m.isZ || m.isMax ||
+                    m.breaksProtect || m.willCrit),
+            };
+        }
+        const types = {};
+        for (const t of gen.types) types[t.name] = t.effectiveness;
+        return { gen: gen.num, species, moves, types };
+    }
+
+    const ops = { calc: runCalc, matrix: runMatrix, scenario: simulateTurn, dex: exportDex };
+    parentPort.postMessage({ ready: true });
+
+    parentPort.on('message', (request) => {
+        let response;
+        try {
+            const op = ops[request.op || 'calc'];
+            response = op ? op(request) : { error: `Unknown op: ${request.op}` };
+        } catch (err) {
+            response = { error: err.message };
+        }
+        parentPort.postMessage({ id: request.id, ...response });
+    });
+}
@@ -1,13 +1,23 @@
 import argparse
-import json
-import subprocess
 import random
 import time
 import shutil
 import sys
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Optional, Tuple, List, Union
+import orjson
+import replay_reader
 import showdown_wrapper
-from showdown_wrapper import ShowdownWrapper
+import team_codec
+from showdown_wrapper import split_channels
+from protocol import Event, ProtocolLine, tokenize
+from request_view import JSONDecodeError, RequestView
+from humanizer import Humanizer, humanize
+from battle_state import STATE_HANDLERS, BattleState, PokemonState
+from calc_cache import log_calc_cache_stats
+from simulator_pool import SimulatorPool
+from simulator_supervisor import SupervisedShowdownWrapper
+from team_cache import get_team_cache
+from team_service import get_team_service
 
 # Import Gemini agent (optional, will fallback if not available)
 try:
@@ -154,7 +164,7 @@ class GameWindow:
 
     def render(
         self,
-        battle: Dict[str, Dict[str, Optional[object]]],
+        battle: BattleState,
         title: str = "CLI-Mon Showdown",
     ):
         if not self.enabled:
@@ -171,13 +181,13 @@ class GameWindow:
         header_line = "│" + self._color(header + " " * pad, "bold") + "│"
 
         # Battle lines
-        def side_line(label: str, side: Dict[str, Optional[object]]) -> str:
-            name = str(side.get("name") or "?")
-            hp = side.get("hp")
-            maxhp = side.get("maxhp")
-            hp_pct = side.get("hp_pct")
-            fainted = bool(side.get("fainted"))
-            status = side.get("status") or ""
+        def side_line(label: str, mon: Optional[PokemonState]) -> str:
+            name = mon.name if mon else "?"
+            hp = mon.hp if mon else None
+            maxhp = mon.maxhp if mon else None
+            hp_pct = mon.hp_pct if mon else None
+            fainted = bool(mon and mon.fainted)
+            status = (mon.status if mon else None) or ""
             if fainted:
                 bar = self._color("[" + "X" * 24 + "]" + "  0%", "red")
             else:
@@ -209,8 +219,8 @@ class GameWindow:
         lines.append(top)
         lines.append(header_line)
         lines.append("│" + (" " * (w - 2)) + "│")
-        lines.append(side_line("P1", battle.get("p1", {})))
-        lines.append(side_line("P2", battle.get("p2", {})))
+        lines.append(side_line("P1", battle.p1.active))
+        lines.append(side_line("P2", battle.p2.active))
         lines.append("│" + (" " * (w - 2)) + "│")
 
         # Feed header and content
@@ -266,282 +276,38 @@ class GameWindow:
             print(new_render)
 
 
-# ---- Lightweight 1v1 battle state for reactive UI ----
-BattleSide = Dict[str, Optional[object]]  # name, hp, maxhp, status, fainted
+# ---- Battle state for the reactive UI (see battle_state.py) ----
 
 # Monotonic per-side request sequence used to dedupe actions when rqid is missing/unchanged
 _REQUEST_SEQ: Dict[str, int] = {"p1": 0, "p2": 0}
 
 
-def _new_battle_state() -> Dict[str, BattleSide]:
-    return {
-        "p1": {
-            "name": None,
-            "hp": None,
-            "maxhp": None,
-            "hp_pct": None,
-            "status": None,
-            "fainted": False,
-        },
-        "p2": {
-            "name": None,
-            "hp": None,
-            "maxhp": None,
-            "hp_pct": None,
-            "status": None,
-            "fainted": False,
-            "conditions": [],
-        },
-        "field": [],
-        "weather": None,
-        "ended": False,
-    }
+def _new_battle_state() -> BattleState:
+    return BattleState()
 
 
-def _parse_actor(token: str) -> Tuple[Optional[str], Optional[str]]:
-    # token like 'p1a: Charizard'
-    if ": " in token:
-        side_part, name = token.split(": ", 1)
-        side = side_part[:2] if side_part.startswith(("p1", "p2")) else None
-        return side, name
-    return None, None
-
-
-def _parse_hp_token(
-    tok: str,
-) -> Tuple[Optional[int], Optional[int], Optional[int], bool]:
-    """Parse an HP token from Showdown stream.
-    Returns (hp, maxhp, hp_pct, fainted).
-
-    Handles forms like:
-      - "182/319"
-      - "182/319 slp" (status suffix)
-      - "75/100" (percentage style)
-      - "0 fnt" or "0/352 fnt" (fainted)
-    """
-    if not tok:
-        return None, None, None, False
-    s = tok.strip()
-    # Faint detection first
-    if "fnt" in s:
-        return 0, None, 0, True
-
-    # Remove any trailing annotations (status, brackets info, etc.)
-    # Keep only the first whitespace-separated token which should be the HP form
-    first = s.split(" ", 1)[0]
-
-    # Now parse the HP form
-    if "/" in first:
-        cur, maximum = first.split("/", 1)
-        try:
-            cur_i = int(cur)
-            max_i = int(maximum)
-        except ValueError:
-            return None, None, None, False
-        # Percentage style like 75/100
-        if max_i == 100:
-            return None, None, cur_i, False  # return percentage only
-        # Absolute style like 182/319
-        pct = int(round((cur_i / max_i) * 100)) if max_i else None
-        return cur_i, max_i, pct, False
-    else:
-        # Single number without '/', treat as current HP if purely numeric (rare)
-        try:
-            cur_i = int(first)
-            # Without a max, we can't compute pct; leave unknown
-            return cur_i, None, None, False
-        except ValueError:
-            return None, None, None, False
-
-
-def _update_battle_state_from_line(
-    line: str, battle: Dict[str, BattleSide]
-) -> Tuple[bool, bool]:
-    """Update battle state from a battle line. Returns (changed, error_detected)."""
-    debug_print(f"Processing battle line: {line.strip()}", "BATTLE_STATE")
-    changed = False
-    error_detected = False
-    if not line or "|" not in line:
-        return False, False
-    parts = line.strip().split("|")
-    # parts[0] is '' usually for battle messages
-    if len(parts) < 2:
-        return False, False
-    tag = parts[1]
-    debug_print(f"Battle tag: {tag}, parts: {len(parts)}", "BATTLE_STATE")
-
-    # Handle error messages
-    if tag == "error" and len(parts) >= 3:
-        error_msg = parts[2]
-        debug_print(f"Battle error detected: {error_msg}", "BATTLE_STATE")
-        error_detected = True
-
-    # Handle win/tie
-    if tag in ("win", "tie"):
-        battle["ended"] = True
-        changed = True
-
-    # Handle weather and field conditions
-    if tag == "-weather" and len(parts) >= 3:
-        weather = parts[2]
-        if weather == "none" or weather == "upkeep":
-            pass # Keep it, or maybe 'none' clears it
-            if weather == "none":
-                battle["weather"] = None
-        else:
-            battle["weather"] = weather
-        changed = True
-
-    if tag == "-fieldstart" and len(parts) >= 3:
-        effect = parts[2].split("move: ")[-1] if "move: " in parts[2] else parts[2]
-        if "field" not in battle: battle["field"] = []
-        if effect not in battle["field"]:
-            battle["field"].append(effect)
-            changed = True
-            
-    if tag == "-fieldend" and len(parts) >= 3:
-        effect = parts[2].split("move: ")[-1] if "move: " in parts[2] else parts[2]
-        if "field" not in battle: battle["field"] = []
-        if effect in battle["field"]:
-            battle["field"].remove(effect)
-            changed = True
-
-    if tag == "-sidestart" and len(parts) >= 4:
-        side = parts[2][:2] # p1 or p2
-        effect = parts[3].split("move: ")[-1] if "move: " in parts[3] else parts[3]
-        if side in battle:
-            if "conditions" not in battle[side]: battle[side]["conditions"] = []
-            if effect not in battle[side]["conditions"]:
-                battle[side]["conditions"].append(effect)
-                changed = True
-
-    if tag == "-sideend" and len(parts) >= 4:
-        side = parts[2][:2]
-        effect = parts[3].split("move: ")[-1] if "move: " in parts[3] else parts[3]
-        if side in battle:
-            if "conditions" not in battle[side]: battle[side]["conditions"] = []
-            if effect in battle[side]["conditions"]:
-                battle[side]["conditions"].remove(effect)
-                changed = True
-
-    # Handle successful moves (reset AI error count)
-    if tag == "move" and len(parts) >= 3:
-        side, _ = _parse_actor(parts[2])
-        if side == "p2":
-            # AI successfully made a move, reset error count
-            debug_print("AI move successful, resetting error count", "BATTLE_STATE")
-            # Note: We can't directly access ai_error_count here, will handle in caller
-
-    if tag in ("switch", "drag") and len(parts) >= 3:
-        side, name = _parse_actor(parts[2])
-        debug_print(f"Pokemon switch/drag - Side: {side}, Name: {name}", "BATTLE_STATE")
-        if side in battle and name:
-            if battle[side].get("name") != name:
-                battle[side]["name"] = name
-                # Reset status on switch to avoid carrying over from previous Pokemon
-                if battle[side].get("status") is not None:
-                    battle[side]["status"] = None
-                # keep hp until we get a proper hp token; reset fainted
-                battle[side]["fainted"] = False
-                changed = True
-            # switch lines often include an HP token at parts[4]
-            if len(parts) >= 5:
-                hp, maxhp, hp_pct, fainted = _parse_hp_token(parts[4])
-                if fainted:
-                    if battle[side].get("fainted") is not True:
-                        battle[side]["fainted"] = True
-                        battle[side]["hp"] = 0
-                        changed = True
-                else:
-                    # For switch lines, we get both absolute and percentage HP
-                    # The first line usually has absolute HP, second has percentage
-                    if hp is not None and maxhp is not None and maxhp != 100:
-                        # This is absolute HP
-                        if battle[side].get("hp") != hp:
-                            battle[side]["hp"] = hp
-                            changed = True
-                        if battle[side].get("maxhp") != maxhp:
-                            battle[side]["maxhp"] = maxhp
-                            changed = True
-                        if hp_pct is not None and battle[side].get("hp_pct") != hp_pct:
-                            battle[side]["hp_pct"] = hp_pct
-                            changed = True
-                    elif hp_pct is not None and maxhp == 100:
-                        # This is percentage HP, don't overwrite maxhp if we already have absolute
-                        if battle[side].get("hp_pct") != hp_pct:
-                            battle[side]["hp_pct"] = hp_pct
-                            changed = True
-                        # Update absolute HP if we know maxhp
-                        known_max = battle[side].get("maxhp")
-                        if known_max and known_max != 100:
-                            abs_hp = int(round(hp_pct * known_max / 100))
-                            if battle[side].get("hp") != abs_hp:
-                                battle[side]["hp"] = abs_hp
-                                changed = True
-    elif tag in ("-damage", "-heal", "-sethp") and len(parts) >= 4:
-        side, _ = _parse_actor(parts[2])
-        debug_print(f"HP change - Side: {side}, Tag: {tag}", "BATTLE_STATE")
-        if side in battle:
-            hp, maxhp, hp_pct, fainted = _parse_hp_token(parts[3])
-            debug_print(
-                f"HP token parsed - HP: {hp}, MaxHP: {maxhp}, Fainted: {fainted}",
-                "BATTLE_STATE",
-            )
-            if fainted:
-                if battle[side].get("fainted") is not True:
-                    battle[side]["fainted"] = True
-                    battle[side]["hp"] = 0
-                    changed = True
-            else:
-                known_max = battle[side].get("maxhp")
-                # Handle percentage-style reports like 71/100
-                if hp_pct is not None and known_max and hp is None:
-                    # This is a percentage update, convert to absolute
-                    abs_hp = int(round(hp_pct * known_max / 100))
-                    if battle[side].get("hp") != abs_hp:
-                        battle[side]["hp"] = abs_hp
-                        changed = True
-                    if battle[side].get("hp_pct") != hp_pct:
-                        battle[side]["hp_pct"] = hp_pct
-                        changed = True
-                elif hp is not None and maxhp is not None:
-                    # Absolute HP update
-                    if battle[side].get("hp") != hp:
-                        battle[side]["hp"] = hp
-                        changed = True
-                    if battle[side].get("maxhp") != maxhp:
-                        battle[side]["maxhp"] = maxhp
-                        changed = True
-                    if hp_pct is not None and battle[side].get("hp_pct") != hp_pct:
-                        battle[side]["hp_pct"] = hp_pct
-                        changed = True
-    elif tag == "faint" and len(parts) >= 3:
-        side, _ = _parse_actor(parts[2])
-        if side in battle and battle[side].get("fainted") is not True:
-            battle[side]["fainted"] = True
-            battle[side]["hp"] = 0
-            changed = True
-    elif tag == "-status" and len(parts) >= 4:
-        side, _ = _parse_actor(parts[2])
-        status = parts[3]
-        if side in battle and battle[side].get("status") != status:
-            battle[side]["status"] = status
-            changed = True
-    elif tag == "-curestatus" and len(parts) >= 4:
-        side, _ = _parse_actor(parts[2])
-        if side in battle and battle[side].get("status") is not None:
-            battle[side]["status"] = None
-            changed = True
-    return changed, error_detected
-
-
-def _hp_bar_line(side_label: str, side: BattleSide, width: int = 20) -> str:
-    name = side.get("name") or "?"
-    hp = side.get("hp")
-    maxhp = side.get("maxhp")
-    hp_pct = side.get("hp_pct")
-    fainted = side.get("fainted")
-    status = side.get("status")
+def _update_battle_state_from_line(line: Event, battle: BattleState) -> Tuple[bool, bool]:
+    """Update battle state from a battle line (raw or tokenized). Returns (changed, error_detected)."""
+    event = line if line.__class__ is ProtocolLine else ProtocolLine(line)
+    if showdown_wrapper.DEBUG:
+        debug_print(f"Processing battle line: {event.raw.strip()}", "BATTLE_STATE")
+    # Same dispatch as BattleState.apply(), inlined: this runs for every line
+    handler = STATE_HANDLERS.get(event.tag)
+    if handler is not None:
+        return len(event.args) >= handler[0] and handler[1](battle, event.tag, event.args), False
+    if event.tag == "error" and event.args:
+        debug_print(f"Battle error detected: {event.args[0]}", "BATTLE_STATE")
+        return False, True
+    return False, False
+
+
+def _hp_bar_line(side_label: str, mon: Optional[PokemonState], width: int = 20) -> str:
+    name = mon.name if mon else "?"
+    hp = mon.hp if mon else None
+    maxhp = mon.maxhp if mon else None
+    hp_pct = mon.hp_pct if mon else None
+    fainted = mon.fainted if mon else False
+    status = mon.status if mon else None
     if fainted:
         bar = "[" + "X" * width + "]"
         info = "fainted"
@@ -563,235 +329,20 @@ def _hp_bar_line(side_label: str, side: BattleSide, width: int = 20) -> str:
     return f"{side_label} {name} {bar} {info}{status_str}"
 
 
-def _render_overlay(battle: Dict[str, BattleSide]) -> str:
+def _render_overlay(battle: BattleState) -> str:
     # Legacy overlay for non-window mode
     return (
         "\n"
-        + _hp_bar_line("P1:", battle["p1"])
+        + _hp_bar_line("P1:", battle.p1.active)
         + "\n"
-        + _hp_bar_line("P2:", battle["p2"])
+        + _hp_bar_line("P2:", battle.p2.active)
         + "\n"
     )
 
 
-# ---- Humanized feed helpers ----
-def _side_label(side: Optional[str]) -> str:
-    return side.upper() if side in ("p1", "p2") else "?"
-
-
-def _humanize_line(line: str) -> Optional[str]:
-    if "|" not in line:
-        return None
-    parts = line.strip().split("|")
-    if len(parts) < 2:
-        return None
-    tag = parts[1]
-
-    # Skip empty or technical messages
-    if tag in (
-        "",
-        "t:",
-        "gametype",
-        "gen",
-        "tier",
-        "rule",
-        "clearpoke",
-        "poke",
-        "teampreview",
-        "sideupdate",
-        "split",
-        "teamsize",
-        "start",
-        "upkeep",
-        "request",
-    ):
-        return None
-
-    if tag == "turn" and len(parts) >= 3:
-        return f"-- Turn {parts[2]} --"
-    if tag == "move" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        move = parts[3]
-        target = None
-        if len(parts) >= 5:
-            _, target_name = _parse_actor(parts[4])
-            target = target_name
-        base = f"{_side_label(side)} {name} used {move}"
-        if target:
-            base += f" on {target}"
-        return base
-    if tag in ("-supereffective", "-resisted", "-crit", "-miss", "-immune", "-fail"):
-        mapping = {
-            "-supereffective": "It's super effective!",
-            "-resisted": "It's not very effective...",
-            "-crit": "A critical hit!",
-            "-miss": "It missed!",
-            "-immune": "It had no effect.",
-            "-fail": "But it failed!",
-        }
-        return mapping.get(tag)
-    if tag in ("-damage", "-heal", "-sethp") and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        hp = parts[3]
-        if "fnt" in hp:
-            return f"{name} fainted!"
-        # Skip percentage-only updates to reduce noise
-        if hp.endswith("/100"):
-            return None
-        return f"{name}: {hp}"
-    if tag in ("-residual", "-recoil", "-drain") and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        if tag == "-residual":
-            return f"{name} was hurt by residual damage!"
-        if tag == "-recoil":
-            return f"{name} was hurt by recoil!"
-        if tag == "-drain":
-            return f"{name} absorbed health!"
-    if tag == "faint" and len(parts) >= 3:
-        _, name = _parse_actor(parts[2])
-        return f"{name} fainted!"
-    if tag in ("switch", "drag") and len(parts) >= 3:
-        side, name = _parse_actor(parts[2])
-        verb = "sent out" if tag == "switch" else "was dragged out"
-        msg = f"{_side_label(side)} {verb} {name}"
-        if len(parts) >= 5:
-            hp = parts[4]
-            if hp:
-                msg += f" ({hp})"
-        return msg
-    if tag == "mega" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        return f"{name} Mega-Evolved!"
-    if tag == "-formechange" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        new_form = parts[3]
-        return f"{name} transformed into {new_form}!"
-    if tag == "detailschange" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        details = parts[3]
-        return f"{name} changed to {details}!"
-    if tag == "-boost" and len(parts) >= 5:
-        side, name = _parse_actor(parts[2])
-        stat = parts[3]
-        amount = parts[4]
-        levels = "sharply " if int(amount) >= 2 else ""
-        return f"{name}'s {stat} {levels}rose!"
-    if tag == "-unboost" and len(parts) >= 5:
-        side, name = _parse_actor(parts[2])
-        stat = parts[3]
-        amount = parts[4]
-        levels = "sharply " if int(amount) >= 2 else ""
-        return f"{name}'s {stat} {levels}fell!"
-    if tag == "-clearboost" and len(parts) >= 3:
-        side, name = _parse_actor(parts[2])
-        return f"{name}'s stat changes were cleared!"
-    if tag == "-clearallboost":
-        return "All stat changes were reset!"
-    if tag == "-status" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        status = parts[3]
-        status_names = {
-            "par": "paralyzed",
-            "slp": "asleep",
-            "frz": "frozen",
-            "brn": "burned",
-            "psn": "poisoned",
-            "tox": "badly poisoned",
-        }
-        status_text = status_names.get(status, status)
-        return f"{name} was {status_text}!"
-    if tag == "-curestatus" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        status = parts[3]
-        return f"{name} was cured of {status}!"
-    if tag == "-start" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        effect = parts[3]
-        if effect == "typechange" and len(parts) >= 5:
-            return f"{name} became {parts[4]} type!"
-        elif "ability:" in effect:
-            ability_name = effect.split("ability: ")[1]
-            return f"{name}'s {ability_name} activated!"
-        return f"{name} started {effect}"
-    if tag == "-end" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        effect = parts[3]
-        return f"{name} ended {effect}"
-    if tag == "win" and len(parts) >= 3:
-        return f"🎉 Winner: {parts[2]} 🎉"
-    if tag == "tie":
-        return "The battle ended in a tie!"
-    if tag == "-weather" and len(parts) >= 3:
-        weather = parts[2]
-        weather_names = {
-            "sunnyday": "harsh sunlight",
-            "raindance": "rain",
-            "sandstorm": "sandstorm",
-            "hail": "hail",
-        }
-        weather_text = weather_names.get(weather, weather)
-        return f"The weather became {weather_text}!"
-    if tag == "-fieldstart" and len(parts) >= 3:
-        field_effect = parts[2]
-        if "Stealth Rock" in field_effect:
-            return "Stealth Rock was set up!"
-        elif "Spikes" in field_effect:
-            return "Spikes were set up!"
-        elif "Toxic Spikes" in field_effect:
-            return "Toxic Spikes were set up!"
-        elif "Sticky Web" in field_effect:
-            return "Sticky Web was set up!"
-        return f"Field effect: {field_effect}"
-    if tag == "-fieldend" and len(parts) >= 3:
-        field_effect = parts[2]
-        if "Stealth Rock" in field_effect:
-            return "Stealth Rock was removed!"
-        elif "Spikes" in field_effect:
-            return "Spikes were removed!"
-        elif "Toxic Spikes" in field_effect:
-            return "Toxic Spikes were removed!"
-        elif "Sticky Web" in field_effect:
-            return "Sticky Web was removed!"
-        return f"Field effect ended: {field_effect}"
-    if tag in ("-sidestart", "-sideend") and len(parts) >= 4:
-        side = parts[2]
-        effect = parts[3]
-        if "move:" in effect:
-            effect = effect.split("move: ")[1]
-        if tag == "-sidestart":
-            return f"{effect} protected {_side_label(side)}'s team."
-        return f"{_side_label(side)}'s {effect} wore off."
-    if tag in ("-item", "-enditem") and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        item = parts[3]
-        if tag == "-item":
-            return f"{name} obtained {item}!"
-        return f"{name} consumed its {item}!"
-    if tag in ("-ability", "ability") and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        ability = parts[3]
-        if tag == "ability":
-            return f"{name}'s {ability} was revealed!"
-        return f"{name}'s {ability} activated!"
-    if tag == "cant" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        reason = parts[3]
-        if reason == "flinch":
-            return f"{name} flinched and couldn't move!"
-        elif reason == "par":
-            return f"{name} is paralyzed and can't move!"
-        elif reason == "slp":
-            return f"{name} is fast asleep!"
-        return f"{name} can't move due to {reason}!"
-    if tag == "-activate" and len(parts) >= 4:
-        side, name = _parse_actor(parts[2])
-        effect = parts[3]
-        if "ability:" in effect:
-            ability_name = effect.split("ability: ")[1]
-            return f"{name}'s {ability_name} activated!"
-        return None  # Skip other activation messages as they're often too technical
-
-    return None
+# Humanized feed: see humanizer.py. The main loop and server keep one
+# memoizing Humanizer per battle; this is the stateless one-off form.
+_humanize_line = humanize
 
 
 def _process_output(
@@ -800,82 +351,102 @@ def _process_output(
     active_side: str,
     requests: Dict[str, dict],
     shown_rqid: Dict[str, Optional[int]],
-    battle: Dict[str, BattleSide],
+    battle: BattleState,
     ai_error_count: Dict[str, int],
     current_turn: int = 0,
     ui: Optional[GameWindow] = None,
+    turn_events: Optional[List[ProtocolLine]] = None,
+    humanizer: Optional[Humanizer] = None,
 ) -> Tuple[Optional[str], bool, int]:
     if not out_lines:
         return None, False, current_turn
+    humanize_event = humanizer or _humanize_line
     winner: Optional[str] = None
-    overlay_changed = False
     player_error_detected = False
 
-    # Parse requests from the entire stream first
+    # Demultiplex once: requests and errors arrive on the p1/p2 channels,
+    # battle events on the omniscient channel (one copy of each |split| pair)
+    channels = split_channels(out_lines, ("omniscient", "p1", "p2"))
     debug_print(f"Parsing stream for requests from {len(out_lines)} lines", "REQUESTS")
-    _parse_stream_lines(out_lines, requests)
+    _parse_request_channels(channels, requests)
     debug_print(f"Requests after parsing: {list(requests.keys())}", "REQUESTS")
 
     feed_changed = False
     seen_messages = set()  # Track messages we've already added to avoid duplicates
 
-    for line in out_lines:
+    # Tokenize once; state, feed and turn/win checks all work from the events
+    events = tokenize(channels["omniscient"])
+
+    # The remote wrapper sends |error| with no side marker, so those land on
+    # the omniscient channel; they are the local player's
+    error_sources = (
+        ("p1", tokenize(channels["p1"]), True),
+        ("p2", tokenize(channels["p2"]), True),
+        (active_side, events, False),
+    )
+    for side, side_events, marked in error_sources:
+        for event in side_events:
+            if event.tag != "error":
+                continue
+            line = event.raw
+            debug_print(f"Battle error detected for {side}: {line.strip()}", "BATTLE_STATE")
+            # Track AI errors for p2
+            if marked and side == "p2":
+                ai_error_count["p2"] += 1
+                debug_print(f"AI error detected, count: {ai_error_count['p2']}", "AI")
+            # Check for player errors to handle error recovery
+            if "Invalid choice" in line or "Unavailable choice" in line:
+                debug_print(f"Player error detected: {line.strip()}", "ERROR_RECOVERY")
+                player_error_detected = True
+                # Reset the shown request ID to force re-prompting
+                if active_side in shown_rqid:
+                    shown_rqid[active_side] = None
+                    debug_print(
+                        f"Reset request ID for {active_side} to force re-prompt",
+                        "ERROR_RECOVERY",
+                    )
+                # Add error message to UI
+                error_msg = "|".join(event.args)
+                if ui and ui.enabled:
+                    ui.add_feed(f"⚠️ {error_msg}")
+                    feed_changed = True
+                else:
+                    print(f"\n⚠️ {error_msg}")
+
+    if not humanize and not (ui and ui.enabled):
+        # Raw mode shows every channel exactly as the simulator sent it
+        for line in out_lines:
+            print(line, end="")
+
+    if turn_events is not None:
+        turn_events.extend(events)
+    for event in events:
+        tag = event.tag
         # New turn: clear shown request IDs so AI/player can act again
         # Some simulator requests omit or reuse rqid across turns; resetting here
         # ensures we don't suppress valid actions on a new turn.
-        if "|turn|" in line:
+        if tag == "turn":
             shown_rqid["p1"] = None
             shown_rqid["p2"] = None
             # Extract turn number for LLM agent context
             try:
-                parts = line.split("|turn|")
-                if len(parts) > 1:
-                    current_turn = int(parts[1].strip())
+                current_turn = int(event.args[0])
             except (ValueError, IndexError):
                 pass  # Keep existing turn number if parsing fails
             debug_print(
                 "New turn detected; reset shown_rqid for both sides", "REQUESTS"
             )
-        # Check for player errors first to handle error recovery
-        if "|error|" in line and (
-            "Invalid choice" in line or "Unavailable choice" in line
-        ):
-            debug_print(f"Player error detected: {line.strip()}", "ERROR_RECOVERY")
-            player_error_detected = True
-            # Reset the shown request ID to force re-prompting
-            for side in shown_rqid:
-                if side == active_side:
-                    shown_rqid[side] = None
-                    debug_print(
-                        f"Reset request ID for {side} to force re-prompt",
-                        "ERROR_RECOVERY",
-                    )
-            # Add error message to UI
-            error_msg = (
-                line.split("|error|", 1)[1] if "|error|" in line else "Invalid choice"
-            )
-            if ui and ui.enabled:
-                ui.add_feed(f"⚠️ {error_msg}")
-                feed_changed = True
-            else:
-                print(f"\n⚠️ {error_msg}")
 
         # Process battle state
         try:
-            state_changed, error_detected = _update_battle_state_from_line(line, battle)
-            if state_changed:
-                overlay_changed = True
-            # Track AI errors for p2
-            if error_detected and "p2" in line:
-                ai_error_count["p2"] += 1
-                debug_print(f"AI error detected, count: {ai_error_count['p2']}", "AI")
+            _update_battle_state_from_line(event, battle)
             # Reset AI error count on successful moves
-            elif "|move|p2" in line:
+            if tag == "move" and event.arg(0).startswith("p2"):
                 ai_error_count["p2"] = 0
                 debug_print("AI move successful, error count reset", "AI")
         except Exception as e:
             debug_print(
-                f"Error processing battle state line '{line.strip()}': {e}", "ERROR"
+                f"Error processing battle state line '{event.raw.strip()}': {e}", "ERROR"
             )
             # Continue processing other lines instead of failing silently
 
@@ -883,14 +454,14 @@ def _process_output(
         if ui and ui.enabled:
             # For UI mode, only add meaningful events to the feed
             if humanize:
-                msg = _humanize_line(line)
+                msg = humanize_event(event)
                 if msg and msg not in seen_messages:
                     ui.add_feed(msg)
                     seen_messages.add(msg)
                     feed_changed = True
             else:
                 # Raw mode: only add non-empty lines and avoid duplicates
-                clean_line = line.strip()
+                clean_line = event.raw.strip()
                 if (
                     clean_line
                     and clean_line not in seen_messages
@@ -899,18 +470,16 @@ def _process_output(
                     ui.add_feed(clean_line)
                     seen_messages.add(clean_line)
                     feed_changed = True
-        else:
-            # Non-UI mode: preserve original behavior
-            if humanize:
-                msg = _humanize_line(line)
-                if msg:
-                    print(msg)
-            else:
-                print(line, end="")
+        elif humanize:
+            msg = humanize_event(event)
+            if msg:
+                print(msg)
 
         # Check for winner
-        if "|win|" in line:
-            winner = line.split("|win|", 1)[1].strip() or "Unknown"
+        if tag == "win":
+            winner = "|".join(event.args).strip() or "Unknown"
+
+    overlay_changed = bool(battle.pop_changes())
 
     # Overlay/UI refresh only once at the end
     if ui and ui.enabled:
@@ -941,76 +510,47 @@ def pack_team(
         debug_print(f"File read error for {path}: {e}", "TEAM_ERROR")
         raise RuntimeError(f"Could not read team file {path}: {e}")
 
-    try:
-        # First, pack the team using Pokemon Showdown
-        pack_result = subprocess.run(
-            ["node", f"{ps_path}/pokemon-showdown", "pack-team"],
-            input=team_content,
-            capture_output=True,
-            text=True,
-            check=True,
-            timeout=30,
-        )
-        packed_team = pack_result.stdout.strip()
-
-    except subprocess.TimeoutExpired as e:
-        debug_print(f"Team packing timeout for {path}: {e}", "TEAM_ERROR")
-        raise RuntimeError(f"Team packing timed out for {path}")
-    except subprocess.CalledProcessError as e:
-        debug_print(f"Team packing failed for {path}: {e.stderr}", "TEAM_ERROR")
-        raise RuntimeError(f"Failed to pack team {path}: {e.stderr}")
-    except FileNotFoundError as e:
-        debug_print(
-            f"Node.js or pokemon-showdown not found when packing {path}: {e}",
-            "TEAM_ERROR",
-        )
-        raise RuntimeError("Node.js not found or pokemon-showdown directory missing")
-
-    try:
-        # Then validate the team using the specified format
-        validate_result = subprocess.run(
-            ["node", f"{ps_path}/pokemon-showdown", "validate-team", formatname],
-            input=team_content,
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-
-        # Check if there are validation errors
-        if validate_result.returncode != 0:
-            error_output = validate_result.stderr.strip()
-            if error_output:
-                # Display validation errors clearly
-                print(f"\n⚠️ Team validation errors for {path}:")
-                print(f"Format: {formatname}")
-                print("=" * 50)
-                print(error_output)
-                print("=" * 50)
-                raise RuntimeError(
-                    f"Team validation failed for {path} in format {formatname}:\n{error_output}"
-                )
-            else:
-                # If no stderr but non-zero exit code, there might be banned Pokemon/moves
-                print(f"\n⚠️ Team validation failed for {path} in format {formatname}")
-                print(
-                    "The team may contain banned Pokemon, moves, or items for this format."
-                )
-                raise RuntimeError(
-                    f"Team validation failed for {path} in format {formatname}"
-                )
+    # Identical team text, format and Showdown checkout give the same verdict
+    cache = get_team_cache(ps_path)
+    result = cache.get(team_content, formatname) if cache is not None else None
+    if result is not None:
+        debug_print(f"Team cache hit for {path}", "TEAM")
+    else:
+        try:
+            # Pack and validate in one round trip to the long-lived team service
+            result = get_team_service(ps_path).pack_validate([team_content], formatname)[0]
+        except FileNotFoundError as e:
+            debug_print(
+                f"Node.js or pokemon-showdown not found when packing {path}: {e}",
+                "TEAM_ERROR",
+            )
+            raise RuntimeError("Node.js not found or pokemon-showdown directory missing")
+        except RuntimeError as e:
+            debug_print(f"Team service failed for {path}: {e}", "TEAM_ERROR")
+            raise RuntimeError(f"Failed to pack team {path}: {e}")
 
-    except subprocess.TimeoutExpired as e:
-        debug_print(f"Team validation timeout for {path}: {e}", "TEAM_ERROR")
-        raise RuntimeError(f"Team validation timed out for {path}")
-    except subprocess.CalledProcessError as e:
-        debug_print(f"Team validation failed for {path}: {e.stderr}", "TEAM_ERROR")
-        raise RuntimeError(f"Failed to validate team {path}: {e.stderr}")
-    except FileNotFoundError as e:
-        debug_print(
-            f"Node.js or pokemon-showdown not found when validating {path}: {e}",
-            "TEAM_ERROR",
+        if "error" in result:
+            debug_print(f"Team packing failed for {path}: {result['error']}", "TEAM_ERROR")
+            raise RuntimeError(f"Failed to pack team {path}: {result['error']}")
+        if cache is not None:
+            try:
+                cache.put(team_content, formatname, result["packed"], result.get("errors"))
+            except OSError as e:
+                debug_print(f"Could not cache team {path}: {e}", "TEAM_ERROR")
+    packed_team = result["packed"]
+
+    # Check if there are validation errors
+    if result.get("errors"):
+        error_output = "\n".join(result["errors"])
+        # Display validation errors clearly
+        print(f"\n⚠️ Team validation errors for {path}:")
+        print(f"Format: {formatname}")
+        print("=" * 50)
+        print(error_output)
+        print("=" * 50)
+        raise RuntimeError(
+            f"Team validation failed for {path} in format {formatname}:\n{error_output}"
         )
-        raise RuntimeError("Node.js not found or pokemon-showdown directory missing")
 
     # If validation passed, return the packed team
     debug_print(
@@ -1021,20 +561,18 @@ def pack_team(
 
 def _parse_stream_lines(lines, requests: Dict[str, dict]) -> None:
     """Update requests dict from simulator stream output."""
-    current: Optional[str] = None
-    for raw in lines:
-        line = raw.rstrip("\n")
-        # Channel markers can be 'p1'/'p2'/'omniscient' or with a leading '>'
-        if line in ("p1", "p2", "omniscient"):
-            current = line
-            continue
-        if line.startswith(">") and " " not in line:
-            current = line[1:].strip()
-            continue
-        if "|request|" in line and current in ("p1", "p2"):
+    _parse_request_channels(split_channels(lines, ("p1", "p2")), requests)
+
+
+def _parse_request_channels(channels: Dict[str, list], requests: Dict[str, dict]) -> None:
+    """Update requests dict from the p1/p2 channels of split_channels()."""
+    for current in ("p1", "p2"):
+        for line in channels.get(current, ()):
+            if not line.startswith("|request|"):
+                continue
             try:
-                payload = line.split("|request|", 1)[1]
-                req = json.loads(payload)
+                payload = line[len("|request|"):]
+                req = RequestView.parse(payload)
                 # Attach a monotonically increasing sequence number per side
                 try:
                     _REQUEST_SEQ[current] = _REQUEST_SEQ.get(current, 0) + 1
@@ -1046,7 +584,7 @@ def _parse_stream_lines(lines, requests: Dict[str, dict]) -> None:
                 debug_print(
                     f"Parsed request for {current}: {list(req.keys())}", "REQUESTS"
                 )
-            except (json.JSONDecodeError, IndexError) as e:
+            except (JSONDecodeError, IndexError) as e:
                 # Log malformed JSON but keep last good request
                 debug_print(
                     f"Malformed request JSON for {current}: {e}", "REQUESTS_ERROR"
@@ -1060,67 +598,29 @@ def _parse_stream_lines(lines, requests: Dict[str, dict]) -> None:
 
 
 def _get_available_moves(req: dict) -> List[dict]:
-    """Get list of available moves from request."""
-    if not req or "active" not in req or not req["active"]:
+    """Get list of available moves from request (cached on the RequestView)."""
+    if not req:
         return []
-    active = req["active"][0]
-    moves = active.get("moves", [])
-    available_moves = []
-    for i, m in enumerate(moves, 1):
-        if not m.get("disabled"):
-            # Add the original index to track the move's position
-            move_copy = m.copy()
-            move_copy["original_index"] = i
-            available_moves.append(move_copy)
-    return available_moves
+    return RequestView.of(req).moves
 
 
 def _get_available_switches(req: dict) -> List[dict]:
-    """Get list of available Pokemon to switch to."""
+    """Get list of available Pokemon to switch to (cached on the RequestView)."""
     if not req:
         return []
-    side = req.get("side") or {}
-    pokemon = side.get("pokemon") or []
-    available = []
-    for i, p in enumerate(pokemon, start=1):
-        condition = p.get("condition", "")
-        if "fnt" not in condition:  # Not fainted
-            available.append({"index": i, "pokemon": p})
-    return available
+    return RequestView.of(req).switches
 
 
 def _get_forced_switch_options(req: dict) -> List[dict]:
     """Get list of Pokemon available for forced switch (excludes active Pokemon)."""
     if not req:
         return []
-    side = req.get("side") or {}
-    pokemon = side.get("pokemon") or []
-    available = []
-
-    # In forced switch scenarios, we need to exclude the currently active Pokemon
-    # The active Pokemon is typically the first one in the list that's not fainted
-    # but since it just fainted, we look for the first non-fainted Pokemon that isn't slot 1
-    for i, p in enumerate(pokemon, start=1):
-        condition = p.get("condition", "")
-        # Skip fainted Pokemon and also skip the first slot in forced switch
-        # (since that's typically where the fainted active Pokemon was)
-        if "fnt" not in condition and i > 1:
-            available.append({"index": i, "pokemon": p})
-
-    # If we found no options excluding slot 1, then check all non-fainted
-    # (this handles edge cases)
-    if not available:
-        for i, p in enumerate(pokemon, start=1):
-            condition = p.get("condition", "")
-            if "fnt" not in condition:
-                available.append({"index": i, "pokemon": p})
-
-    return available
+    return RequestView.of(req).forced_switch_options
 
 
 def _create_agent_observation(
     ai_req: dict,
-    battle: Dict[str, BattleSide],
+    battle: BattleState,
     ui: Optional[GameWindow] = None,
     current_turn: int = 0,
 ) -> dict:
@@ -1191,7 +691,7 @@ def _create_agent_observation(
         )
 
     # Extract opponent information (public battle state)
-    opponent_data = battle.get("p1", {})
+    opponent = battle.p1.active
 
     # Get available moves
     available_moves = []
@@ -1243,16 +743,8 @@ def _create_agent_observation(
     weather = ai_req.get("weather", None)
     field_conditions = ai_req.get("field", {})
 
-    # Extract terrain specifically from field conditions if present
-    terrain = None
-    for key in battle.get("field", []):
-        if "terrain" in key.lower():
-            terrain = key
-            break
-
     # Resolve active side for side_conditions
-    my_side = ai_req.get("side", {}).get("id", "p1")
-    my_conditions = battle.get(my_side, {}).get("conditions", [])
+    my_side = battle.side(ai_req.get("side", {}).get("id", "p1")) or battle.p1
 
     # Create the complete observation
     observation = {
@@ -1260,10 +752,11 @@ def _create_agent_observation(
         "active": active_data,
         "bench": bench_data,
         "opponent_active": {
-            "species": opponent_data.get("name"),
-            "hp_percent": opponent_data.get("hp_pct"),
-            "status": opponent_data.get("status"),
-            "fainted": opponent_data.get("fainted", False),
+            "species": opponent.name if opponent else None,
+            "hp_percent": opponent.hp_pct if opponent else None,
+            "status": opponent.status if opponent else None,
+            "fainted": opponent.fainted if opponent else False,
+            "boosts": dict(opponent.boosts) if opponent else {},
         },
         "recent_events": recent_events,
         "available_moves": available_moves,
@@ -1271,19 +764,21 @@ def _create_agent_observation(
         "is_forced_switch": is_forced_switch,
         "can_move": bool(ai_req.get("active")) and not ai_req.get("wait"),
         "must_wait": bool(ai_req.get("wait")),
-        "side_conditions": my_conditions,
-        "field_conditions": battle.get("field", []),
-        "weather": battle.get("weather", None),
-        "terrain": terrain,
+        "side_conditions": list(my_side.conditions),
+        "field_conditions": list(battle.field),
+        "weather": battle.weather,
+        "terrain": battle.terrain,
         "pseudoWeather": ai_req.get("pseudoWeather", []),
-        "ended": battle.get("ended", False)
+        "ended": battle.ended
     }
 
     return observation
 
 
 def _llm_agent_decision(
-    observation: dict, team_knowledge: Optional[dict] = None, raw_log: str = ""
+    observation: dict,
+    team_knowledge: Optional[dict] = None,
+    raw_log: Union[str, List[ProtocolLine]] = "",
 ) -> dict:
     """
     LLM agent that makes decisions based on battle observation.
@@ -1291,7 +786,7 @@ def _llm_agent_decision(
     Args:
         observation: The battle state observation
         team_knowledge: Optional pre-battle team information
-        raw_log: Raw showdown log for the current turn
+        raw_log: Showdown log for the current turn, raw or as tokenized events
 
     Returns:
         Dictionary with 'action_type' ('move' or 'switch') and 'choice' (index or move name)
@@ -1443,10 +938,10 @@ def _translate_agent_decision(decision: dict, ai_req: dict) -> Optional[str]:
     if action_type == "wait" or choice is None:
         return None
 
+    view = RequestView.of(ai_req)
     if action_type == "switch":
         # Validate switch choice
-        switches = _get_available_switches(ai_req)
-        valid_indices = [s["index"] for s in switches]
+        valid_indices = view.switch_indices
 
         if choice in valid_indices:
             return f"switch {choice}"
@@ -1462,8 +957,7 @@ def _translate_agent_decision(decision: dict, ai_req: dict) -> Optional[str]:
 
     elif action_type == "move":
         # Validate move choice
-        moves = _get_available_moves(ai_req)
-        valid_indices = [m.get("original_index", i + 1) for i, m in enumerate(moves)]
+        valid_indices = view.move_indices
 
         if choice in valid_indices:
             return f"move {choice}"
@@ -1486,7 +980,7 @@ def _parse_team_knowledge(team_content: str, side: str = "p2") -> dict:
     Parse team file content to provide pre-battle knowledge to the LLM agent.
 
     Args:
-        team_content: Raw team file content (Showdown importable format)
+        team_content: Raw team file content (Showdown export or packed format)
         side: Which side this team belongs to ("p1" or "p2")
 
     Returns:
@@ -1503,80 +997,28 @@ def _parse_team_knowledge(team_content: str, side: str = "p2") -> dict:
         return team_knowledge
 
     try:
-        # Split by Pokemon (each Pokemon starts with a line that doesn't begin with whitespace)
-        lines = team_content.strip().split("\n")
-        current_pokemon = None
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # New Pokemon (line doesn't start with dash or whitespace in original)
-            if (
-                not line.startswith("-")
-                and not line.startswith("@")
-                and not line.startswith("Ability:")
-                and not line.startswith("EVs:")
-                and not line.startswith("IVs:")
-                and not line.startswith("Nature:")
-                and "@" in line
-            ):
-                if current_pokemon:
-                    team_knowledge["pokemon"].append(current_pokemon)
-
-                # Parse pokemon name and item
-                if " @ " in line:
-                    name_part, item = line.split(" @ ", 1)
-                else:
-                    name_part = line
-                    item = None
-
-                current_pokemon = {
-                    "name": name_part.strip(),
-                    "item": item.strip() if item else None,
-                    "ability": None,
-                    "moves": [],
-                    "nature": None,
-                    "evs": {},
-                    "ivs": {},
-                    "level": 50,  # Default level
+        for mon in team_codec.parse_team(team_content):
+            team_knowledge["pokemon"].append(
+                {
+                    "name": mon.name or mon.species,
+                    "species": mon.species,
+                    "item": mon.item or None,
+                    "ability": mon.ability or None,
+                    "moves": list(mon.moves),
+                    "nature": mon.nature or None,
+                    "evs": {
+                        team_codec.STAT_NAMES[stat]: value
+                        for stat, value in (mon.evs or {}).items()
+                        if value
+                    },
+                    "ivs": {
+                        team_codec.STAT_NAMES[stat]: value
+                        for stat, value in (mon.ivs or {}).items()
+                        if value != 31
+                    },
+                    "level": mon.level,
                 }
-
-            elif current_pokemon:
-                # Parse Pokemon details
-                if line.startswith("Ability:"):
-                    current_pokemon["ability"] = line.replace("Ability:", "").strip()
-                elif line.startswith("EVs:"):
-                    ev_part = line.replace("EVs:", "").strip()
-                    # Parse EVs like "252 HP / 252 Atk / 4 SpD"
-                    for ev_stat in ev_part.split(" / "):
-                        if " " in ev_stat:
-                            value, stat = ev_stat.strip().split(" ", 1)
-                            try:
-                                current_pokemon["evs"][stat] = int(value)
-                            except ValueError:
-                                pass
-                elif line.startswith("IVs:"):
-                    iv_part = line.replace("IVs:", "").strip()
-                    # Parse IVs similar to EVs
-                    for iv_stat in iv_part.split(" / "):
-                        if " " in iv_stat:
-                            value, stat = iv_stat.strip().split(" ", 1)
-                            try:
-                                current_pokemon["ivs"][stat] = int(value)
-                            except ValueError:
-                                pass
-                elif line.endswith(" Nature"):
-                    current_pokemon["nature"] = line.replace(" Nature", "").strip()
-                elif line.startswith("- "):
-                    # Move
-                    move = line.replace("- ", "").strip()
-                    current_pokemon["moves"].append(move)
-
-        # Add the last Pokemon
-        if current_pokemon:
-            team_knowledge["pokemon"].append(current_pokemon)
+            )
 
         debug_print(
             f"Parsed team knowledge for {side}: {len(team_knowledge['pokemon'])} Pokemon",
@@ -1591,7 +1033,7 @@ def _parse_team_knowledge(team_content: str, side: str = "p2") -> dict:
 
 def _show_pokemon_showdown_menu(
     req: dict,
-    battle: Dict[str, BattleSide],
+    battle: BattleState,
     active_side: str,
     ui: Optional[GameWindow] = None,
 ) -> str:
@@ -1611,7 +1053,8 @@ def _show_pokemon_showdown_menu(
         print(_render_overlay(battle))
 
     # Get the active Pokemon name
-    active_pokemon = battle[active_side].get("name", "Pokemon")
+    active = battle.side(active_side).active
+    active_pokemon = active.name if active else "Pokemon"
 
     # Check if this is a forced switch
     force_switch = req.get("forceSwitch") or [False]
@@ -1775,7 +1218,68 @@ def _show_pokemon_showdown_menu(
             raise  # Re-raise KeyboardInterrupt to handle gracefully in main loop
 
 
+def _replay_battle(path: str, humanize: bool):
+    """Re-run a recorded input log through the simulator and print its output."""
+    try:
+        lines, elapsed = showdown_wrapper.replay_input_log(path)
+    except (OSError, RuntimeError) as e:
+        print(f"Error replaying {path}: {e}")
+        return
+    events = tokenize(lines)
+    humanizer = Humanizer()
+    for event in events:
+        if humanize:
+            text = humanizer(event)
+            if text:
+                print(text)
+        else:
+            print(event.raw, end="")
+    turns = sum(1 for event in events if event.tag == "turn")
+    print(f"Replayed {turns} turns ({len(lines)} lines) in {elapsed:.3f}s")
+
+
+def _ingest_replays(paths: List[str], humanize: bool, out=sys.stdout):
+    """Run the state tracker (and humanizer) over replay archives, one JSON line per battle."""
+    battles = 0
+    for replay in replay_reader.iter_archive(paths):
+        battle = _new_battle_state()
+        humanizer = Humanizer()
+        feed = []
+        turns = 0
+        winner = None
+        for event in replay.events:
+            _update_battle_state_from_line(event, battle)
+            if humanize:
+                text = humanizer(event)
+                if text:
+                    feed.append(text)
+            if event.tag == "turn":
+                turns += 1
+            elif event.tag == "win":
+                winner = "|".join(event.args).strip()
+        record = {
+            "source": replay.source,
+            "index": replay.index,
+            "id": replay.battle_id,
+            "format": replay.format,
+            "lines": len(replay.events),
+            "turns": turns,
+            "winner": winner,
+            "state": battle.to_json(),
+        }
+        if humanize:
+            record["feed"] = feed
+        out.write(orjson.dumps(record).decode() + "\n")
+        battles += 1
+    print(f"Ingested {battles} battle(s)", file=sys.stderr)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "validate-teams":
+        from team_validation import main as validate_teams_main
+
+        sys.exit(validate_teams_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "p1",
@@ -1852,11 +1356,44 @@ def main():
         help="Disable the in-terminal game window",
     )
     parser.add_argument("--debug", action="store_true", help="Enable debug printing.")
+    parser.add_argument(
+        "--seed",
+        default=None,
+        help='PRNG seed for a reproducible local battle, e.g. "1,2,3,4"',
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        default=None,
+        help="Record every command sent to the local simulator to an input log",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        default=None,
+        help="Replay a recorded input log as fast as possible, then exit",
+    )
+    parser.add_argument(
+        "--replay-archive",
+        metavar="PATH",
+        action="append",
+        default=None,
+        help="Stream battle logs (.log/.jsonl/.zst, file or directory) through the "
+        "state tracker and print one JSON line per battle, then exit (repeatable)",
+    )
     parser.set_defaults(p2_ai=True, humanize=True, window=True)
     args = parser.parse_args()
 
     if args.debug:
-        showdown_wrapper.DEBUG = True
+        showdown_wrapper.set_debug(True)
+
+    if args.replay:
+        _replay_battle(args.replay, args.humanize)
+        return
+
+    if args.replay_archive:
+        _ingest_replays(args.replay_archive, args.humanize)
+        return
 
     debug_print("Starting improved CLI battle interface", "MAIN")
     debug_print(f"Command line args parsed: {args}", "MAIN")
@@ -1898,16 +1435,18 @@ def main():
     else:
         debug_print(f"Using specified format: {battle_format}", "MAIN")
 
+    # Spawn the simulator now so Node warms up while teams are prepared
+    pool = None if args.remote else SimulatorPool(min_size=1, max_size=1)
+
     # Pack teams or generate for randbat
     team_knowledge = None
     if not args.remote:
         try:
             if args.randbat:
                 print("Generating and validating random teams...")
-                p1_team = showdown_wrapper.generate_random_team(formatid=battle_format)
-                p2_team = showdown_wrapper.generate_random_team(formatid=battle_format)
-                if not p1_team or not p2_team:
-                    raise RuntimeError("Failed to generate random teams.")
+                # Both teams come from one batch on the shared team service; a
+                # pool would keep generating teams this battle never uses
+                p1_team, p2_team = get_team_service().generate(battle_format, 2)
                 debug_print(f"Random teams generated for format {battle_format}", "TEAMS")
                 # For random battles, we don't have team file content to parse
                 team_knowledge = None
@@ -1933,10 +1472,12 @@ def main():
         except RuntimeError as e:
             print(f"Error: {e}")
             print("Please check that Node.js is installed and team files are valid.")
+            pool.close()
             return
         except Exception as e:
             print(f"Unexpected error preparing teams: {e}")
             debug_print(f"Unexpected team preparation error: {e}", "TEAMS_ERROR")
+            pool.close()
             return
 
     debug_print("Initializing Pokemon Showdown simulator...", "SIMULATOR")
@@ -1948,7 +1489,13 @@ def main():
             from remote_showdown import RemoteShowdownWrapper
             sim = RemoteShowdownWrapper(args.username, args.password, args.format)
         else:
-            sim = ShowdownWrapper(formatid=args.format)
+            sim = SupervisedShowdownWrapper(
+                pool.acquire_unstarted,
+                pool.release,
+                args.format,
+                seed=showdown_wrapper.parse_seed(args.seed),
+                input_log=args.record,
+            )
         
         if not args.remote:
             sim.send(f'>player p1 {{"name":"P1","team":"{p1_team}"}}')
@@ -1957,6 +1504,8 @@ def main():
     except Exception as e:
         print(f"Failed to start simulator: {e}")
         debug_print(f"Simulator initialization error: {e}", "SIMULATOR_ERROR")
+        if pool:
+            pool.close()
         return
 
     # Track current request state for each side
@@ -1983,7 +1532,9 @@ def main():
     debug_print("Entering main battle loop", "MAIN")
 
     try:
-        current_turn_log = ""
+        # Tokenized battle events so far, for the LLM agent's opponent tracker
+        turn_events: List[ProtocolLine] = []
+        humanizer = Humanizer()
         while True:
             # Wait for and process simulator output
             out = sim.wait_for_output(timeout=1.0)
@@ -1991,9 +1542,6 @@ def main():
                 f"Simulator output: {len(out) if out else 0} lines", "SIMULATOR"
             )
             if out:
-                for line in out:
-                    current_turn_log += line + "\n"
-                
                 ai_loop_counter = 0  # Reset counter when we get simulator output
                 result = _process_output(
                     out,
@@ -2005,6 +1553,8 @@ def main():
                     ai_error_count,
                     current_turn,
                     ui,
+                    turn_events,
+                    humanizer,
                 )
                 # Handle the updated return value (winner, player_error_detected, current_turn)
                 if isinstance(result, tuple) and len(result) == 3:
@@ -2022,6 +1572,7 @@ def main():
                     "MAIN",
                 )
                 if winner:
+                    log_calc_cache_stats()
                     msg = f"🎉 Battle over! Winner: {winner} 🎉"
                     if ui and ui.enabled:
                         ui.add_feed(msg)
@@ -2031,8 +1582,8 @@ def main():
                     return
 
                 # Check for double KO scenario
-                p1_fainted = battle.get("p1", {}).get("fainted", False)
-                p2_fainted = battle.get("p2", {}).get("fainted", False)
+                p1_fainted = bool(battle.p1.active and battle.p1.active.fainted)
+                p2_fainted = bool(battle.p2.active and battle.p2.active.fainted)
                 if p1_fainted and p2_fainted:
                     # This is a potential double KO. Check if the game is about to end or if players can switch.
                     p1_req = requests.get("p1", {})
@@ -2112,7 +1663,6 @@ def main():
                         "Player error detected, waiting for updated requests",
                         "ERROR_RECOVERY",
                     )
-                    time.sleep(0.2)  # Brief wait for simulator to send updated request
                     # Get any additional output that might contain updated requests
                     additional_out = sim.wait_for_output(timeout=0.5)
                     if additional_out:
@@ -2219,7 +1769,7 @@ def main():
 
                         # Get decision from LLM agent
                         try:
-                            decision = _llm_agent_decision(observation, team_knowledge, raw_log=current_turn_log)
+                            decision = _llm_agent_decision(observation, team_knowledge, raw_log=turn_events)
                             debug_print(f"LLM agent decision: {decision}", "LLM_AGENT")
 
                             # Translate decision to simulator command
@@ -2436,8 +1986,13 @@ def main():
 
         debug_print(f"Full traceback: {traceback.format_exc()}", "MAIN_ERROR")
     finally:
+        if hasattr(sim, "latency_summary"):
+            debug_print(f"Turn latency summary: {sim.latency_summary()}", "LATENCY")
+            debug_print(f"Simulator queue stats: {sim.stats()}", "WRAPPER")
         try:
             sim.close()
+            if pool:
+                pool.close()
             debug_print("Simulator closed successfully", "MAIN")
         except Exception as e:
             debug_print(f"Error closing simulator: {e}", "MAIN_ERROR")
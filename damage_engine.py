@@ -0,0 +1,558 @@
+"""NumPy damage engine for the common cases.
+
+Implements the generation 6+ damage formula (with @smogon/calc's rounding)
+for ordinary damaging moves: STAB, type effectiveness, boosts, burn, crits,
+weather, and the items and abilities that random battle sets lean on. The
+16 damage rolls of any number of matchups are computed together as array
+operations, so a whole damage matrix costs a handful of NumPy calls.
+
+Species, moves and the type chart come from the calc server's ``dex`` op
+(once per process; the calc cache keeps it across runs). Anything the
+engine does not model -- variable-power and fixed-damage moves, type-changing
+or contact-based abilities, gems and resist berries, Tera, terrain and
+screens -- is sent to the Node calc instead.
+
+Damage rolls match the Node calc; the text does not quite. Descriptions
+leave out @smogon/calc's stat-spread prefix ("252+ Atk ... vs. 0 HP / 0 Def"),
+and KO chances count damage only, without end-of-turn recovery such as
+Leftovers or Black Sludge.
+"""
+
+import re
+import threading
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+from calc_client import CalcClient, DamageMatrix, _entry, get_calc_client
+from showdown_wrapper import debug_print
+
+MIN_GEN = 6
+
+_NON_ID = re.compile(r"[^a-z0-9]")
+
+# Pokemon options the engine understands; any other (teraType, curHP, ...) goes to Node
+DETAIL_KEYS = {"level", "evs", "ivs", "nature", "item", "ability", "status", "boosts", "gender"}
+WEATHERS = {"Sun", "Rain", "Sand", "Snow", "Hail"}
+
+# nature -> (raised stat, lowered stat); neutral natures are left out
+NATURES = {
+    "lonely": ("atk", "def"), "brave": ("atk", "spe"), "adamant": ("atk", "spa"), "naughty": ("atk", "spd"),
+    "bold": ("def", "atk"), "relaxed": ("def", "spe"), "impish": ("def", "spa"), "lax": ("def", "spd"),
+    "timid": ("spe", "atk"), "hasty": ("spe", "def"), "jolly": ("spe", "spa"), "naive": ("spe", "spd"),
+    "modest": ("spa", "atk"), "mild": ("spa", "def"), "quiet": ("spa", "spe"), "rash": ("spa", "spd"),
+    "calm": ("spd", "atk"), "gentle": ("spd", "def"), "sassy": ("spd", "spe"), "careful": ("spd", "spa"),
+}
+
+# Moves whose power, damage or typing depends on something besides the dex entry
+EXOTIC_MOVES = {
+    "acrobatics", "assurance", "avalanche", "beatup", "bittermalice", "bodypress", "boltbeak", "brine",
+    "collisioncourse", "counter", "crushgrip", "darkestlariat", "dragonenergy", "dragonrage", "echoedvoice",
+    "electroball", "electrodrift", "endeavor", "eruption", "expandingforce", "facade", "finalgambit",
+    "fishiousrend", "flail", "fling", "flyingpress", "foulplay", "freezedry", "frustration", "furycutter",
+    "grassknot", "guardianofalola", "gyroball", "hardpress", "heatcrash", "heavyslam", "hex", "hiddenpower",
+    "hydrosteam", "iceball", "infernalparade", "ivycudgel", "judgment", "knockoff", "lashout", "lastrespects",
+    "lowkick", "magnitude", "metalburst", "mirrorcoat", "multiattack", "naturalgift", "naturesmadness",
+    "nightshade", "payback", "photongeyser", "powertrip", "present", "psyblade", "psyshock", "psystrike",
+    "psywave", "punishment", "pursuit", "ragefist", "ragingbull", "retaliate", "return", "revelationdance",
+    "revenge", "reversal", "risingvoltage", "rollout", "round", "ruination", "sacredsword", "secretsword",
+    "seismictoss", "smellingsalts", "solarbeam", "solarblade", "sonicboom", "spitup", "stompingtantrum",
+    "storedpower", "superfang", "technoblast", "temperflare", "terablast", "terastarstorm", "terrainpulse",
+    "thousandarrows", "triplekick", "tripleaxel", "trumpcard", "venoshock", "wakeupslap", "waterspout",
+    "weatherball", "wringout",
+}
+
+# Abilities with damage effects the engine does not model
+EXOTIC_ABILITIES = {
+    "aerilate", "airlock", "analytic", "aurabreak", "battery", "beadsofruin", "berserk", "bulletproof",
+    "cloudnine", "darkaura", "dauntlessshield", "defeatist", "disguise", "dragonsmaw", "dryskin",
+    "electromorphosis", "fairyaura", "flareboost", "flowergift", "fluffy", "galvanize", "gorillatactics",
+    "grasspelt", "hadronengine", "heatproof", "iceface", "intrepidsword", "ironfist", "libero", "liquidvoice",
+    "marvelscale", "megalauncher", "merciless", "mindseye", "minus", "moldbreaker", "myceliummight",
+    "neuroforce", "normalize", "orichalcumpulse", "parentalbond", "pixilate", "plus", "powerspot", "protean",
+    "protosynthesis", "punkrock", "purifyingsalt", "quarkdrive", "reckless", "refrigerate", "rivalry",
+    "rockypayload", "sandforce", "scrappy", "sharpness", "sheerforce", "skilllink", "slowstart",
+    "soundproof", "stakeout", "steelworker", "steelyspirit", "strongjaw", "sturdy", "supremeoverlord",
+    "swordofruin", "tabletsofruin", "terashell", "terashift", "teravolt", "toughclaws", "toxicboost",
+    "transistor", "turboblaze", "vesselofruin", "waterbubble", "windpower", "windrider", "wonderguard",
+}
+
+# Defender abilities that make it immune to a type
+IMMUNITIES = {
+    "levitate": "Ground", "eartheater": "Ground", "flashfire": "Fire", "wellbakedbody": "Fire",
+    "waterabsorb": "Water", "stormdrain": "Water", "voltabsorb": "Electric", "lightningrod": "Electric",
+    "motordrive": "Electric", "sapsipper": "Grass",
+}
+
+# Held items that boost one type's moves by 20%
+TYPE_ITEMS = {
+    "charcoal": "Fire", "mysticwater": "Water", "seaincense": "Water", "waveincense": "Water",
+    "miracleseed": "Grass", "roseincense": "Grass", "magnet": "Electric", "nevermeltice": "Ice",
+    "blackbelt": "Fighting", "poisonbarb": "Poison", "softsand": "Ground", "sharpbeak": "Flying",
+    "twistedspoon": "Psychic", "oddincense": "Psychic", "silverpowder": "Bug", "hardstone": "Rock",
+    "rockincense": "Rock", "spelltag": "Ghost", "dragonfang": "Dragon", "blackglasses": "Dark",
+    "metalcoat": "Steel", "silkscarf": "Normal", "fairyfeather": "Fairy",
+}
+
+EXOTIC_ITEMS = {
+    "adamantcrystal", "adamantorb", "airballoon", "babiriberry", "boosterenergy", "chartiberry",
+    "chilanberry", "chopleberry", "cobaberry", "colburberry", "cornerstonemask", "deepseascale",
+    "deepseatooth", "griseouscore", "griseousorb", "habanberry", "hearthflamemask", "ironball",
+    "kasibberry", "kebiaberry", "leek", "lightball", "loadeddice", "lustrousglobe", "lustrousorb",
+    "metronome", "occaberry", "passhoberry", "payapaberry", "punchingglove", "rindoberry", "roseliberry",
+    "shucaberry", "souldew", "stick", "tangaberry", "thickclub", "utilityumbrella", "wacanberry",
+    "wellspringmask", "yacheberry",
+}
+# Gems, Arceus plates, Silvally memories and Genesect drives
+EXOTIC_ITEM_SUFFIXES = ("gem", "plate", "memory", "drive")
+
+ROLLS = np.arange(85, 101, dtype=np.int64)
+
+
+def to_id(name: str) -> str:
+    return _NON_ID.sub("", (name or "").lower())
+
+
+def _round(numerator):
+    """pokeRound(numerator / 4096) for integer arrays: halves round down."""
+    quotient, remainder = np.divmod(numerator, 4096)
+    return quotient + (remainder > 2048)
+
+
+def _chain(mods, lower, upper):
+    """Chain 4096-based modifiers ``(condition, mod)`` cell by cell, like chainMods."""
+    total = 4096
+    for condition, mod in mods:
+        total = np.where(condition, (total * mod + 2048) >> 12, total)
+    return np.clip(total, lower, upper)
+
+
+def _boosted(stat, boost):
+    return np.where(boost >= 0, stat * (2 + boost) // 2, stat * 2 // (2 - boost))
+
+
+def _pair_chance(left, right, hp):
+    """Per row, the fraction of (l, r) pairs with l + r >= hp."""
+    rows, width = right.shape
+    right = np.sort(right, axis=1)
+    span = int(right.max(initial=0)) + 2
+    offsets = np.arange(rows, dtype=np.int64)[:, None] * span
+    queries = np.clip(hp[:, None] - left, 0, span - 1) + offsets
+    found = np.searchsorted((right + offsets).ravel(), queries.ravel()).reshape(queries.shape)
+    below = found - offsets // span * width
+    return (width - below).sum(axis=1) / (left.shape[1] * width)
+
+
+def ko_chances(rolls: np.ndarray, hp: np.ndarray):
+    """``(hits, chance)`` per row of 16 rolls: the fewest hits that can KO
+    ``hp`` (0 if more than four) and the chance that many hits do."""
+    hp = np.asarray(hp, dtype=np.int64)
+    top = rolls[:, -1]
+    hits = np.where(top > 0, -(-hp // np.maximum(top, 1)), 0)
+    hits = np.where(hits > 4, 0, hits)
+    chance = np.zeros(len(rolls))
+    for n in range(1, 5):
+        rows = np.flatnonzero(hits == n)
+        if not len(rows):
+            continue
+        ones, need = rolls[rows], hp[rows]
+        if n == 1:
+            chance[rows] = (ones >= need[:, None]).mean(axis=1)
+            continue
+        twos = (ones[:, :, None] + ones[:, None, :]).reshape(len(rows), -1)
+        if n == 2:
+            chance[rows] = (twos >= need[:, None]).mean(axis=1)
+        else:
+            chance[rows] = _pair_chance(twos, ones if n == 3 else twos, need)
+    return hits, chance
+
+
+def describe(attacker: str, defender: str, move: str, rolls: np.ndarray, hp: int, hits: int, chance: float) -> str:
+    """Calc-style summary, e.g. "Garchomp Earthquake vs. Heatran: 290-342 (90.6 - 106.9%) -- 56.3% chance to OHKO"."""
+    low, high = int(rolls[0]), int(rolls[-1])
+    text = f"{attacker} {move} vs. {defender}: {low}-{high} ({low / hp * 100:.1f} - {high / hp * 100:.1f}%)"
+    if hits:
+        ko = "OHKO" if hits == 1 else f"{hits}HKO"
+        odds = "guaranteed" if chance >= 1 else f"{round(chance * 1000) / 10}% chance to"
+        text += f" -- {odds} {ko}"
+    return text
+
+
+class DamageEngine:
+    """Damage rolls for one generation from the dex, falling back to the
+    Node calc (through ``client``, the shared CalcClient by default) for
+    anything the engine does not model; see supports()."""
+
+    def __init__(self, dex: dict, client: Optional[CalcClient] = None):
+        self.gen = dex["gen"]
+        self.species = dex["species"]
+        self.moves = dex["moves"]
+        self._client = client
+        self.types = sorted(dex["types"])
+        self._type_index = {name: i for i, name in enumerate(self.types)}
+        # One extra row/column for "no type", so a mono-type's second type is neutral
+        self._chart = np.ones((len(self.types) + 1, len(self.types) + 1))
+        for attacking, effectiveness in dex["types"].items():
+            for defending, mod in (effectiveness or {}).items():
+                if defending in self._type_index:
+                    self._chart[self._type_index[attacking], self._type_index[defending]] = mod
+        self._none = len(self.types)
+        self.fallbacks = 0
+
+    @classmethod
+    def from_server(cls, gen: int = 9, client: Optional[CalcClient] = None, timeout=30.0) -> "DamageEngine":
+        """Engine built from the calc server's dex for ``gen``."""
+        dex = (client or get_calc_client())._request("dex", {"gen": gen}, timeout)
+        return cls(dex, client)
+
+    @property
+    def client(self) -> CalcClient:
+        return self._client or get_calc_client()
+
+    def _type(self, name: Optional[str]) -> int:
+        return self._type_index.get(name, self._none)
+
+    def _mon(self, name: str, details: Optional[dict]):
+        """Stats and damage-relevant traits of one Pokemon, or None if the engine cannot model it."""
+        details = details or {}
+        species = self.species.get(to_id(name))
+        if species is None or not set(details) <= DETAIL_KEYS:
+            return None
+        ability = to_id(details.get("ability") or species.get("ability") or "")
+        item = to_id(details.get("item") or "")
+        if ability in EXOTIC_ABILITIES or item in EXOTIC_ITEMS or item.endswith(EXOTIC_ITEM_SUFFIXES):
+            return None
+        level = int(details.get("level") or 100)
+        evs = details.get("evs") or {}
+        ivs = details.get("ivs") or {}
+        plus, minus = NATURES.get(to_id(details.get("nature") or ""), (None, None))
+        stats = {}
+        for stat, base in species["stats"].items():
+            points = (2 * base + ivs.get(stat, 31) + evs.get(stat, 0) // 4) * level // 100
+            if stat == "hp":
+                stats[stat] = 1 if base == 1 else points + level + 10
+            else:
+                stats[stat] = int((points + 5) * (1.1 if stat == plus else 0.9 if stat == minus else 1))
+        types = list(species["types"]) + [None]
+        return {
+            "level": level,
+            "stats": stats,
+            "boosts": details.get("boosts") or {},
+            "types": (self._type(types[0]), self._type(types[1])),
+            "ability": ability,
+            "item": item,
+            "status": details.get("status") or "",
+            "nfe": species.get("nfe", False),
+        }
+
+    def _move(self, name: str):
+        move = self.moves.get(to_id(name))
+        if (
+            move is None
+            or move["category"] == "Status"
+            or not move["bp"]
+            or move.get("special")
+            or to_id(move["name"]) in EXOTIC_MOVES
+        ):
+            return None
+        return move
+
+    def _field(self, field: Optional[dict]):
+        """The weather to apply, or False if the field needs the Node calc."""
+        field = field or {}
+        weather = field.get("weather") or None
+        if self.gen < MIN_GEN or set(field) - {"weather"} or (weather and weather not in WEATHERS):
+            return False
+        return weather
+
+    def supports(self, attacker: str, defender: str, move: str, field: Optional[dict] = None,
+                 attacker_details: Optional[dict] = None, defender_details: Optional[dict] = None) -> bool:
+        """Whether the engine computes this calc itself rather than asking Node."""
+        return (
+            self._field(field) is not False
+            and self._move(move) is not None
+            and self._mon(attacker, attacker_details) is not None
+            and self._mon(defender, defender_details) is not None
+        )
+
+    def _rolls(self, attackers: list, defenders: list, moves: list, cells, weather: Optional[str], crit: bool) -> np.ndarray:
+        """(N, 16) damage rolls for N cells.
+
+        ``attackers``, ``defenders`` and ``moves`` are _mon()/_move() entries
+        (None for ones no cell uses) and ``cells`` three index arrays into
+        them, one (attacker, defender, move) triple per cell. Every property
+        is tabulated once per Pokemon or move and gathered per cell.
+        """
+        a_idx, d_idx, m_idx = (np.asarray(axis, dtype=np.intp) for axis in cells)
+        if not len(m_idx):
+            return np.zeros((0, 16), dtype=np.int64)
+
+        def gather(entries, index):
+            def column(value, dtype=np.int64):
+                values = (0 if entry is None else value(entry) for entry in entries)
+                return np.fromiter(values, dtype, len(entries))[index]
+
+            return column
+
+        A, D, M = gather(attackers, a_idx), gather(defenders, d_idx), gather(moves, m_idx)
+
+        def a_ability(*names):
+            return A(lambda a: a["ability"] in names, bool)
+
+        def d_ability(*names):
+            return D(lambda d: d["ability"] in names, bool)
+
+        def a_item(*names):
+            return A(lambda a: a["item"] in names, bool)
+
+        def d_item(*names):
+            return D(lambda d: d["item"] in names, bool)
+
+        phys = M(lambda m: m["category"] == "Physical", bool)
+        mtype = M(lambda m: self._type(m["type"]))
+        a1, a2 = A(lambda a: a["types"][0]), A(lambda a: a["types"][1])
+        d1, d2 = D(lambda d: d["types"][0]), D(lambda d: d["types"][1])
+
+        eff = self._chart[mtype, d1] * self._chart[mtype, d2]
+        immune = D(lambda d: self._type_index.get(IMMUNITIES.get(d["ability"]), -1))
+        eff = np.where(immune == mtype, 0.0, eff)
+
+        # Base power
+        bp = M(lambda m: m["bp"])
+        boosted_type = A(lambda a: self._type_index.get(TYPE_ITEMS.get(a["item"]), -1))
+        bp_mod = _chain(
+            [
+                (a_ability("technician") & (bp <= 60), 6144),
+                (boosted_type == mtype, 4915),
+                (a_item("muscleband") & phys, 4505),
+                (a_item("wiseglasses") & ~phys, 4505),
+            ],
+            41,
+            2097152,
+        )
+        bp = np.maximum(1, _round(bp * bp_mod))
+
+        # Attack; Unaware on the other side ignores boosts, crits ignore drops
+        attack = np.where(phys, A(lambda a: a["stats"]["atk"]), A(lambda a: a["stats"]["spa"]))
+        boost = np.where(phys, A(lambda a: a["boosts"].get("atk", 0)), A(lambda a: a["boosts"].get("spa", 0)))
+        boost = np.where(d_ability("unaware"), 0, np.maximum(boost, 0) if crit else boost)
+        attack = _boosted(attack, boost)
+        attack = np.where(a_ability("hustle") & phys, attack * 3 // 2, attack)
+        statused = A(lambda a: bool(a["status"]), bool)
+        guts = a_ability("guts") & statused
+        fire_or_ice = (mtype == self._type("Fire")) | (mtype == self._type("Ice"))
+        at_mod = _chain(
+            [
+                (a_ability("hugepower", "purepower") & phys, 8192),
+                (guts & phys, 6144),
+                (a_ability("solarpower") & ~phys & (weather == "Sun"), 6144),
+                (d_ability("thickfat") & fire_or_ice, 2048),
+                (a_item("choiceband") & phys, 6144),
+                (a_item("choicespecs") & ~phys, 6144),
+            ],
+            410,
+            131072,
+        )
+        attack = np.maximum(1, _round(attack * at_mod))
+
+        # Defense; crits ignore raises
+        defense = np.where(phys, D(lambda d: d["stats"]["def"]), D(lambda d: d["stats"]["spd"]))
+        boost = np.where(phys, D(lambda d: d["boosts"].get("def", 0)), D(lambda d: d["boosts"].get("spd", 0)))
+        boost = np.where(a_ability("unaware"), 0, np.minimum(boost, 0) if crit else boost)
+        defense = _boosted(defense, boost)
+        if weather == "Sand":
+            rock = self._type("Rock")
+            defense = np.where(((d1 == rock) | (d2 == rock)) & ~phys, defense * 3 // 2, defense)
+        elif weather == "Snow":
+            ice = self._type("Ice")
+            defense = np.where(((d1 == ice) | (d2 == ice)) & phys, defense * 3 // 2, defense)
+        nfe = D(lambda d: d["nfe"], bool)
+        df_mod = _chain(
+            [
+                (d_ability("furcoat") & phys, 8192),
+                (d_item("eviolite") & nfe, 6144),
+                (d_item("assaultvest") & ~phys, 6144),
+            ],
+            410,
+            131072,
+        )
+        defense = np.maximum(1, _round(defense * df_mod))
+
+        level = A(lambda a: a["level"])
+        base = ((2 * level // 5 + 2) * bp * attack // defense) // 50 + 2
+        if weather in ("Sun", "Rain"):
+            boosted, weakened = ("Fire", "Water") if weather == "Sun" else ("Water", "Fire")
+            weather_mod = np.where(mtype == self._type(boosted), 6144, np.where(mtype == self._type(weakened), 2048, 4096))
+            base = _round(base * weather_mod)
+        if crit:
+            base = base * 3 // 2
+
+        rolls = base[:, None] * ROLLS // 100
+        stab = (mtype == a1) | (mtype == a2)
+        stab_mod = np.where(stab, np.where(a_ability("adaptability"), 8192, 6144), 4096)
+        rolls = _round(rolls * stab_mod[:, None])
+        rolls = np.floor(rolls * eff[:, None]).astype(np.int64)
+        burned = A(lambda a: a["status"] == "brn", bool) & phys & ~guts
+        rolls = np.where(burned[:, None], rolls // 2, rolls)
+
+        final_mod = _chain(
+            [
+                (a_ability("sniper") & crit, 6144),
+                (a_ability("tintedlens") & (eff < 1), 8192),
+                (d_ability("multiscale", "shadowshield"), 2048),
+                (d_ability("filter", "solidrock", "prismarmor") & (eff > 1), 3072),
+                (d_ability("icescales") & ~phys, 2048),
+                (a_item("expertbelt") & (eff > 1), 4915),
+                (a_item("lifeorb"), 5324),
+            ],
+            41,
+            131072,
+        )
+        rolls = _round(np.maximum(rolls * final_mod[:, None], 4096))
+        return np.where(eff[:, None] == 0, 0, rolls)
+
+    def _node_rolls(self, response: dict) -> np.ndarray:
+        damage = np.asarray(response["damage_range"], dtype=np.int64)
+        if damage.ndim == 2:  # multi-hit moves give one row per hit
+            damage = damage.sum(axis=0)
+        return np.broadcast_to(damage, (16,)).copy() if damage.ndim == 0 else damage
+
+    def calc(
+        self,
+        attacker: str,
+        defender: str,
+        move: str,
+        attacker_details: Optional[dict] = None,
+        defender_details: Optional[dict] = None,
+        field: Optional[dict] = None,
+        crit: bool = False,
+        timeout=30.0,
+    ) -> dict:
+        """One calc, shaped like CalcClient.calc(): ``{"damage_range", "description"}``."""
+        weather = self._field(field)
+        att = self._mon(attacker, attacker_details)
+        dfn = self._mon(defender, defender_details)
+        mv = self._move(move)
+        if weather is False or att is None or dfn is None or mv is None:
+            self.fallbacks += 1
+            return self.client.calc(
+                attacker,
+                defender,
+                {"name": move, "isCrit": True} if crit else move,
+                gen=self.gen,
+                attacker_details=attacker_details,
+                defender_details=defender_details,
+                field=field,
+                timeout=timeout,
+            )
+        rolls = self._rolls([att], [dfn], [mv], ([0], [0], [0]), weather, crit)
+        hp = np.array([dfn["stats"]["hp"]])
+        hits, chance = ko_chances(rolls, hp)
+        return {
+            "damage_range": rolls[0].tolist(),
+            "description": describe(attacker, defender, mv["name"], rolls[0], int(hp[0]), int(hits[0]), float(chance[0])),
+        }
+
+    def rolls(self, attacker: str, defender: str, move: str, field: Optional[dict] = None, crit: bool = False,
+              attacker_details: Optional[dict] = None, defender_details: Optional[dict] = None) -> np.ndarray:
+        """The 16 damage rolls of one calc."""
+        response = self.calc(attacker, defender, move, attacker_details, defender_details, field, crit)
+        return self._node_rolls(response)
+
+    def damage_matrix(
+        self,
+        attackers: Iterable[dict],
+        defenders: Iterable[Union[str, dict]],
+        field: Optional[dict] = None,
+        crit: bool = False,
+        timeout=30.0,
+    ) -> DamageMatrix:
+        """CalcClient.damage_matrix() computed here; cells the engine cannot
+        model (if any) come from one Node matrix request."""
+        attackers = [_entry(a) for a in attackers]
+        defenders = [_entry(d) for d in defenders]
+        moves = [list(a.get("moves") or ()) for a in attackers]
+        width = max((len(m) for m in moves), default=0)
+        shape = (len(attackers), len(defenders), width)
+        weather = self._field(field)
+        att = [self._mon(a["name"], a.get("details")) for a in attackers]
+        dfn = [self._mon(d["name"], d.get("details")) for d in defenders]
+        mvs = [[self._move(m) for m in row] for row in moves]
+
+        # Supported cells; moves are numbered a * width + m
+        supported = (
+            np.array([a is not None for a in att], dtype=bool)[:, None, None]
+            & np.array([d is not None for d in dfn], dtype=bool)[None, :, None]
+            & np.array([[m is not None for m in row] + [False] * (width - len(row)) for row in mvs], dtype=bool).reshape(
+                len(attackers), 1, width
+            )
+        )
+        if weather is False:
+            supported[:] = False
+        a_idx, d_idx, m_idx = np.nonzero(supported)
+        flat_moves = [m for row in mvs for m in row + [None] * (width - len(row))]
+        rolls = self._rolls(att, dfn, flat_moves, (a_idx, d_idx, a_idx * width + m_idx), weather or None, crit)
+        hp = np.array([d["stats"]["hp"] if d else 0 for d in dfn], dtype=np.int64)[d_idx]
+        hits, chance = ko_chances(rolls, hp)
+
+        min_damage = np.full(shape, np.nan)
+        max_damage = np.full(shape, np.nan)
+        ko_chance = np.full(shape, np.nan)
+        ko_hits = np.zeros(shape, dtype=np.int8)
+        defender_hp = np.array([d["stats"]["hp"] if d else np.nan for d in dfn], dtype=float)
+        descriptions = np.full(shape, "", dtype=object)
+        missing = sum(len(row) for row in moves) * len(defenders) - len(m_idx)
+        if missing:
+            self.fallbacks += missing
+            node = self.client.damage_matrix(attackers, defenders, gen=self.gen, field=field, crit=crit, timeout=timeout)
+            min_damage, max_damage = node.min_damage.copy(), node.max_damage.copy()
+            ko_chance, ko_hits = node.ko_chance.copy(), node.ko_hits.copy()
+            defender_hp = np.where(np.isnan(defender_hp), node.defender_hp, defender_hp)
+            descriptions[...] = np.array(node.descriptions, dtype=object).reshape(shape)
+
+        # Engine cells are described on demand (see DamageMatrix.description)
+        cell = np.full(shape, -1, dtype=np.intp)
+        if len(m_idx):
+            min_damage[a_idx, d_idx, m_idx] = rolls[:, 0]
+            max_damage[a_idx, d_idx, m_idx] = rolls[:, -1]
+            ko_chance[a_idx, d_idx, m_idx] = np.where(hits > 0, chance, 0.0)
+            ko_hits[a_idx, d_idx, m_idx] = hits
+            descriptions[a_idx, d_idx, m_idx] = None
+            cell[a_idx, d_idx, m_idx] = np.arange(len(m_idx))
+
+        def describer(a: int, d: int, m: int) -> str:
+            i = cell[a, d, m]
+            if i < 0:
+                return ""
+            return describe(attackers[a]["name"], defenders[d]["name"], mvs[a][m]["name"],
+                            rolls[i], int(hp[i]), int(hits[i]), float(chance[i]))
+
+        return DamageMatrix(
+            attackers=[a.get("label") or a["name"] for a in attackers],
+            defenders=[d.get("label") or d["name"] for d in defenders],
+            moves=moves,
+            min_damage=min_damage,
+            max_damage=max_damage,
+            ko_chance=ko_chance,
+            ko_hits=ko_hits,
+            defender_hp=defender_hp,
+            descriptions=descriptions.tolist(),
+            describer=describer,
+        )
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_damage_engine(gen: int = 9) -> DamageEngine:
+    """Shared DamageEngine for ``gen``; the dex is fetched on first use."""
+    with _engines_lock:
+        engine = _engines.get(gen)
+        if engine is None:
+            engine = _engines[gen] = DamageEngine.from_server(gen)
+            debug_print(
+                f"Damage engine ready: gen {engine.gen}, {len(engine.species)} species, {len(engine.moves)} moves",
+                "CALC",
+            )
+        return engine
@@ -9,9 +9,10 @@ all long-running services:
   - dashboard.py agent state dashboard             (:8080)
   - frontend/    Vite dev server                   (:5173)
 
-The Pokemon Showdown simulator is NOT started here: server.py spawns it as a
-child process per WebSocket connection, and because that child shares this
-launcher's process group it is reaped automatically on shutdown.
+The Pokemon Showdown simulator is NOT started here: server.py keeps a pool of
+warm simulator child processes and hands one to each local battle, and because
+those children share this launcher's process group they are reaped
+automatically on shutdown.
 
 Usage:
     python dev.py                  # bootstrap + run everything
@@ -7,12 +7,14 @@ Pokemon battle decisions based on game state observations.
 
 import json
 import os
-from typing import Dict, Optional, Tuple, Any, List, TypedDict, Literal
+from typing import Dict, Optional, Tuple, Any, List, TypedDict, Literal, Union, Iterable
 from pydantic import BaseModel, Field
-import subprocess
 import re
 from dotenv import load_dotenv
 import showdown_wrapper
+from protocol import ProtocolLine, tokenize
+from calc_client import DamageMatrix, get_calc_client
+from damage_engine import get_damage_engine
 
 # Load environment variables from .env file
 load_dotenv()
@@ -48,30 +50,41 @@ def submit_decision(action_type: str, choice: int, reasoning: str) -> str:
         "reasoning": reasoning
     })
 
-def update_tracker(raw_log: str, current_knowledge: dict) -> tuple[dict, str]:
-    """Parses raw showdown log, updates opponent knowledge, and compacts the log."""
+def _track_move(args: List[str], knowledge: dict) -> Optional[str]:
+    pokemon_raw = args[0].split(': ')[1] if ': ' in args[0] else args[0]
+    move = args[1]
+    if pokemon_raw not in knowledge['team']:
+        knowledge['team'][pokemon_raw] = {"moves": set(), "item": "Unknown"}
+    knowledge['team'][pokemon_raw]['moves'].add(move)
+    return f"Opponent {pokemon_raw} used {move}."
+
+def _track_switch(args: List[str], knowledge: dict) -> Optional[str]:
+    pokemon_raw = args[1].split(',')[0]
+    knowledge['active_pokemon'] = pokemon_raw
+    if pokemon_raw not in knowledge['team']:
+        knowledge['team'][pokemon_raw] = {"moves": set(), "item": "Unknown"}
+    return f"Opponent switched to {pokemon_raw}."
+
+# Opponent (p1) events the tracker learns from: tag -> handler(args, knowledge)
+_TRACKERS = {
+    'move': _track_move,
+    'switch': _track_switch,
+    'drag': _track_switch,
+}
+
+def update_tracker(raw_log: Union[str, Iterable[ProtocolLine]], current_knowledge: dict) -> tuple[dict, str]:
+    """Updates opponent knowledge from the log (raw text or tokenized events) and compacts it."""
     compact_log = []
-    
-    for line in raw_log.split('\n'):
-        if line.startswith('|move|p1a:'):
-            parts = line.split('|')
-            if len(parts) >= 4:
-                pokemon_raw = parts[2].split(': ')[1] if ': ' in parts[2] else parts[2]
-                move = parts[3]
-                if pokemon_raw not in current_knowledge['team']:
-                    current_knowledge['team'][pokemon_raw] = {"moves": set(), "item": "Unknown"}
-                current_knowledge['team'][pokemon_raw]['moves'].add(move)
-                compact_log.append(f"Opponent {pokemon_raw} used {move}.")
-                
-        elif line.startswith('|switch|p1a:') or line.startswith('|drag|p1a:'):
-            parts = line.split('|')
-            if len(parts) >= 4:
-                pokemon_raw = parts[3].split(',')[0]
-                current_knowledge['active_pokemon'] = pokemon_raw
-                if pokemon_raw not in current_knowledge['team']:
-                    current_knowledge['team'][pokemon_raw] = {"moves": set(), "item": "Unknown"}
-                compact_log.append(f"Opponent switched to {pokemon_raw}.")
-                
+    events = tokenize(raw_log.split('\n')) if isinstance(raw_log, str) else raw_log
+
+    for event in events:
+        track = _TRACKERS.get(event.tag)
+        if track is None or len(event.args) < 2 or not event.args[0].startswith('p1a:'):
+            continue
+        entry = track(event.args, current_knowledge)
+        if entry:
+            compact_log.append(entry)
+
     return current_knowledge, "\n".join(compact_log)
 
 class DamageCalcInput(BaseModel):
@@ -84,48 +97,81 @@ class DamageCalcInput(BaseModel):
 @tool(args_schema=DamageCalcInput)
 def calculate_damage(gen: int, attacker_name: str, defender_name: str, move_name: str) -> str:
     """Calculates potential damage range for a given move."""
-    payload = {
-        "gen": gen,
-        "attacker": {"name": attacker_name, "details": {}},
-        "defender": {"name": defender_name, "details": {}},
-        "move": move_name
-    }
-    
-    result = subprocess.run(
-        ['node', 'calc_wrapper.js', json.dumps(payload)],
-        capture_output=True,
-        text=True
-    )
-    
-    if result.returncode != 0:
-        return f"Calculation failed: Missing data or invalid inputs. {result.stderr}"
-        
     try:
-        data = json.loads(result.stdout)
-        return f"Range: {data['damage_range']}. Summary: {data['description']}"
-    except Exception as e:
-        return f"Failed to parse calc output: {e}"
+        data = get_damage_engine(gen).calc(attacker_name, defender_name, move_name)
+    except (OSError, RuntimeError) as e:
+        return f"Calculation failed: Missing data or invalid inputs. {e}"
+    return f"Range: {data['damage_range']}. Summary: {data['description']}"
+
+def _level(details: str) -> Optional[int]:
+    """Level from a request's details string, e.g. "Garchomp, L84, M" -> 84."""
+    for part in details.split(', ')[1:]:
+        if part.startswith('L') and part[1:].isdigit():
+            return int(part[1:])
+    return None
+
+def _candidate_defenders(species: str, knowledge: dict, random_sets: dict) -> List[dict]:
+    """One labelled matrix defender per Random Battle set the opponent's
+    Pokemon could be running ("Garchomp (Fast Attacker)"), narrowed to sets
+    whose movepool has every move it has shown; plain species if none are known."""
+    entry = random_sets.get(species.lower().replace(" ", "").replace("-", "")) or {}
+    details = {"level": entry["level"]} if entry.get("level") else {}
+    if knowledge.get('item') and knowledge['item'] != 'Unknown':
+        details["item"] = knowledge['item']
+    sets = entry.get("sets") or []
+    revealed = set(knowledge.get('moves') or ())
+    sets = [s for s in sets if revealed <= set(s.get("movepool") or ())] or sets
+    if not sets:
+        if knowledge.get('ability'):
+            details["ability"] = knowledge['ability']
+        return [{"name": species, "details": details}]
+    defenders = []
+    for i, candidate in enumerate(sets, 1):
+        abilities = candidate.get("abilities") or []
+        ability = knowledge.get('ability') if knowledge.get('ability') in abilities else (abilities or [None])[0]
+        label = f"{species} ({candidate.get('role') or f'set {i}'})"
+        if any(d["label"] == label for d in defenders):
+            label = f"{species} (set {i})"
+        defenders.append({"name": species, "label": label,
+                          "details": {**details, "ability": ability} if ability else details})
+    return defenders
 
-def _run_calc(attacker_name: str, defender_name: str, move_name: str) -> str:
-    """Fast, internal damage calculation without going through Langchain tools."""
+def _damage_matrix(observation: dict, opponent_knowledge: Optional[dict], random_sets: dict) -> Optional[DamageMatrix]:
+    """Damage for our active's moves and every healthy bench Pokemon's moves
+    into the opponent's active and every revealed Pokemon (computed by the
+    damage engine, with one calc round trip for anything it cannot model)."""
+    attackers = []
+    for pokemon in observation.get('bench') or []:
+        species = pokemon.get('species')
+        if not species or species == 'Unknown' or pokemon.get('hp_info', {}).get('fainted'):
+            continue
+        if pokemon.get('active'):
+            moves = [m.get('move', m.get('id', 'Unknown')) for m in observation.get('available_moves', [])
+                     if not m.get('disabled')]
+        else:
+            moves = pokemon.get('moves') or []
+        level = _level(pokemon.get('details', ''))
+        attackers.append({"name": species, "moves": moves, "details": {"level": level} if level else {}})
+
+    defenders = []
+    known = (opponent_knowledge or {}).get('team') or {}
+    opponent_species = observation.get('opponent_active', {}).get('species')
+    for species in [opponent_species, *known]:
+        if not species or species == 'Unknown' or any(d["name"] == species for d in defenders):
+            continue
+        defenders.extend(_candidate_defenders(species, known.get(species) or {}, random_sets))
+
+    if not attackers or not defenders:
+        return None
     try:
-        payload = {
-            "gen": 9,
-            "attacker": {"name": attacker_name, "details": {}},
-            "defender": {"name": defender_name, "details": {}},
-            "move": move_name
-        }
-        result = subprocess.run(
-            ['node', 'calc_wrapper.js', json.dumps(payload)],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            return f"Calc: {data['description']}"
-    except Exception:
-        pass
-    return ""
+        return get_damage_engine().damage_matrix(attackers, defenders)
+    except (OSError, RuntimeError) as e:
+        showdown_wrapper.debug_print(f"Damage matrix failed: {e}", "CALC")
+        return None
+
+# Seconds the 1-ply scenarios of one turn may take together before the
+# stragglers are dropped
+SCENARIO_DEADLINE = 5.0
 
 class GeminiPokemonAgent:
     """Pokemon battle agent powered by Langchain and OpenRouter."""
@@ -292,6 +338,7 @@ class GeminiPokemonAgent:
                         active_species = pokemon.get('species', 'Unknown')
                         break
             opponent_species = observation.get('opponent_active', {}).get('species', 'Unknown')
+            matrix = _damage_matrix(observation, opponent_knowledge, getattr(self, 'random_sets', {}))
                 
             for move in moves:
                 move_name = move.get('move', move.get('id', 'Unknown'))
@@ -300,12 +347,30 @@ class GeminiPokemonAgent:
                 disabled_str = " [DISABLED - DO NOT CHOOSE]" if move.get('disabled') else ""
                 
                 dmg_ctx = ""
-                if not move.get('disabled') and opponent_species != 'Unknown' and active_species != 'Unknown':
-                    calc_result = _run_calc(active_species, opponent_species, move_name)
-                    if calc_result:
-                        dmg_ctx = f" [{calc_result}]"
+                if matrix and not move.get('disabled') and opponent_species != 'Unknown' and active_species != 'Unknown':
+                    # One calc per candidate set of the opponent's active
+                    calcs = []
+                    for label in matrix.defenders:
+                        if label != opponent_species and not label.startswith(f"{opponent_species} ("):
+                            continue
+                        description = matrix.description(active_species, label, move_name)
+                        if description:
+                            role = label[len(opponent_species):].strip(" ()")
+                            calcs.append(f"{role}: {description}" if role else description)
+                    if calcs:
+                        dmg_ctx = f" [Calc: {' | '.join(calcs)}]"
                         
                 prompt_parts.append(f"  {move['index']}. {move_name} ({pp_info}) [Target: {target}]{dmg_ctx}{disabled_str}")
+
+            # Every known matchup from the same matrix, no further calcs
+            if matrix:
+                prompt_parts.append("\nDamage Matchups (best move, % of target HP):")
+                for attacker in matrix.attackers:
+                    for defender in matrix.defenders:
+                        best = matrix.best_move(attacker, defender)
+                        if best:
+                            move_name, low, high = best
+                            prompt_parts.append(f"  {attacker} -> {defender}: {move_name} {low:.0f}-{high:.0f}%")
         
         # Available switches (for voluntary switching)
         switches = observation.get('available_switches', [])
@@ -408,9 +473,9 @@ If you are at a disadvantage, switch to a better defensive check.
             print(f"Failed to predict opponent move: {e}")
             return "Tackle" # Fallback
             
-    def simulate_scenario(self, p1_name: str, p1_action: dict, p2_name: str, p2_action: dict, p1_hp: float, p2_hp: float) -> str:
-        """Call simulate_turn.js to simulate the outcome of the turn."""
-        payload = {
+    @staticmethod
+    def _scenario(p1_name: str, p1_action: dict, p2_name: str, p2_action: dict, p1_hp: float, p2_hp: float) -> dict:
+        return {
             "gen": 9,
             "p1": {
                 "name": p1_name,
@@ -423,19 +488,28 @@ If you are at a disadvantage, switch to a better defensive check.
                 "action": p2_action
             }
         }
-        
+
+    @staticmethod
+    def _describe_scenario(data: Optional[dict]) -> str:
+        if data is None:
+            return "Simulation failed."
+        return f"{data['log']} (Result HP - Us: {data['p1_hp']}%, Them: {data['p2_hp']}%)"
+
+    def simulate_scenario(self, p1_name: str, p1_action: dict, p2_name: str, p2_action: dict, p1_hp: float, p2_hp: float) -> str:
+        """Simulate the outcome of the turn on the calc server (simulate_turn.js)."""
+        return self.simulate_scenarios([(p1_name, p1_action, p2_name, p2_action, p1_hp, p2_hp)])[0]
+
+    def simulate_scenarios(self, scenarios: List[tuple], deadline: float = SCENARIO_DEADLINE) -> List[str]:
+        """Simulate several turns (simulate_scenario() arguments) concurrently.
+
+        Scenarios still running after ``deadline`` seconds are reported as
+        failed rather than holding up the decision.
+        """
         try:
-            result = subprocess.run(
-                ['node', 'simulate_turn.js', json.dumps(payload)],
-                capture_output=True,
-                text=True
-            )
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                return f"{data['log']} (Result HP - Us: {data['p1_hp']}%, Them: {data['p2_hp']}%)"
-        except Exception as e:
-            pass
-        return "Simulation failed."
+            results = get_calc_client().scenarios([self._scenario(*args) for args in scenarios], deadline)
+        except (OSError, RuntimeError):
+            results = [None] * len(scenarios)
+        return [self._describe_scenario(data) for data in results]
     
     def get_battle_decision(self, observation: dict, team_knowledge: Optional[dict] = None, compact_log: str = "", opponent_knowledge: Optional[dict] = None) -> dict:
         """
@@ -480,19 +554,21 @@ If you are at a disadvantage, switch to a better defensive check.
                 opp_active = observation.get('opponent_active', {}).get('species', 'Unknown')
                 opp_hp = observation.get('opponent_active', {}).get('hp_percent', 100)
                 
+                # Every move and switch is simulated at once, under one deadline
+                actions = []
+                scenarios = []
+
                 # Simulate our moves
                 moves = observation.get('available_moves', [])
                 for m in moves:
                     if not m.get('disabled', False):
                         move_name = m.get('move', m.get('id', 'Unknown'))
-                        print(f"[DEBUG] simulating move: {move_name}")
-                        sim_result = self.simulate_scenario(
+                        actions.append((f"If we use {move_name}:", f"Move: {move_name}"))
+                        scenarios.append((
                             our_active, {"type": "move", "name": move_name},
                             opp_active, {"type": "move", "name": predicted_move},
                             our_hp, opp_hp
-                        )
-                        prompt += f"\nIf we use {move_name}:\n{sim_result}"
-                        simulations.append({"action": f"Move: {move_name}", "result": sim_result})
+                        ))
                 
                 # Simulate our switches
                 switches = observation.get('available_switches', [])
@@ -508,13 +584,17 @@ If you are at a disadvantage, switch to a better defensive check.
                         except:
                             pass
                             
-                    sim_result = self.simulate_scenario(
+                    actions.append((f"If we switch to {switch_name}:", f"Switch: {switch_name}"))
+                    scenarios.append((
                         our_active, {"type": "switch", "name": switch_name, "hp_percent": switch_hp},
                         opp_active, {"type": "move", "name": predicted_move},
                         our_hp, opp_hp
-                    )
-                    prompt += f"\nIf we switch to {switch_name}:\n{sim_result}"
-                    simulations.append({"action": f"Switch: {switch_name}", "result": sim_result})
+                    ))
+
+                print(f"[DEBUG] simulating {len(scenarios)} scenarios...")
+                for (heading, action), sim_result in zip(actions, self.simulate_scenarios(scenarios)):
+                    prompt += f"\n{heading}\n{sim_result}"
+                    simulations.append({"action": action, "result": sim_result})
                 
                 prompt += "\n"
             
@@ -725,14 +805,14 @@ def init_gemini_agent(api_key: Optional[str] = None, model_name: str = "openai/g
     _agent_instance = GeminiPokemonAgent(api_key=api_key, model_name=model_name)
     return _agent_instance
 
-def get_gemini_decision(observation: dict, team_knowledge: Optional[dict] = None, raw_log: str = "") -> dict:
+def get_gemini_decision(observation: dict, team_knowledge: Optional[dict] = None, raw_log: Union[str, List[ProtocolLine]] = "") -> dict:
     """
     Get a battle decision from the initialized Gemini agent.
     
     Args:
         observation: Current battle state
         team_knowledge: Knowledge about our team
-        raw_log: The raw showdown log for the current turn to track opponent info
+        raw_log: The showdown log for the current turn (raw or tokenized) to track opponent info
         
     Returns:
         Decision dictionary
@@ -0,0 +1,253 @@
+"""Humanized battle feed: protocol lines to short English sentences.
+
+Every tag shown in the feed has an entry in TEMPLATES. Most entries are a
+format string, compiled once at import: ``{name}`` and ``{side}`` are the
+Pokemon and side label of the first argument (``p1a: Garchomp``), ``{0}``,
+``{1}``, ... the raw arguments. Tags whose text depends on an argument value
+(a ``cant`` reason, HP that may be a faint) map to a small function instead.
+
+A Humanizer is one battle's feed: it memoizes the text of lines it has seen,
+since battles repeat many lines verbatim (residual weather, hazard damage,
+the same move into the same target).
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from battle_state import parse_actor
+from protocol import Event, ProtocolLine, as_event
+
+# A Humanizer forgets everything once it holds this many lines
+MEMO_LIMIT = 4096
+
+
+def side_label(side: Optional[str]) -> str:
+    return side.upper() if side in ("p1", "p2") else "?"
+
+
+STATUS_NAMES = {
+    "par": "paralyzed",
+    "slp": "asleep",
+    "frz": "frozen",
+    "brn": "burned",
+    "psn": "poisoned",
+    "tox": "badly poisoned",
+}
+
+WEATHER_NAMES = {
+    "sunnyday": "harsh sunlight",
+    "raindance": "rain",
+    "sandstorm": "sandstorm",
+    "hail": "hail",
+}
+
+FIELD_HAZARDS = (
+    ("Stealth Rock", "Stealth Rock was"),
+    ("Spikes", "Spikes were"),
+    ("Toxic Spikes", "Toxic Spikes were"),
+    ("Sticky Web", "Sticky Web was"),
+)
+
+CANT_REASONS = {
+    "flinch": "{name} flinched and couldn't move!",
+    "par": "{name} is paralyzed and can't move!",
+    "slp": "{name} is fast asleep!",
+}
+
+
+def _move(tag: str, args: List[str]) -> Optional[str]:
+    side, name = parse_actor(args[0])
+    base = f"{side_label(side)} {name} used {args[1]}"
+    if len(args) >= 3:
+        _, target = parse_actor(args[2])
+        if target:
+            base += f" on {target}"
+    return base
+
+
+def _hp(tag: str, args: List[str]) -> Optional[str]:
+    hp = args[1]
+    if "fnt" in hp:
+        return f"{parse_actor(args[0])[1]} fainted!"
+    # Skip percentage-only updates to reduce noise
+    if hp.endswith("/100"):
+        return None
+    return f"{parse_actor(args[0])[1]}: {hp}"
+
+
+def _switch(tag: str, args: List[str]) -> Optional[str]:
+    side, name = parse_actor(args[0])
+    verb = "sent out" if tag == "switch" else "was dragged out"
+    msg = f"{side_label(side)} {verb} {name}"
+    if len(args) >= 3 and args[2]:
+        msg += f" ({args[2]})"
+    return msg
+
+
+def _boost(tag: str, args: List[str]) -> Optional[str]:
+    _, name = parse_actor(args[0])
+    levels = "sharply " if int(args[2]) >= 2 else ""
+    direction = "rose" if tag == "-boost" else "fell"
+    return f"{name}'s {args[1]} {levels}{direction}!"
+
+
+def _status(tag: str, args: List[str]) -> Optional[str]:
+    _, name = parse_actor(args[0])
+    return f"{name} was {STATUS_NAMES.get(args[1], args[1])}!"
+
+
+def _start(tag: str, args: List[str]) -> Optional[str]:
+    _, name = parse_actor(args[0])
+    effect = args[1]
+    if effect == "typechange" and len(args) >= 3:
+        return f"{name} became {args[2]} type!"
+    elif "ability:" in effect:
+        return f"{name}'s {effect.split('ability: ')[1]} activated!"
+    return f"{name} started {effect}"
+
+
+def _weather(tag: str, args: List[str]) -> Optional[str]:
+    return f"The weather became {WEATHER_NAMES.get(args[0], args[0])}!"
+
+
+def _field(tag: str, args: List[str]) -> Optional[str]:
+    field_effect = args[0]
+    for needle, subject in FIELD_HAZARDS:
+        if needle in field_effect:
+            return f"{subject} set up!" if tag == "-fieldstart" else f"{subject} removed!"
+    if tag == "-fieldstart":
+        return f"Field effect: {field_effect}"
+    return f"Field effect ended: {field_effect}"
+
+
+def _side_condition(tag: str, args: List[str]) -> Optional[str]:
+    side = args[0]
+    effect = args[1]
+    if "move:" in effect:
+        effect = effect.split("move: ")[1]
+    if tag == "-sidestart":
+        return f"{effect} protected {side_label(side)}'s team."
+    return f"{side_label(side)}'s {effect} wore off."
+
+
+def _cant(tag: str, args: List[str]) -> Optional[str]:
+    _, name = parse_actor(args[0])
+    template = CANT_REASONS.get(args[1])
+    if template is None:
+        return f"{name} can't move due to {args[1]}!"
+    return template.format(name=name)
+
+
+def _activate(tag: str, args: List[str]) -> Optional[str]:
+    effect = args[1]
+    if "ability:" in effect:
+        _, name = parse_actor(args[0])
+        return f"{name}'s {effect.split('ability: ')[1]} activated!"
+    return None  # Skip other activation messages as they're often too technical
+
+
+# tag -> (minimum number of arguments, format string or handler(tag, args)).
+# Tags not listed here (gametype, request, upkeep, ...) are not shown.
+TEMPLATES: Dict[str, Tuple[int, object]] = {
+    "turn": (1, "-- Turn {0} --"),
+    "move": (2, _move),
+    "-supereffective": (0, "It's super effective!"),
+    "-resisted": (0, "It's not very effective..."),
+    "-crit": (0, "A critical hit!"),
+    "-miss": (0, "It missed!"),
+    "-immune": (0, "It had no effect."),
+    "-fail": (0, "But it failed!"),
+    "-damage": (2, _hp),
+    "-heal": (2, _hp),
+    "-sethp": (2, _hp),
+    "-residual": (2, "{name} was hurt by residual damage!"),
+    "-recoil": (2, "{name} was hurt by recoil!"),
+    "-drain": (2, "{name} absorbed health!"),
+    "faint": (1, "{name} fainted!"),
+    "switch": (1, _switch),
+    "drag": (1, _switch),
+    "mega": (2, "{name} Mega-Evolved!"),
+    "-formechange": (2, "{name} transformed into {1}!"),
+    "detailschange": (2, "{name} changed to {1}!"),
+    "-boost": (3, _boost),
+    "-unboost": (3, _boost),
+    "-clearboost": (1, "{name}'s stat changes were cleared!"),
+    "-clearallboost": (0, "All stat changes were reset!"),
+    "-status": (2, _status),
+    "-curestatus": (2, "{name} was cured of {1}!"),
+    "-start": (2, _start),
+    "-end": (2, "{name} ended {1}"),
+    "win": (1, "🎉 Winner: {0} 🎉"),
+    "tie": (0, "The battle ended in a tie!"),
+    "-weather": (1, _weather),
+    "-fieldstart": (1, _field),
+    "-fieldend": (1, _field),
+    "-sidestart": (2, _side_condition),
+    "-sideend": (2, _side_condition),
+    "-item": (2, "{name} obtained {1}!"),
+    "-enditem": (2, "{name} consumed its {1}!"),
+    "-ability": (2, "{name}'s {1} activated!"),
+    "ability": (2, "{name}'s {1} was revealed!"),
+    "cant": (2, _cant),
+    "-activate": (2, _activate),
+}
+
+
+def _compile(template) -> Callable[[str, List[str]], Optional[str]]:
+    if callable(template):
+        return template
+    if "{name}" in template or "{side}" in template:
+        fmt = template.format
+
+        def render(tag: str, args: List[str]) -> Optional[str]:
+            side, name = parse_actor(args[0])
+            return fmt(*args, name=name, side=side_label(side))
+
+        return render
+    if "{" in template:
+        fmt = template.format
+        return lambda tag, args: fmt(*args)
+    return lambda tag, args: template
+
+
+_COMPILED = {tag: (min_args, _compile(template)) for tag, (min_args, template) in TEMPLATES.items()}
+
+
+def humanize(line: Event) -> Optional[str]:
+    """Feed text for one line (raw or tokenized), or None if it is not shown."""
+    event = line if line.__class__ is ProtocolLine else as_event(line)
+    entry = _COMPILED.get(event.tag)
+    if entry is None or len(event.args) < entry[0]:
+        return None
+    return entry[1](event.tag, event.args)
+
+
+class Humanizer:
+    """The feed for one battle, memoizing repeated lines (see MEMO_LIMIT)."""
+
+    __slots__ = ("_memo", "hits", "misses")
+
+    def __init__(self):
+        self._memo: Dict[str, Optional[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, line: Event) -> Optional[str]:
+        event = line if line.__class__ is ProtocolLine else as_event(line)
+        entry = _COMPILED.get(event.tag)
+        if entry is None or len(event.args) < entry[0]:
+            return None
+        memo = self._memo
+        key = event.raw
+        if key in memo:
+            self.hits += 1
+            return memo[key]
+        self.misses += 1
+        if len(memo) >= MEMO_LIMIT:
+            memo.clear()
+        text = memo[key] = entry[1](event.tag, event.args)
+        return text
+
+    def reset(self):
+        """Forget everything, e.g. when a new battle starts."""
+        self._memo.clear()
+        self.hits = self.misses = 0
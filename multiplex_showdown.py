@@ -0,0 +1,217 @@
+import itertools
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+from showdown_wrapper import ProtocolFramer, debug_print, iter_pipe_lines, logger
+
+
+class MultiplexedSimulator:
+    """One long-lived Node sidecar (simulator_sidecar.js) hosting many battles.
+
+    Lines are tagged with "<battle id>\\t" in both directions; the reader
+    thread strips the tag and routes each line to its battle's wrapper, so a
+    single process serves every concurrent battle.
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", sidecar="simulator_sidecar.js"):
+        debug_print(f"Starting multiplexed simulator sidecar with path: {ps_path}", "MULTIPLEX")
+        self.proc = subprocess.Popen(
+            ["node", sidecar, ps_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        self.battles = {}
+        self._ids = itertools.count(1)
+        self._write_lock = threading.Lock()
+        self.listener = threading.Thread(target=self._enqueue_output, daemon=True)
+        self.err_listener = threading.Thread(target=self._enqueue_stderr, daemon=True)
+        self.listener.start()
+        self.err_listener.start()
+
+    def _enqueue_output(self):
+        try:
+            for lines in iter_pipe_lines(self.proc.stdout):
+                # Group the chunk by battle so each framer gets one batch
+                batches = {}
+                for line in lines:
+                    battle_id, sep, payload = line.partition("\t")
+                    if sep:
+                        batches.setdefault(battle_id, []).append(payload)
+                for battle_id, payloads in batches.items():
+                    battle = self.battles.get(battle_id)
+                    if battle is not None:
+                        battle._feed_lines(payloads)
+        except Exception as e:
+            logger.warning("Error in multiplexed output listener: %s", e)
+        # The sidecar is gone: every battle it hosted has ended with it
+        for battle in list(self.battles.values()):
+            battle._feed_eof()
+        debug_print("Multiplexed output listener ended", "MULTIPLEX")
+
+    def _enqueue_stderr(self):
+        try:
+            for lines in iter_pipe_lines(self.proc.stderr):
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[stderr] %s", "".join(lines).rstrip())
+        except Exception as e:
+            logger.warning("Error in multiplexed error listener: %s", e)
+
+    def _write(self, battle_id: str, msg: str):
+        payload = "".join(f"{battle_id}\t{line}\n" for line in msg.splitlines() if line)
+        with self._write_lock:
+            self.proc.stdin.write(payload.encode("utf-8"))
+            self.proc.stdin.flush()
+
+    def new_battle(self) -> "MultiplexedShowdownWrapper":
+        """Register a battle without starting it; the caller sends >start."""
+        battle_id = f"b{next(self._ids)}"
+        battle = MultiplexedShowdownWrapper(self, battle_id)
+        self.battles[battle_id] = battle
+        return battle
+
+    def open(self, formatid="gen7ou", seed=None, input_log=None) -> "MultiplexedShowdownWrapper":
+        """Start a new battle on the sidecar and return its wrapper."""
+        battle = self.new_battle()
+        battle.start(formatid, seed, input_log)
+        return battle
+
+    def load(self, snapshot: dict) -> "MultiplexedShowdownWrapper":
+        """Start a new battle from a snapshot taken with snapshot()."""
+        battle = self.new_battle()
+        self._write(battle.battle_id, ">load " + json.dumps(snapshot, separators=(",", ":")))
+        battle.started = True
+        return battle
+
+    def _forget(self, battle_id: str):
+        self.battles.pop(battle_id, None)
+
+    def close(self):
+        try:
+            self.proc.terminate()
+        except Exception:
+            pass
+
+
+class MultiplexedShowdownWrapper(ProtocolFramer):
+    """Per-battle view of a MultiplexedSimulator with ShowdownWrapper's interface.
+
+    Overflow defaults to "drop_oldest": every battle shares one reader thread,
+    so blocking it on one slow consumer would stall all the others. Only
+    spectator update blocks are ever dropped (see ProtocolFramer), so a
+    battle never loses the request it is waiting for.
+    """
+
+    def __init__(self, mux: MultiplexedSimulator, battle_id: str, request_settle=0.05,
+                 max_queue=1024, overflow="drop_oldest"):
+        super().__init__(request_settle, max_queue, overflow)
+        self.mux = mux
+        self.battle_id = battle_id
+        self.proc = mux.proc
+        self.started = False
+        self._snapshots = queue.Queue()
+
+    def _put(self, item):
+        # Snapshot replies answer snapshot() and never reach protocol consumers
+        if item is not None and item[1][0].strip() == "snapshot":
+            self._snapshots.put(item[1][1] if len(item[1]) > 1 else "null")
+            return
+        if item is None:
+            self._snapshots.put(None)
+        super()._put(item)
+
+    def start(self, formatid="gen7ou", seed=None, input_log=None):
+        self.send(self._start_command(formatid, seed, input_log))
+        self.started = True
+
+    def send(self, msg: str):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending [%s]: %s", self.battle_id, msg.strip())
+        try:
+            self.mux._write(self.battle_id, msg)
+            self.last_send_time = time.monotonic()
+            self._record_input(msg)
+        except Exception as e:
+            logger.warning("Error sending message: %s", e)
+
+    def snapshot(self, timeout=5.0) -> dict:
+        """Serialize the battle's full state with Showdown's Battle.toJSON()."""
+        self.mux._write(self.battle_id, ">snapshot")
+        try:
+            payload = self._snapshots.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No snapshot from battle {self.battle_id} within {timeout}s")
+        state = json.loads(payload) if payload else None
+        if state is None:
+            raise RuntimeError(f"Battle {self.battle_id} has no state to snapshot")
+        return state
+
+    def fork(self) -> "MultiplexedShowdownWrapper":
+        """Copy this battle, as it stands now, into a new independent battle.
+
+        The copy is made inside the sidecar from the serialized state, so
+        nothing is re-simulated. It produces no output until it is sent a
+        choice; its pending requests are the ones this battle last received.
+        """
+        child = self.mux.new_battle()
+        self.mux._write(self.battle_id, f">fork {child.battle_id}")
+        child.started = True
+        child.seed = self.seed
+        child.input_log = list(self.input_log)
+        return child
+
+    _TURN_END = ("|turn|", "|upkeep", "|win|", "|tie", "|error|")
+
+    def _wait_for_turn(self, timeout):
+        """Collect output until the turn resolves, the battle ends, or timeout."""
+        lines = []
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            out = self.wait_for_output(remaining)
+            lines.extend(out)
+            if not out or any(line.startswith(self._TURN_END) for line in out):
+                break
+        return lines
+
+    def try_choices(self, candidates, timeout=2.0, with_state=False):
+        """Play each candidate set of choices on its own fork of this battle.
+
+        ``candidates`` is a list of dicts mapping side to choice, e.g.
+        ``{"p1": "move 1", "p2": "switch 3"}``. All forks run concurrently
+        in the sidecar. Returns one dict per candidate holding its
+        ``choices``, the protocol ``lines`` they produced and, if
+        ``with_state``, the resulting ``state`` snapshot.
+        """
+        forks = [self.fork() for _ in candidates]
+        try:
+            for child, choices in zip(forks, candidates):
+                child.send("\n".join(f">{side} {choice}" for side, choice in choices.items()))
+            results = []
+            for child, choices in zip(forks, candidates):
+                result = {"choices": choices, "lines": child._wait_for_turn(timeout)}
+                if with_state:
+                    result["state"] = child.snapshot(timeout)
+                results.append(result)
+            return results
+        finally:
+            for child in forks:
+                child.close()
+
+    def close(self):
+        """End this battle; the shared sidecar keeps running."""
+        self._closing = True
+        self._close_input_log()
+        try:
+            self.mux._write(self.battle_id, ">close")
+        except Exception:
+            pass
+        self.mux._forget(self.battle_id)
+        self._feed_eof()
@@ -1,7 +1,6 @@
 import os
 import json
 import asyncio
-import subprocess
 from dotenv import load_dotenv
 
 from typing import Optional
@@ -10,26 +9,16 @@ from poke_env.player import Player
 from langchain_openrouter import ChatOpenRouter
 from langchain_core.messages import SystemMessage, HumanMessage
 
+from damage_engine import get_damage_engine
+
 load_dotenv()
 
 
 def _run_calc(attacker_name: str, defender_name: str, move_name: str) -> str:
     try:
-        payload = {
-            "gen": 9,
-            "attacker": {"name": attacker_name, "details": {}},
-            "defender": {"name": defender_name, "details": {}},
-            "move": move_name,
-        }
-        result = subprocess.run(
-            ["node", "calc_wrapper.js", json.dumps(payload)],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            return f"Calc: {data['description']}"
-    except Exception:
+        data = get_damage_engine().calc(attacker_name, defender_name, move_name)
+        return f"Calc: {data['description']}"
+    except (OSError, RuntimeError):
         pass
     return ""
 
@@ -0,0 +1,50 @@
+"""Single-pass tokenizer for Showdown simulator protocol lines.
+
+A line such as ``|switch|p1a: Charizard|Charizard, L50, M|153/153`` is split
+on ``|`` once into a ProtocolLine with ``tag == "switch"`` and
+``args == ["p1a: Charizard", "Charizard, L50, M", "153/153"]``; every
+consumer (battle state, humanized feed, opponent tracker, server loop)
+works from that instead of re-splitting the raw text.
+"""
+
+from typing import Iterable, List, Union
+
+
+class ProtocolLine:
+    """One protocol line: the raw text, its tag and its arguments.
+
+    ``tag`` is None for lines that do not start with ``|`` (stream markers
+    such as ``update`` or ``p1``, or input echoes like ``>player p1 {...}``
+    whose JSON may contain ``|``); ``args`` is then empty.
+    """
+
+    __slots__ = ("raw", "tag", "args")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        if raw.startswith("|"):
+            parts = raw.strip().split("|")
+            self.tag = parts[1]
+            self.args = parts[2:]
+        else:
+            self.tag = None
+            self.args = []
+
+    def arg(self, index: int, default: str = "") -> str:
+        return self.args[index] if index < len(self.args) else default
+
+    def __repr__(self):
+        return f"ProtocolLine({self.raw.rstrip()!r})"
+
+
+Event = Union[str, ProtocolLine]
+
+
+def tokenize(lines: Iterable[str]) -> List[ProtocolLine]:
+    """Tokenize a batch of raw lines (e.g. one split_channels() channel)."""
+    return [ProtocolLine(line) for line in lines]
+
+
+def as_event(line: Event) -> ProtocolLine:
+    """Accept a raw line or an already tokenized one."""
+    return line if isinstance(line, ProtocolLine) else ProtocolLine(line)
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+
+from showdown_wrapper import debug_print
+from team_service import TeamService
+
+
+def is_random_format(formatid: str) -> bool:
+    """Whether Showdown generates teams for ``formatid`` (gen9randombattle, gen8randomdoublesbattle, ...)."""
+    return "random" in formatid
+
+
+class RandomTeamPool:
+    """Random teams generated ahead of time, per format, by a background worker.
+
+    A worker thread asks its own team service (team_service.js) for teams
+    whenever a format that has been requested or warmed drops to
+    ``low_water`` teams, topping it back up to ``target`` in one batch. get()
+    pops a ready team in O(1) and only blocks when the pool for that format
+    is empty. Generation happens in the Node process and the worker thread,
+    never on the caller's thread. Formats are refilled round-robin, and a
+    format whose generation failed is left alone until get() asks for it
+    again, so one bad format cannot starve the others.
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", target=8, low_water=2):
+        if target < 1 or low_water >= target:
+            raise ValueError(f"Invalid team pool size: target={target}, low_water={low_water}")
+        self.ps_path = ps_path
+        self.target = target
+        self.low_water = low_water
+        self.generated = 0
+        self._teams = {}
+        self._waiting = {}
+        self._errors = {}
+        self._last = None
+        self._service = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _needs_teams(self):
+        """A format to generate for, or None. Caller holds the lock.
+
+        Starts after the last format served; a format someone is blocked on
+        with no teams ready wins over one that is merely below low water.
+        """
+        formats = list(self._teams)
+        start = formats.index(self._last) + 1 if self._last in formats else 0
+        low = None
+        for formatid in formats[start:] + formats[:start]:
+            if formatid in self._errors:
+                continue
+            teams = self._teams[formatid]
+            if self._waiting.get(formatid) and not teams:
+                return formatid
+            if low is None and len(teams) <= self.low_water:
+                low = formatid
+        return low
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (formatid := self._needs_teams()) is None:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._last = formatid
+                count = self.target - len(self._teams[formatid])
+            try:
+                if self._service is None or not self._service.alive():
+                    self._service = TeamService(self.ps_path)
+                teams = self._service.generate(formatid, count)
+            except (OSError, RuntimeError) as e:
+                debug_print(f"Random team generation failed for {formatid}: {e}", "TEAM_POOL")
+                with self._cond:
+                    # Not retried until a get() for the format clears the error
+                    self._errors[formatid] = str(e)
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._teams[formatid].extend(teams)
+                self._errors.pop(formatid, None)
+                self.generated += len(teams)
+                self._cond.notify_all()
+            debug_print(f"Generated {len(teams)} {formatid} team(s)", "TEAM_POOL")
+
+    def warm(self, formatid: str):
+        """Start filling the pool for ``formatid`` before anyone asks for a team."""
+        with self._cond:
+            if formatid not in self._teams:
+                self._teams[formatid] = deque()
+                self._cond.notify_all()
+
+    def get(self, formatid: str, timeout=30.0) -> str:
+        """A packed random team for ``formatid``.
+
+        Blocks only while the pool for the format is empty; raises
+        RuntimeError if generation fails or takes longer than ``timeout``.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            teams = self._teams.setdefault(formatid, deque())
+            self._waiting[formatid] = self._waiting.get(formatid, 0) + 1
+            self._errors.pop(formatid, None)
+            self._cond.notify_all()
+            try:
+                while not teams:
+                    if self._closed:
+                        raise RuntimeError("Random team pool is closed")
+                    if formatid in self._errors:
+                        raise RuntimeError(self._errors[formatid])
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(f"No {formatid} team generated within {timeout}s")
+                    self._cond.wait(remaining)
+                team = teams.popleft()
+            finally:
+                self._waiting[formatid] -= 1
+            if len(teams) <= self.low_water:
+                self._cond.notify_all()
+            return team
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "ready": {formatid: len(teams) for formatid, teams in self._teams.items()},
+                "generated": self.generated,
+                "target": self.target,
+                "low_water": self.low_water,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._service is not None:
+            self._service.close()
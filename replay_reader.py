@@ -0,0 +1,171 @@
+"""Streaming reader for archives of Showdown battle logs.
+
+Files are memory-mapped and read a line at a time, and battles are yielded
+one by one as lists of ProtocolLines, so memory use is bounded by the
+longest single battle, not by the archive. Supported layouts:
+
+  ``.log``    protocol text, raw simulator output or a replay's ``log``,
+              with any number of battles back to back (a battle ends at
+              ``|win|``/``|tie`` or when the next ``|init|`` starts)
+  ``.jsonl``  one replay JSON object per line, with the protocol text in
+              ``log`` (as served by ``replay.pokemonshowdown.com/<id>.json``)
+  ``.zst``    either of the above compressed with zstd (``battles.log.zst``);
+              needs the optional ``zstandard`` package
+
+Every battle's lines go through split_channels(), so ``|split|`` pairs and
+``update``/``sideupdate`` framing resolve the same way they do live, and the
+events can be fed straight to ``cli._update_battle_state_from_line``.
+"""
+
+import io
+import mmap
+import os
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+import orjson
+
+from protocol import ProtocolLine, tokenize
+from showdown_wrapper import debug_print, split_channels
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SUFFIXES = (".log", ".jsonl", ".log.zst", ".jsonl.zst")
+# Mapped pages behind the read position are given back in steps of this size
+RELEASE_BYTES = 8 << 20
+
+
+@dataclass(slots=True)
+class ReplayBattle:
+    """One battle read from an archive."""
+
+    source: str
+    index: int
+    events: List[ProtocolLine]
+    battle_id: Optional[str] = None
+    format: Optional[str] = None
+
+
+def _open_lines(path: str, stack) -> Iterator[bytes]:
+    """Memory-map ``path`` and return an iterator over its (decompressed) lines."""
+    f = open(path, "rb")
+    stack.append(f)
+    if os.fstat(f.fileno()).st_size == 0:
+        return iter(())
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    stack.append(mm)
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    if not path.endswith(".zst"):
+        return _release_behind(mm, iter(mm.readline, b""))
+    if zstandard is None:
+        raise RuntimeError(f"Reading {path} needs the zstandard package (pip install zstandard)")
+    reader = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(mm), 1 << 16)
+    stack.append(reader)
+    return _release_behind(mm, iter(reader.readline, b""))
+
+
+def _release_behind(mm: mmap.mmap, lines: Iterator[bytes]) -> Iterator[bytes]:
+    """Pass ``lines`` through, dropping the already-read part of ``mm`` from
+    the process every RELEASE_BYTES so resident memory stays flat."""
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        yield from lines
+        return
+    released = 0
+    for count, line in enumerate(lines):
+        yield line
+        if count & 0xFFF == 0:
+            done = mm.tell() // mmap.PAGESIZE * mmap.PAGESIZE
+            if done - released >= RELEASE_BYTES:
+                mm.madvise(mmap.MADV_DONTNEED, released, done - released)
+                released = done
+
+
+def _battle(source, index, lines, battle_id=None, formatid=None) -> ReplayBattle:
+    events = tokenize(split_channels(lines, ("omniscient",))["omniscient"])
+    return ReplayBattle(source, index, events, battle_id, formatid)
+
+
+def _without_end_block(lines: Iterable[str]) -> Iterator[str]:
+    in_end = False
+    for line in lines:
+        if in_end or line.rstrip() == "end":
+            # The simulator's closing ``end`` block is a JSON summary, not protocol
+            in_end = bool(line.strip())
+            continue
+        yield line
+
+
+def _log_battles(path: str, lines: Iterable[bytes]) -> Iterator[ReplayBattle]:
+    current = []
+    in_battle = False
+    index = 0
+    for line in _without_end_block(raw.decode("utf-8", "replace") for raw in lines):
+        if line.startswith("|init|") and in_battle:
+            yield _battle(path, index, current)
+            index += 1
+            current = []
+        current.append(line)
+        if line.startswith("|"):
+            in_battle = True
+            if line.startswith("|win|") or line.rstrip() == "|tie":
+                yield _battle(path, index, current)
+                index += 1
+                current = []
+                in_battle = False
+    if in_battle:
+        yield _battle(path, index, current)
+
+
+def _jsonl_battles(path: str, lines: Iterable[bytes]) -> Iterator[ReplayBattle]:
+    index = 0
+    for lineno, raw in enumerate(lines, 1):
+        if not raw.strip():
+            continue
+        try:
+            replay = orjson.loads(raw)
+            log = replay["log"]
+        except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+            debug_print(f"Skipping malformed replay at {path}:{lineno}: {e}", "REPLAY")
+            continue
+        yield _battle(
+            path,
+            index,
+            list(_without_end_block(log.splitlines(keepends=True))),
+            replay.get("id"),
+            replay.get("formatid") or replay.get("format"),
+        )
+        index += 1
+
+
+def iter_battles(path: str) -> Iterator[ReplayBattle]:
+    """Yield the battles in one archive file, in order."""
+    base = path[:-4] if path.endswith(".zst") else path
+    parse = _jsonl_battles if base.endswith(".jsonl") else _log_battles
+    stack = []
+    try:
+        yield from parse(path, _open_lines(path, stack))
+    finally:
+        for resource in reversed(stack):
+            resource.close()
+
+
+def find_replay_files(root: str) -> List[str]:
+    """Every replay archive under ``root`` (or ``root`` itself if it is a file), sorted."""
+    if os.path.isfile(root):
+        return [root]
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith(SUFFIXES))
+    return paths
+
+
+def iter_archive(roots: Iterable[str]) -> Iterator[ReplayBattle]:
+    """Yield every battle from every archive file under ``roots``."""
+    for root in roots:
+        for path in find_replay_files(root):
+            yield from iter_battles(path)
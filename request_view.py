@@ -0,0 +1,77 @@
+"""Parsed ``|request|`` payloads with the legal choices worked out once.
+
+A RequestView is the request dict itself (every ``req.get("side")`` style
+lookup keeps working), parsed with orjson, plus lazily computed and cached
+lists of the legal moves, switches and forced-switch options. The simulator
+sends a fresh request for every decision, so nothing here ever needs to be
+invalidated; the cached lists are shared and must be treated as read-only.
+"""
+
+from functools import cached_property
+from typing import List, Optional
+
+import orjson
+
+JSONDecodeError = orjson.JSONDecodeError
+
+
+class RequestView(dict):
+    """One side's request, with cached move/switch options."""
+
+    @classmethod
+    def parse(cls, payload) -> "RequestView":
+        """Parse a request payload (str or bytes); raises JSONDecodeError."""
+        return cls(orjson.loads(payload))
+
+    @classmethod
+    def of(cls, req: Optional[dict]) -> "RequestView":
+        """``req`` itself if it is already a view, else a view over a copy of it."""
+        if isinstance(req, cls):
+            return req
+        return cls(req or ())
+
+    @cached_property
+    def _pokemon(self) -> list:
+        return (self.get("side") or {}).get("pokemon") or []
+
+    @cached_property
+    def moves(self) -> List[dict]:
+        """Non-disabled moves of the first active slot, tagged with ``original_index``."""
+        active = self.get("active")
+        if not active:
+            return []
+        moves = []
+        for i, m in enumerate(active[0].get("moves", []), 1):
+            if not m.get("disabled"):
+                move = dict(m)
+                move["original_index"] = i
+                moves.append(move)
+        return moves
+
+    @cached_property
+    def move_indices(self) -> List[int]:
+        return [m["original_index"] for m in self.moves]
+
+    @cached_property
+    def switches(self) -> List[dict]:
+        """Every non-fainted team member as ``{"index": slot, "pokemon": data}``."""
+        return [
+            {"index": i, "pokemon": p}
+            for i, p in enumerate(self._pokemon, start=1)
+            if "fnt" not in p.get("condition", "")
+        ]
+
+    @cached_property
+    def switch_indices(self) -> List[int]:
+        return [s["index"] for s in self.switches]
+
+    @cached_property
+    def forced_switch_options(self) -> List[dict]:
+        """Switches for a forced switch: slot 1 (the mon being replaced) is left
+        out unless nothing else is alive."""
+        # The active Pokemon is always reported in slot 1, and on a forced
+        # switch that is the one that just fainted or is being pulled out
+        switches = self.switches
+        if switches and switches[0]["index"] == 1:
+            return switches[1:] or switches
+        return switches
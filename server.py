@@ -1,16 +1,105 @@
 import asyncio
 import json
+import os
 import time
+import uuid
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import threading
-
-from showdown_wrapper import ShowdownWrapper, generate_random_team
+from contextlib import asynccontextmanager
+
+from showdown_wrapper import parse_seed, split_channels
+from protocol import tokenize
+from humanizer import Humanizer
+from calc_cache import log_calc_cache_stats
+from simulator_pool import SimulatorPool
+from random_team_pool import RandomTeamPool, is_random_format
+from multiplex_showdown import MultiplexedSimulator
+from simulator_supervisor import SupervisedShowdownWrapper
 import cli
 from gemini_agent import init_gemini_agent
 
-app = FastAPI()
+# Local battles run either on warm per-battle processes (sized via
+# SIM_POOL_MIN/SIM_POOL_MAX) or, with SHOWDOWN_MULTIPLEX=1, all on one sidecar.
+MULTIPLEX = os.getenv("SHOWDOWN_MULTIPLEX") == "1"
+sim_pool = None
+multiplexer = None
+team_pool = None
+DEFAULT_LOCAL_FORMAT = "gen9randombattle"
+
+
+def get_sim_pool() -> SimulatorPool:
+    global sim_pool
+    if sim_pool is None:
+        sim_pool = SimulatorPool(
+            min_size=int(os.getenv("SIM_POOL_MIN", "2")),
+            max_size=int(os.getenv("SIM_POOL_MAX", "16")),
+        )
+    return sim_pool
+
+
+def get_team_pool() -> RandomTeamPool:
+    global team_pool
+    if team_pool is None:
+        team_pool = RandomTeamPool(
+            target=int(os.getenv("TEAM_POOL_TARGET", "8")),
+            low_water=int(os.getenv("TEAM_POOL_LOW_WATER", "2")),
+        )
+    return team_pool
+
+
+def get_multiplexer() -> MultiplexedSimulator:
+    global multiplexer
+    if multiplexer is None or multiplexer.proc.poll() is not None:
+        multiplexer = MultiplexedSimulator()
+    return multiplexer
+
+
+def input_log_path(formatid: str):
+    """Where to record a local battle's input log, if INPUT_LOG_DIR is set."""
+    log_dir = os.getenv("INPUT_LOG_DIR")
+    if not log_dir:
+        return None
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(log_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{formatid}-{uuid.uuid4().hex[:8]}.log")
+
+
+def acquire_local_sim(formatid: str, seed=None) -> SupervisedShowdownWrapper:
+    """Start a local battle that is rebuilt on a fresh simulator if Node dies."""
+    input_log = input_log_path(formatid)
+    if MULTIPLEX:
+        spawn = lambda: get_multiplexer().new_battle()
+        release = lambda sim: sim.close()
+    else:
+        pool = get_sim_pool()
+        spawn = lambda: pool.acquire_unstarted(timeout=30)
+        release = pool.release
+    return SupervisedShowdownWrapper(spawn, release, formatid, seed, input_log)
+
+
+def release_local_sim(sim):
+    # The supervisor hands its current process back to wherever it came from
+    sim.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MULTIPLEX:
+        get_multiplexer()
+    else:
+        get_sim_pool()
+    get_team_pool().warm(DEFAULT_LOCAL_FORMAT)
+    yield
+    if team_pool is not None:
+        team_pool.close()
+    if sim_pool is not None:
+        sim_pool.close()
+    if multiplexer is not None:
+        multiplexer.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +124,9 @@ class BattleSession:
     def __init__(self, websocket: WebSocket, loop: asyncio.AbstractEventLoop):
         self.ws = websocket
         self.loop = loop
+        # Cleared as soon as a send fails or the socket closes; nothing is
+        # humanized or sent after that, even while the battle loop winds down
+        self.connected = True
         self.sim = None
         self.running = False
         self.bg_thread = None
@@ -45,6 +137,7 @@ class BattleSession:
         self.requests = {}
         self.shown_rqid = {"p1": None, "p2": None}
         self.battle_state = cli._new_battle_state()
+        self.humanizer = Humanizer()
         self.current_turn = 0
         self.team_knowledge = None
         self.announced_room = False
@@ -53,6 +146,8 @@ class BattleSession:
     # Outbound helpers (thread-safe: scheduled onto the asyncio loop)
     # ------------------------------------------------------------------ #
     def _send(self, payload: dict):
+        if not self.connected:
+            return
         try:
             fut = asyncio.run_coroutine_threadsafe(
                 self.ws.send_text(json.dumps(payload)), self.loop
@@ -60,6 +155,8 @@ class BattleSession:
             fut.result(timeout=5)
         except Exception as e:
             print(f"WS send error: {repr(e)}")
+            # The client is gone (or stuck); stop humanizing and sending for it
+            self.connected = False
 
     # ------------------------------------------------------------------ #
     # Battle startup
@@ -73,7 +170,7 @@ class BattleSession:
             print("Warning: Gemini not configured via ENV")
 
         self.remote = bool(config.get("remote", True))
-        battle_format = config.get("format") or "gen9randombattle"
+        battle_format = config.get("format") or DEFAULT_LOCAL_FORMAT
 
         if self.remote:
             username = (config.get("username") or "").strip()
@@ -93,9 +190,26 @@ class BattleSession:
                 return
             self._send({"type": "status", "message": f"Searching for a {battle_format} battle..."})
         else:
-            p1_team = generate_random_team(formatid=battle_format)
-            p2_team = generate_random_team(formatid=battle_format)
-            self.sim = ShowdownWrapper(formatid=battle_format)
+            if not is_random_format(battle_format):
+                self._send({"type": "error", "message": f"Local battles need a random battle format, not {battle_format}."})
+                self.running = False
+                return
+            # Teams come pre-generated; get() only blocks (off the loop) when the pool is dry
+            pool = get_team_pool()
+            try:
+                p1_team = await asyncio.to_thread(pool.get, battle_format)
+                p2_team = await asyncio.to_thread(pool.get, battle_format)
+            except RuntimeError as e:
+                self._send({"type": "error", "message": f"Failed to generate teams: {e}"})
+                self.running = False
+                return
+            # Acquiring may wait on the simulator pool; keep that off the event loop too
+            try:
+                self.sim = await asyncio.to_thread(acquire_local_sim, battle_format, seed=parse_seed(config.get("seed")))
+            except RuntimeError as e:
+                self._send({"type": "error", "message": f"Failed to start the simulator: {e}"})
+                self.running = False
+                return
             self.sim.send(f'>player p1 {{"name":"Player","team":"{p1_team}"}}')
             self.sim.send(f'>player p2 {{"name":"Gemini Agent","team":"{p2_team}"}}')
             self.ai_side = "p2"
@@ -127,48 +241,62 @@ class BattleSession:
                 )
 
     def _run_battle_loop(self):
-        current_turn_log = ""
+        # Tokenized events since the AI last acted, for its opponent tracker
+        turn_events = []
         while self.running:
-            out = self.sim.wait_for_output(timeout=0.5)
+            try:
+                out = self.sim.wait_for_output(timeout=0.5)
+            except RuntimeError as e:
+                # The supervisor could not bring the simulator back
+                self._send({"type": "error", "message": f"Simulator failed: {e}"})
+                self.running = False
+                break
             self._maybe_announce_room()
             ai_side = self._resolve_ai_side()
 
             if out:
                 state_changed = False
-                cli._parse_stream_lines(out, self.requests)
-
-                for line in out:
-                    current_turn_log += line + "\n"
-                    if "|turn|" in line:
+                channels = split_channels(out, ("omniscient", "p1", "p2"))
+                cli._parse_request_channels(channels, self.requests)
+
+                events = tokenize(channels["omniscient"])
+                turn_events.extend(events)
+                for event in events:
+                    tag = event.tag
+                    if tag == "turn":
                         self.shown_rqid["p1"] = None
                         self.shown_rqid["p2"] = None
                         try:
-                            self.current_turn = int(line.split("|turn|")[1].strip())
+                            self.current_turn = int(event.args[0])
                             state_changed = True
-                        except Exception:
+                        except (ValueError, IndexError):
                             pass
 
-                    changed, _err = cli._update_battle_state_from_line(line, self.battle_state)
-                    if changed:
-                        state_changed = True
+                    cli._update_battle_state_from_line(event, self.battle_state)
 
-                    hum_msg = cli._humanize_line(line)
-                    if hum_msg:
-                        self._send({"type": "log", "message": hum_msg})
+                    # Only worth humanizing while a client is there to read it;
+                    # a failed send clears connected before stop() ends the loop
+                    if self.connected:
+                        hum_msg = self.humanizer(event)
+                        if hum_msg:
+                            self._send({"type": "log", "message": hum_msg})
 
-                    if "|win|" in line:
-                        winner = line.split("|win|", 1)[1].strip() or "Unknown"
+                    if tag == "win":
+                        winner = "|".join(event.args).strip() or "Unknown"
                         self._send({"type": "win", "winner": winner})
 
                     # Opponent disconnect / timer events
-                    if line.startswith("|inactive|"):
-                        msg_text = line.split("|inactive|", 1)[1].strip()
+                    if tag == "inactive":
+                        msg_text = "|".join(event.args).strip()
                         self._send({"type": "opponent_status", "status": "disconnected", "message": msg_text})
 
-                    if line.startswith("|inactiveoff|"):
-                        msg_text = line.split("|inactiveoff|", 1)[1].strip()
+                    if tag == "inactiveoff":
+                        msg_text = "|".join(event.args).strip()
                         self._send({"type": "opponent_status", "status": "reconnected", "message": msg_text})
 
+                if self.battle_state.pop_changes():
+                    state_changed = True
+
                 # Auto-complete team preview for the AI side (remote: our side)
                 for side in ("p1", "p2"):
                     req = self.requests.get(side)
@@ -202,7 +330,7 @@ class BattleSession:
                         self._send(
                             {
                                 "type": "state_sync",
-                                "battle": self.battle_state,
+                                "battle": self.battle_state.to_json(),
                                 "turn": self.current_turn,
                                 "p1_request": send_p1_req,
                             }
@@ -211,7 +339,7 @@ class BattleSession:
                     self._send(
                         {
                             "type": "state_sync",
-                            "battle": self.battle_state,
+                            "battle": self.battle_state.to_json(),
                             "turn": self.current_turn,
                             "p1_request": None,
                         }
@@ -242,7 +370,7 @@ class BattleSession:
                         )
                         try:
                             decision = cli._llm_agent_decision(
-                                obs, self.team_knowledge, raw_log=current_turn_log
+                                obs, self.team_knowledge, raw_log=turn_events
                             )
                             self._send(
                                 {
@@ -261,7 +389,7 @@ class BattleSession:
                             if command:
                                 self.sim.send(f">{ai_side} {command}")
                                 self.shown_rqid[ai_side] = ai_rqid
-                                current_turn_log = ""
+                                turn_events = []
                             else:
                                 switches = cli._get_available_switches(ai_req)
                                 if switches:
@@ -283,13 +411,21 @@ class BattleSession:
 
     def stop(self):
         self.running = False
+        self.connected = False
         if self.sim:
             try:
-                self.sim.close()
+                if self.remote:
+                    self.sim.close()
+                else:
+                    stats = self.sim.stats()
+                    if stats["dropped_lines"] or stats.get("stderr_dropped"):
+                        print(f"Simulator output dropped during battle: {stats}")
+                    release_local_sim(self.sim)
             except Exception:
                 pass
         if self.bg_thread:
             self.bg_thread.join(timeout=1.0)
+        log_calc_cache_stats()
 
 
 @app.websocket("/ws/battle")
@@ -1,135 +1,532 @@
+import json
+import logging
+import os
+import random
+import re
 import subprocess
+import sys
 import threading
 import queue
 import time
+from collections import deque
 
-DEBUG = True
+DEBUG = False
+
+# Reader threads log through this logger with lazy %-formatting, so a
+# disabled debug level costs one isEnabledFor() check per batch of lines.
+logger = logging.getLogger("showdown_wrapper")
+
+READ_CHUNK = 1 << 16
+_LINE_RE = re.compile(r"[^\n]*\n")
 
 def debug_print(message, category="DEBUG"):
     if DEBUG:
         print(f"[{category}] {message}")
 
-class ShowdownWrapper:
-    def __init__(self, ps_path="pokemon-showdown", formatid="gen7ou"):
+def set_debug(enabled=True):
+    """Turn debug output on or off for debug_print() and the simulator logger."""
+    global DEBUG
+    DEBUG = enabled
+    logger.setLevel(logging.DEBUG if enabled else logging.WARNING)
+    if enabled and not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
+        logger.addHandler(handler)
+
+def generate_seed():
+    """A random PRNG seed in the [a, b, c, d] form >start accepts."""
+    return [random.randrange(1 << 16) for _ in range(4)]
+
+def parse_seed(text):
+    """Parse a seed given on the command line or in a config.
+
+    "1,2,3,4" (or a list of four ints) becomes [1, 2, 3, 4]; any other string,
+    such as "sodium,<hex>", is passed to the simulator unchanged.
+    """
+    if text is None or isinstance(text, list):
+        return text
+    parts = str(text).split(",")
+    if len(parts) == 4 and all(p.strip().isdigit() for p in parts):
+        return [int(p) for p in parts]
+    return str(text)
+
+def read_input_log(path):
+    """Read the ``>`` commands of an input log written by a wrapper."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.startswith(">")]
+
+CHANNELS = ("omniscient", "spectator", "p1", "p2")
+_SIDE_MARKERS = {"p1": "p1", "p2": "p2", ">p1": "p1", ">p2": "p2"}
+
+def split_channels(lines, channels=CHANNELS):
+    """Demultiplex raw simulator output into per-channel line lists.
+
+    ``update``/``end`` payloads go to omniscient and spectator, except that
+    each ``|split|<side>`` line is followed by a secret half (omniscient only)
+    and a public half (spectator only). ``sideupdate`` payloads (requests and
+    errors) go to the p1/p2 channel named by their side marker; a bare side
+    marker outside a sideupdate block, as RemoteShowdownWrapper emits, claims
+    only the next line. Only the channels asked for are built, so a consumer
+    never scans lines it does not need.
+    """
+    out = {name: [] for name in channels}
+    omniscient = out.get("omniscient")
+    spectator = out.get("spectator")
+    kind = None
+    side = None
+    one_line = False
+    split = 0
+    for line in lines:
+        text = line.rstrip("\r\n")
+        if split == 1:
+            # Public half of a |split| pair; Showdown leaves it empty when
+            # spectators see nothing
+            split = 0
+            if spectator is not None and text:
+                spectator.append(line)
+            continue
+        if not text:
+            kind = side = None
+            continue
+        if kind is None and text in ("update", "sideupdate", "end"):
+            kind = text
+            continue
+        marker = _SIDE_MARKERS.get(text)
+        if marker is not None and (side is None or one_line):
+            side = marker
+            one_line = kind != "sideupdate"
+            continue
+        if side is not None:
+            dest = out.get(side)
+            if dest is not None:
+                dest.append(line)
+            if one_line:
+                side = None
+                one_line = False
+            continue
+        if split == 2:
+            split = 1
+            if omniscient is not None:
+                omniscient.append(line)
+            continue
+        if text.startswith("|split|"):
+            split = 2
+            continue
+        if omniscient is not None:
+            omniscient.append(line)
+        if spectator is not None:
+            spectator.append(line)
+    return out
+
+def iter_pipe_lines(pipe):
+    """Yield batches of decoded lines (newline included) from a binary pipe.
+
+    Reads up to READ_CHUNK bytes per os.read() call and splits every complete
+    line in the chunk at once; a trailing partial line is carried over to the
+    next read. Chunks are cut on newlines, so multi-byte characters are never
+    split across a decode.
+    """
+    fd = pipe.fileno()
+    pending = b""
+    while True:
+        chunk = os.read(fd, READ_CHUNK)
+        if not chunk:
+            break
+        if pending:
+            chunk = pending + chunk
+        cut = chunk.rfind(b"\n") + 1
+        if not cut:
+            pending = chunk
+            continue
+        pending = chunk[cut:]
+        yield _LINE_RE.findall(chunk[:cut].decode("utf-8", "replace"))
+    if pending:
+        yield [pending.decode("utf-8", "replace")]
+
+def _droppable(lines) -> bool:
+    """Whether a queued block may be dropped on overflow: spectator updates
+    only, and none that carry an error or the battle's result."""
+    if not lines or lines[0].strip() != "update":
+        return False
+    return not any(line.startswith(("|error|", "|win|", "|tie")) for line in lines)
+
+
+class ProtocolFramer:
+    """Assembles simulator output into complete protocol blocks.
+
+    Showdown writes each message as a block: a type line ("update",
+    "sideupdate" or "end"), its payload, then a blank line. Subclasses feed
+    batches of raw lines through _feed_lines() from their reader thread; q
+    holds complete blocks as (arrival_time, lines) so consumers never see half
+    a block.
+
+    q holds at most ``max_queue`` blocks. When it is full, ``overflow``
+    decides what happens: "block" stalls the reader thread (and so, through
+    the pipe, the simulator) until the consumer catches up; "drop_oldest"
+    discards the oldest queued spectator ``update`` block, logging it and
+    counting its lines as dropped. Blocks a battle cannot go on without
+    (``sideupdate`` requests, errors, the result) are never dropped: with
+    none of the others queued, "drop_oldest" waits like "block".
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop_oldest")
+
+    def __init__(self, request_settle=0.05, max_queue=1024, overflow="block"):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.q = queue.Queue(maxsize=max_queue)
+        self.overflow = overflow
+        self.request_settle = request_settle
+        self.eof = threading.Event()
+        self.last_send_time = None
+        self.turn_latencies = []
+        self.queue_high_water = 0
+        self.dropped_blocks = 0
+        self.dropped_lines = 0
+        self._closing = False
+        self._block = []
+        self.seed = None
+        self.input_log = []
+        self._input_log_file = None
+
+    def _start_command(self, formatid, seed=None, input_log=None):
+        """Build the >start command and open the input log file, if any.
+
+        Battles always start with an explicit seed (a random one unless
+        ``seed`` is given) so that the recorded input log replays exactly.
+        """
+        self.seed = generate_seed() if seed is None else seed
+        if input_log:
+            self._input_log_file = open(input_log, "w", encoding="utf-8")
+        spec = {"formatid": formatid, "seed": self.seed}
+        return ">start " + json.dumps(spec, separators=(",", ":"))
+
+    def _record_input(self, msg):
+        """Append every >-command in msg to the input log."""
+        commands = [line for line in msg.splitlines() if line.startswith(">")]
+        if not commands:
+            return
+        self.input_log.extend(commands)
+        if self._input_log_file is not None:
+            self._input_log_file.write("\n".join(commands) + "\n")
+            self._input_log_file.flush()
+
+    def _close_input_log(self):
+        if self._input_log_file is not None:
+            self._input_log_file.close()
+            self._input_log_file = None
+
+    def _put(self, item):
+        """Queue a block (or the None sentinel) according to the overflow policy."""
+        q = self.q
+        if self.overflow == "block":
+            # Poll so a reader stuck on a full queue still exits after close()
+            while True:
+                try:
+                    q.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    if self._closing:
+                        return
+        else:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except queue.Full:
+                    dropped = self._drop_oldest_update()
+                    if dropped is not None:
+                        self.dropped_blocks += 1
+                        self.dropped_lines += len(dropped[1])
+                        logger.warning(
+                            "Queue full, dropped an update block of %d lines (%d dropped so far)",
+                            len(dropped[1]),
+                            self.dropped_blocks,
+                        )
+                        continue
+                    try:
+                        q.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        if self._closing:
+                            return
+        depth = q.qsize()
+        if depth > self.queue_high_water:
+            self.queue_high_water = depth
+
+    def _drop_oldest_update(self):
+        """Remove and return the oldest droppable queued block, or None."""
+        q = self.q
+        with q.mutex:
+            for i, queued in enumerate(q.queue):
+                if queued is not None and _droppable(queued[1]):
+                    del q.queue[i]
+                    q.not_full.notify()
+                    return queued
+        return None
+
+    def _feed_lines(self, lines):
+        arrived = time.monotonic()
+        block = self._block
+        for line in lines:
+            block.append(line)
+            if line == "\n" or not line.strip():
+                # Blank line terminates the current block
+                if len(block) > 1:
+                    self._put((arrived, block))
+                block = []
+        self._block = block
+
+    def _feed_eof(self):
+        if self._block:
+            self._put((time.monotonic(), self._block))
+            self._block = []
+        self.eof.set()
+        self._put(None)  # Wake any waiter blocked on the queue
+
+    @staticmethod
+    def _ends_frame(block):
+        """Whether a block completes what consumers should see in one go.
+
+        Showdown emits a side's ``|request|`` before the ``update`` block that
+        carries the matching ``|turn|``, so request blocks are held briefly
+        for the update that follows them.
+        """
+        kind = block[0].strip()
+        if kind == "sideupdate":
+            return not any(line.startswith("|request|") for line in block)
+        return True
+
+    def read(self):
+        lines = []
+        while True:
+            try:
+                item = self.q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                lines.extend(item[1])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Read %d lines from queue", len(lines))
+        return lines
+
+    def wait_for_output(self, timeout=2.0):
+        """Wait up to timeout seconds for the next complete frame of output.
+
+        Returns as soon as an ``update``/``end`` block (or a standalone
+        sideupdate such as an ``|error|``) has arrived, together with any
+        other blocks that are already queued.
+        """
+        lines = []
+        deadline = time.monotonic() + timeout
+        arrived = None
+        complete = False
+
+        while not complete:
+            remaining = deadline - time.monotonic()
+            if lines:
+                remaining = min(remaining, self.request_settle)
+            if remaining <= 0 or (self.eof.is_set() and self.q.empty()):
+                break
+            try:
+                item = self.q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            arrived, block = item
+            lines.extend(block)
+            complete = self._ends_frame(block)
+
+        # Pick up anything else that is already complete without waiting
+        while lines:
+            try:
+                item = self.q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            arrived, block = item
+            lines.extend(block)
+
+        if lines:
+            self._record_latency(lines, arrived)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Wait for output collected %d lines", len(lines))
+        return lines
+
+    def _record_latency(self, lines, arrived):
+        """Record per-turn latency for frames that start a new turn.
+
+        ``response`` is the time from the last command sent to the frame being
+        handed to the caller; ``framing`` is how long the complete frame sat
+        in the wrapper before the caller received it.
+        """
+        turn = None
+        for line in lines:
+            if line.startswith("|turn|"):
+                turn = line[6:].strip()
+        if turn is None:
+            return
+        now = time.monotonic()
+        entry = {
+            "turn": turn,
+            "response": now - self.last_send_time if self.last_send_time else None,
+            "framing": now - arrived,
+        }
+        self.turn_latencies.append(entry)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Turn %s framed in %.1f ms%s", turn, entry["framing"] * 1000,
+                f" ({entry['response'] * 1000:.1f} ms after last send)" if entry["response"] is not None else "",
+            )
+
+    def stats(self):
+        """Queue counters for monitoring: current depth, high-water mark and drops."""
+        return {
+            "queue_depth": self.q.qsize(),
+            "queue_max": self.q.maxsize,
+            "queue_high_water": self.queue_high_water,
+            "overflow": self.overflow,
+            "dropped_blocks": self.dropped_blocks,
+            "dropped_lines": self.dropped_lines,
+        }
+
+    def latency_summary(self):
+        """Aggregate the recorded per-turn latencies (seconds)."""
+        summary = {"turns": len(self.turn_latencies)}
+        for key in ("response", "framing"):
+            values = [e[key] for e in self.turn_latencies if e[key] is not None]
+            if values:
+                summary[key] = {
+                    "mean": sum(values) / len(values),
+                    "max": max(values),
+                    "last": values[-1],
+                }
+        return summary
+
+class ShowdownWrapper(ProtocolFramer):
+    """A ``simulate-battle`` child process.
+
+    Simulator stderr is kept in ``err_q``, a ring buffer of the last
+    ``stderr_lines`` lines, so a chatty simulator cannot grow it without
+    bound; see ProtocolFramer for ``max_queue`` and ``overflow``.
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", formatid="gen7ou", request_settle=0.05, start=True,
+                 max_queue=1024, overflow="block", stderr_lines=200):
         debug_print(f"Initializing ShowdownWrapper with path: {ps_path}, format: {formatid}", "WRAPPER")
+        super().__init__(request_settle, max_queue, overflow)
         try:
             self.proc = subprocess.Popen(
                 ["node", f"{ps_path}/pokemon-showdown", "simulate-battle"],
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
+                bufsize=0,
             )
             debug_print("Subprocess started successfully", "WRAPPER")
         except Exception as e:
             debug_print(f"Failed to start subprocess: {e}", "WRAPPER")
             raise
-        
-        # Queues and listener threads for stdout and stderr
-        self.q = queue.Queue()
-        self.err_q = queue.Queue()
+
+        # Listener threads for stdout and stderr
+        self.err_q = deque(maxlen=stderr_lines)
+        self.stderr_total = 0
+        self.started = False
         self.listener = threading.Thread(target=self._enqueue_output, daemon=True)
         self.err_listener = threading.Thread(target=self._enqueue_stderr, daemon=True)
         self.listener.start()
         self.err_listener.start()
         debug_print("Output listener thread started", "WRAPPER")
-        self.send(f'>start {{"formatid":"{formatid}"}}')
-        debug_print(f"Sent start command for format: {formatid}", "WRAPPER")
+        if start:
+            self.start(formatid)
+
+    def start(self, formatid="gen7ou", seed=None, input_log=None):
+        """Start a battle on this process (a warm process is spawned with start=False).
+
+        ``seed`` fixes the battle's PRNG; ``input_log`` is a path that every
+        command sent to the battle is recorded to (see replay_input_log).
+        """
+        self.send(self._start_command(formatid, seed, input_log))
+        self.started = True
+        debug_print(f"Sent start command for format: {formatid} (seed {self.seed})", "WRAPPER")
 
     def _enqueue_output(self):
-        debug_print("Output listener started", "WRAPPER")
+        logger.debug("Output listener started")
         try:
-            for line in self.proc.stdout:
-                debug_print(f"Received line: {line.strip()}", "WRAPPER")
-                self.q.put(line)
+            for lines in iter_pipe_lines(self.proc.stdout):
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received %d lines: %r", len(lines), lines)
+                self._feed_lines(lines)
         except Exception as e:
-            debug_print(f"Error in output listener: {e}", "WRAPPER")
-        debug_print("Output listener ended", "WRAPPER")
+            logger.warning("Error in output listener: %s", e)
+        self._feed_eof()
+        logger.debug("Output listener ended")
 
     def _enqueue_stderr(self):
         """Continuously read simulator stderr to avoid deadlocks and aid debugging."""
-        debug_print("Error listener started", "WRAPPER")
+        logger.debug("Error listener started")
         try:
-            for line in self.proc.stderr:
+            for lines in iter_pipe_lines(self.proc.stderr):
                 # Mirror stderr to debug to surface simulator issues
-                debug_print(f"[stderr] {line.strip()}", "WRAPPER")
-                self.err_q.put(line)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[stderr] %s", "".join(lines).rstrip())
+                self.err_q.extend(lines)
+                self.stderr_total += len(lines)
         except Exception as e:
-            debug_print(f"Error in error listener: {e}", "WRAPPER")
-        debug_print("Error listener ended", "WRAPPER")
+            logger.warning("Error in error listener: %s", e)
+        logger.debug("Error listener ended")
 
     def send(self, msg: str):
         if not msg.endswith("\n"):
             msg += "\n"
-        debug_print(f"Sending: {msg.strip()}", "WRAPPER")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending: %s", msg.strip())
         try:
-            self.proc.stdin.write(msg)
+            self.proc.stdin.write(msg.encode("utf-8"))
             self.proc.stdin.flush()
-            debug_print("Message sent successfully", "WRAPPER")
+            self.last_send_time = time.monotonic()
+            self._record_input(msg)
         except Exception as e:
-            debug_print(f"Error sending message: {e}", "WRAPPER")
-
-    def read(self):
-        lines = []
-        while not self.q.empty():
-            lines.append(self.q.get())
-        debug_print(f"Read {len(lines)} lines from queue", "WRAPPER")
-        return lines
-
-    def wait_for_output(self, timeout=2.0):
-        """Wait for output from the simulator for up to timeout seconds."""
-        lines = []
-        start_time = time.time()
-        last_line_time = start_time
-        
-        while time.time() - start_time < timeout:
-            # First collect any immediately available lines
-            got_lines = False
-            while not self.q.empty():
-                line = self.q.get()
-                lines.append(line)
-                last_line_time = time.time()
-                got_lines = True
-            
-            # If we got some lines recently, wait a bit more for any follow-up
-            if got_lines:
-                time.sleep(0.1)
-                continue
-            
-            # If we have lines and haven't gotten any new ones for a while, we're probably done
-            if lines and (time.time() - last_line_time > 0.3):
-                break
-            
-            # If no lines yet, wait a short time before checking again
-            time.sleep(0.05)
+            logger.warning("Error sending message: %s", e)
 
-            # If the process died, stop waiting early
-            if self.proc.poll() is not None:
-                break
-
-        debug_print(f"Wait for output collected {len(lines)} lines", "WRAPPER")
-        return lines
+    def stats(self):
+        stats = super().stats()
+        stats["stderr_lines"] = len(self.err_q)
+        stats["stderr_dropped"] = self.stderr_total - len(self.err_q)
+        return stats
 
     def close(self):
+        self._closing = True
+        self._close_input_log()
         try:
             self.proc.terminate()
         except Exception:
             pass
 
-def generate_random_team(ps_path="pokemon-showdown", formatid="gen7randombattle"):
-    """Generates a random team for the given format."""
+def replay_input_log(log, ps_path="pokemon-showdown", timeout=30.0):
+    """Re-drive a recorded battle through a fresh simulator as fast as it can go.
+
+    ``log`` is an input log path or a list of commands. Every command is
+    written at once and stdin is closed, so the simulator processes the
+    whole battle without waiting on anyone. Returns (output lines, seconds).
+    """
+    commands = read_input_log(log) if isinstance(log, (str, os.PathLike)) else list(log)
+    if not commands or not commands[0].startswith(">start"):
+        raise RuntimeError("Input log does not begin with a >start command")
+    sim = ShowdownWrapper(ps_path=ps_path, start=False)
+    lines = []
     try:
-        result = subprocess.run(
-            ["node", f"{ps_path}/pokemon-showdown", "generate-team", formatid],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        debug_print(f"Error generating random team: {e.stderr}", "WRAPPER")
-        return None
-    except Exception as e:
-        debug_print(f"An unexpected error occurred while generating a team: {e}", "WRAPPER")
-        return None
+        began = time.monotonic()
+        sim.send("\n".join(commands))
+        sim.proc.stdin.close()
+        deadline = began + timeout
+        while not (sim.eof.is_set() and sim.q.empty()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"Replay did not finish within {timeout}s")
+            lines.extend(sim.wait_for_output(remaining))
+        return lines, time.monotonic() - began
+    finally:
+        sim.close()
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+from showdown_wrapper import ShowdownWrapper, debug_print
+
+
+class SimulatorPool:
+    """Keeps warm ``simulate-battle`` processes ready to hand out per battle.
+
+    ``min_size`` idle processes are spawned ahead of time so Node has already
+    loaded the simulator when a battle needs one; ``max_size`` caps the total
+    number of processes (idle + in use). A simulate-battle process hosts a
+    single battle, so a released process that was started is replaced rather
+    than reused; one that was never started goes back to the idle set.
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", min_size=2, max_size=8):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        self.ps_path = ps_path
+        self.min_size = min_size
+        self.max_size = max_size
+        self._idle = deque()
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        with self._cond:
+            self._fill()
+
+    def _spawn(self) -> ShowdownWrapper:
+        return ShowdownWrapper(ps_path=self.ps_path, start=False)
+
+    def _prune(self):
+        """Drop idle processes that have died since they were spawned."""
+        alive = deque(w for w in self._idle if w.proc.poll() is None)
+        dead = len(self._idle) - len(alive)
+        if dead:
+            debug_print(f"Discarding {dead} dead simulator process(es)", "POOL")
+        self._idle = alive
+
+    def _fill(self):
+        """Top the idle set up to min_size without exceeding max_size. Caller holds the lock."""
+        self._prune()
+        while (
+            not self._closed
+            and len(self._idle) < self.min_size
+            and len(self._idle) + self._in_use < self.max_size
+        ):
+            try:
+                self._idle.append(self._spawn())
+            except Exception as e:
+                debug_print(f"Failed to spawn warm simulator: {e}", "POOL")
+                break
+
+    def acquire(self, formatid="gen7ou", timeout=None, seed=None, input_log=None) -> ShowdownWrapper:
+        """Hand out a live simulator with a battle started in ``formatid``.
+
+        Blocks while the pool is at max_size; raises RuntimeError if no
+        process becomes available within ``timeout`` seconds. ``seed`` and
+        ``input_log`` are passed on to ShowdownWrapper.start().
+        """
+        sim = self.acquire_unstarted(timeout)
+        sim.start(formatid, seed, input_log)
+        debug_print(f"Acquired simulator for {formatid} ({self.stats()})", "POOL")
+        return sim
+
+    def acquire_unstarted(self, timeout=None) -> ShowdownWrapper:
+        """Like acquire(), but the caller sends the >start command itself."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Simulator pool is closed")
+                self._prune()
+                if self._idle:
+                    sim = self._idle.popleft()
+                    break
+                if self._in_use < self.max_size:
+                    sim = self._spawn()
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError(f"No simulator available within {timeout}s (max_size={self.max_size})")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._fill()
+        return sim
+
+    def release(self, sim: ShowdownWrapper):
+        """Return a simulator handed out by acquire()."""
+        with self._cond:
+            self._in_use = max(0, self._in_use - 1)
+            if not self._closed and not sim.started and sim.proc.poll() is None:
+                self._idle.append(sim)
+            else:
+                sim.close()
+            self._fill()
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        return {"idle": len(self._idle), "in_use": self._in_use, "min": self.min_size, "max": self.max_size}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for sim in idle:
+            sim.close()
@@ -0,0 +1,100 @@
+// simulator_sidecar.js
+// Hosts many Showdown BattleStreams in one Node process.
+// Every input and output line is prefixed with "<battle id>\t". A line holding
+// only the prefix ends an output block, like simulate-battle's blank line.
+// Besides simulator input, each battle accepts:
+//   >close           end the battle
+//   >snapshot        reply with a "snapshot" block holding Battle.toJSON()
+//   >fork <newid>    copy the battle into <newid> via Battle.fromJSON()
+//   >load <json>     start this battle from a previously taken snapshot
+// Usage: node simulator_sidecar.js [path/to/pokemon-showdown]
+import { createRequire } from 'module';
+import path from 'path';
+import readline from 'readline';
+
+const require = createRequire(import.meta.url);
+const psPath = path.resolve(process.argv[2] || 'pokemon-showdown');
+const { BattleStream } = require(path.join(psPath, 'dist/sim/battle-stream'));
+const { Battle } = require(path.join(psPath, 'dist/sim/battle'));
+
+const battles = new Map();
+
+function emit(id, chunk) {
+    const lines = chunk.split('\n').map(line => `${id}\t${line}`);
+    process.stdout.write(lines.join('\n') + `\n${id}\t\n`);
+}
+
+async function pump(id, stream) {
+    try {
+        for await (const chunk of stream) emit(id, chunk);
+    } catch (err) {
+        emit(id, `update\n|error|[sidecar] ${err.message}`);
+    }
+    if (battles.get(id) === stream) battles.delete(id);
+}
+
+function open(id) {
+    const stream = new BattleStream();
+    battles.set(id, stream);
+    void pump(id, stream);
+    return stream;
+}
+
+// Give a deserialized battle its own stream, wired up the way BattleStream
+// wires the battles it creates for >start.
+function adopt(id, battle) {
+    const stream = open(id);
+    battle.restart((type, data) => {
+        if (Array.isArray(data)) data = data.join('\n');
+        stream.pushMessage(type, data);
+        if (type === 'end' && !stream.keepAlive) stream.pushEnd();
+    });
+    stream.battle = battle;
+}
+
+function snapshot(id) {
+    const battle = battles.get(id)?.battle;
+    emit(id, `snapshot\n${battle ? JSON.stringify(battle.toJSON()) : 'null'}`);
+}
+
+function fork(id, newId) {
+    const battle = battles.get(id)?.battle;
+    if (!battle || !newId || battles.has(newId)) {
+        emit(newId || id, `update\n|error|[sidecar] cannot fork ${id} into ${newId}`);
+        return;
+    }
+    adopt(newId, Battle.fromJSON(battle.toJSON()));
+}
+
+function load(id, json) {
+    if (battles.has(id)) close(id);
+    adopt(id, Battle.fromJSON(json));
+}
+
+function close(id) {
+    const stream = battles.get(id);
+    if (!stream) return;
+    battles.delete(id);
+    if (stream.battle) stream.battle.destroy();
+    void stream.writeEnd();
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on('line', (line) => {
+    const tab = line.indexOf('\t');
+    if (tab < 0) return;
+    const id = line.slice(0, tab);
+    const message = line.slice(tab + 1);
+    try {
+        if (message === '>close') return close(id);
+        if (message === '>snapshot') return snapshot(id);
+        if (message.startsWith('>fork ')) return fork(id, message.slice(6).trim());
+        if (message.startsWith('>load ')) return load(id, message.slice(6));
+    } catch (err) {
+        emit(id, `update\n|error|[sidecar] ${err.message}`);
+        return;
+    }
+    const stream = battles.get(id) || open(id);
+    void stream.write(message);
+});
+rl.on('close', () => process.exit(0));
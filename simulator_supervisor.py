@@ -0,0 +1,121 @@
+import time
+
+from showdown_wrapper import debug_print
+
+
+class SupervisedShowdownWrapper:
+    """A simulator handle that survives the Node child dying mid-battle.
+
+    ``spawn()`` must return an unstarted wrapper (ShowdownWrapper or
+    MultiplexedShowdownWrapper) and ``release(sim)`` disposes of one, e.g.
+    ``SimulatorPool.acquire_unstarted`` / ``SimulatorPool.release``.
+
+    When the child is found dead (``proc.poll()``) on a send or an empty
+    wait_for_output(), a replacement is spawned and the recorded input log
+    (which starts with the seeded >start) is replayed into it. Seeded
+    battles are deterministic, so the replacement reproduces the output the
+    caller has already seen; that many lines are skipped and the battle
+    carries on from where it stopped.
+    """
+
+    def __init__(self, spawn, release, formatid="gen7ou", seed=None, input_log=None,
+                 max_recoveries=3, recovery_timeout=10.0):
+        self._spawn = spawn
+        self._release = release
+        self.max_recoveries = max_recoveries
+        self.recovery_timeout = recovery_timeout
+        self.recoveries = 0
+        self.recovery_times = []
+        self.delivered_lines = 0
+        self._pending = []
+        self.sim = spawn()
+        self.sim.start(formatid, seed, input_log)
+
+    def __getattr__(self, name):
+        # Everything not overridden here (input_log, seed, turn_latencies,
+        # latency_summary, ...) is the current simulator's
+        if name == "sim":
+            raise AttributeError(name)
+        return getattr(self.sim, name)
+
+    @property
+    def started(self):
+        return self.sim.started
+
+    def _dead(self):
+        return self.sim.proc.poll() is not None
+
+    def _recover(self):
+        if self.recoveries >= self.max_recoveries:
+            raise RuntimeError(f"Simulator died {self.recoveries + 1} times; giving up on this battle")
+        began = time.monotonic()
+        old = self.sim
+        debug_print(f"Simulator exited with {old.proc.poll()}; replaying {len(old.input_log)} commands", "SUPERVISOR")
+        # Later commands keep going to the original input log file
+        log_file, old._input_log_file = old._input_log_file, None
+        # Release first so a pool at max_size has room for the replacement
+        try:
+            self._release(old)
+        except Exception as e:
+            debug_print(f"Error releasing dead simulator: {e}", "SUPERVISOR")
+        new = self._spawn()
+        new.send("\n".join(old.input_log))
+        new.started = True
+        new.seed = old.seed
+        new._input_log_file = log_file
+        self.sim = new
+
+        # Drop the output the caller already received before the crash
+        skip = self.delivered_lines
+        pending = []
+        deadline = began + self.recovery_timeout
+        while skip > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._dead():
+                raise RuntimeError(f"Simulator replay fell {skip} lines short of the crashed battle")
+            out = new.wait_for_output(remaining)
+            if len(out) > skip:
+                pending = out[skip:]
+            skip -= min(skip, len(out))
+
+        self.recoveries += 1
+        self.recovery_times.append(time.monotonic() - began)
+        debug_print(
+            f"Recovered battle in {self.recovery_times[-1] * 1000:.1f} ms (recovery #{self.recoveries})",
+            "SUPERVISOR",
+        )
+        return pending
+
+    def _deliver(self, lines):
+        if self._pending:
+            # Replayed output past the crash point goes out first
+            lines, self._pending = self._pending + lines, []
+        self.delivered_lines += len(lines)
+        return lines
+
+    def send(self, msg: str):
+        if self._dead():
+            self._pending.extend(self._recover())
+        self.sim.send(msg)
+
+    def wait_for_output(self, timeout=2.0):
+        if self._pending:
+            return self._deliver([])
+        out = self.sim.wait_for_output(timeout)
+        if not out and self._dead():
+            self._pending.extend(self._recover())
+        return self._deliver(out)
+
+    def read(self):
+        return self._deliver(self.sim.read())
+
+    def stats(self):
+        stats = self.sim.stats()
+        stats["recoveries"] = self.recoveries
+        if self.recovery_times:
+            stats["last_recovery_s"] = self.recovery_times[-1]
+            stats["max_recovery_s"] = max(self.recovery_times)
+        return stats
+
+    def close(self):
+        self._release(self.sim)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from showdown_wrapper import debug_print
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "teams")
+
+
+def _git_head(repo_path: str) -> str:
+    """Commit hash checked out in repo_path, read straight from .git."""
+    git_dir = os.path.join(repo_path, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        ref_file = os.path.join(git_dir, ref)
+        if os.path.exists(ref_file):
+            with open(ref_file, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        with open(os.path.join(git_dir, "packed-refs"), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.rstrip().endswith(" " + ref):
+                    return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    return ""
+
+
+def showdown_fingerprint(ps_path="pokemon-showdown") -> str:
+    """Identify a pokemon-showdown checkout: package version, git HEAD and build time.
+
+    Any change to the checkout (pull, local commit or rebuild of dist/)
+    changes the fingerprint and so every cache key derived from it.
+    """
+    version = ""
+    try:
+        with open(os.path.join(ps_path, "package.json"), "r", encoding="utf-8") as f:
+            version = json.load(f).get("version", "")
+    except (OSError, ValueError):
+        pass
+    try:
+        built = str(int(os.path.getmtime(os.path.join(ps_path, "dist", "sim", "index.js"))))
+    except OSError:
+        built = ""
+    return f"{version}:{_git_head(ps_path)}:{built}"
+
+
+class TeamCache:
+    """On-disk cache of packed teams and their validation verdicts.
+
+    Entries are JSON files named by sha256(team text, format, Showdown
+    fingerprint), so a hit needs no Node process at all and entries made by
+    another Showdown checkout are never returned. The directory is held
+    under ``max_bytes`` by evicting the least recently used files; hits
+    refresh a file's mtime.
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", cache_dir=DEFAULT_CACHE_DIR, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fingerprint = showdown_fingerprint(ps_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(e.stat().st_size for e in os.scandir(cache_dir) if e.name.endswith(".json"))
+
+    def key(self, team_text: str, formatid: str) -> str:
+        h = hashlib.sha256()
+        for part in (team_text, formatid, self.fingerprint):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, team_text: str, formatid: str):
+        """Cached ``{"packed": str, "errors": list | None}`` or None on a miss."""
+        path = self._path(self.key(team_text, formatid))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"packed": entry["packed"], "errors": entry.get("errors")}
+
+    def put(self, team_text: str, formatid: str, packed: str, errors=None):
+        entry = {
+            "format": formatid,
+            "fingerprint": self.fingerprint,
+            "packed": packed,
+            "errors": errors,
+            "created": time.time(),
+        }
+        data = json.dumps(entry).encode("utf-8")
+        path = self._path(self.key(team_text, formatid))
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                old = os.path.getsize(path)
+            except OSError:
+                old = 0
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._size += len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until under 90% of max_bytes."""
+        entries = sorted(
+            (e.stat().st_mtime, e.stat().st_size, e.path)
+            for e in os.scandir(self.cache_dir)
+            if e.name.endswith(".json")
+        )
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            removed += 1
+        debug_print(f"Evicted {removed} cached team(s)", "TEAM_CACHE")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_team_cache(ps_path="pokemon-showdown") -> Optional[TeamCache]:
+    """Shared TeamCache for ``ps_path``; TEAM_CACHE_DIR overrides the location.
+
+    Returns None when the cache directory cannot be created or read, so
+    callers carry on without caching.
+    """
+    with _caches_lock:
+        cache = _caches.get(ps_path)
+        if cache is None:
+            cache_dir = os.getenv("TEAM_CACHE_DIR") or DEFAULT_CACHE_DIR
+            try:
+                cache = TeamCache(ps_path, cache_dir)
+            except OSError as e:
+                debug_print(f"Team cache disabled, cannot use {cache_dir}: {e}", "TEAM_CACHE")
+                return None
+            _caches[ps_path] = cache
+        return cache
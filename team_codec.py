@@ -0,0 +1,326 @@
+"""Pure-Python Showdown team codec: export text <-> PokemonSet <-> packed.
+
+Mirrors Showdown's Teams.import / Teams.export / Teams.pack / Teams.unpack
+(sim/teams.ts) without starting Node. Names are kept as written; there is
+no dex here, so species/items/moves are not normalized, and unpacked names
+are in packed form ("ChoiceScarf" rather than "Choice Scarf"). Packing an
+unpacked team reproduces the original packed string.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+STAT_IDS = ("hp", "atk", "def", "spa", "spd", "spe")
+STAT_NAMES = {"hp": "HP", "atk": "Atk", "def": "Def", "spa": "SpA", "spd": "SpD", "spe": "Spe"}
+
+# Dex.stats.getID() aliases accepted in EVs:/IVs: lines
+_STAT_ALIASES = {
+    "hp": "hp", "hitpoints": "hp",
+    "atk": "atk", "attack": "atk",
+    "def": "def", "defense": "def",
+    "spa": "spa", "satk": "spa", "spatk": "spa", "specialattack": "spa", "spc": "spa", "special": "spa",
+    "spd": "spd", "sdef": "spd", "spdef": "spd", "specialdefense": "spd",
+    "spe": "spe", "speed": "spe",
+}
+
+# IVs Showdown assigns for "- Hidden Power [Type]" when a set gives no IVs
+# (typechart HPivs, gen 3+)
+HIDDEN_POWER_IVS = {
+    "Bug": {"atk": 30, "def": 30, "spd": 30},
+    "Dark": {},
+    "Dragon": {"atk": 30},
+    "Electric": {"spa": 30},
+    "Fighting": {"def": 30, "spa": 30, "spd": 30, "spe": 30},
+    "Fire": {"atk": 30, "spa": 30, "spe": 30},
+    "Flying": {"hp": 30, "atk": 30, "def": 30, "spa": 30, "spd": 30},
+    "Ghost": {"def": 30, "spd": 30},
+    "Grass": {"atk": 30, "spa": 30},
+    "Ground": {"spa": 30, "spd": 30},
+    "Ice": {"atk": 30, "def": 30},
+    "Poison": {"def": 30, "spa": 30, "spd": 30},
+    "Psychic": {"atk": 30, "spe": 30},
+    "Rock": {"def": 30, "spd": 30, "spe": 30},
+    "Steel": {"spd": 30},
+    "Water": {"atk": 30, "def": 30, "spa": 30},
+}
+
+_PACK_NAME_RE = re.compile(r"[^A-Za-z0-9]+")
+_ID_RE = re.compile(r"[^a-z0-9]+")
+
+
+def to_id(text: str) -> str:
+    """Showdown's toID(): lowercase alphanumerics only."""
+    return _ID_RE.sub("", (text or "").lower())
+
+
+def pack_name(name: str) -> str:
+    """Showdown's Teams.packName(): strip everything but letters and digits."""
+    return _PACK_NAME_RE.sub("", name) if name else ""
+
+
+@dataclass
+class PokemonSet:
+    species: str
+    name: str = ""
+    item: str = ""
+    ability: str = ""
+    moves: List[str] = field(default_factory=list)
+    nature: str = ""
+    gender: str = ""
+    evs: Optional[Dict[str, int]] = None
+    ivs: Optional[Dict[str, int]] = None
+    shiny: bool = False
+    level: int = 100
+    happiness: Optional[int] = None
+    pokeball: str = ""
+    hp_type: str = ""
+    gigantamax: bool = False
+    dynamax_level: Optional[int] = None
+    tera_type: str = ""
+
+
+# ---- Export text ----
+
+def _stat_id(name: str) -> Optional[str]:
+    return _STAT_ALIASES.get(name.strip().lower().replace(" ", ""))
+
+
+def _parse_stats(spec: str, default: int) -> Dict[str, int]:
+    stats = {stat: default for stat in STAT_IDS}
+    for part in spec.split("/"):
+        bits = part.strip().split(" ", 1)
+        if len(bits) != 2:
+            continue
+        stat = _stat_id(bits[1])
+        if not stat:
+            continue
+        try:
+            stats[stat] = int(bits[0])
+        except ValueError:
+            continue
+    return stats
+
+
+def _parse_header(line: str) -> PokemonSet:
+    line, _, item = line.partition(" @ ")
+    if to_id(item) == "noitem":
+        item = ""
+    gender = ""
+    if line.endswith(" (M)") or line.endswith(" (F)"):
+        gender = line[-2]
+        line = line[:-4]
+    if line.endswith(")") and "(" in line:
+        name, _, species = line[:-1].partition("(")
+        return PokemonSet(species=species.strip(), name=name.strip(), item=item.strip(), gender=gender)
+    return PokemonSet(species=line.strip(), item=item.strip(), gender=gender)
+
+
+def _parse_line(line: str, mon: PokemonSet):
+    if line.startswith("Trait: "):
+        mon.ability = line[7:]
+    elif line.startswith("Ability: "):
+        mon.ability = line[9:]
+    elif line == "Shiny: Yes":
+        mon.shiny = True
+    elif line.startswith("Level: "):
+        mon.level = int(line[7:]) if line[7:].strip().isdigit() else 100
+    elif line.startswith("Happiness: "):
+        mon.happiness = int(line[11:]) if line[11:].strip().isdigit() else None
+    elif line.startswith("Pokeball: "):
+        mon.pokeball = line[10:]
+    elif line.startswith("Hidden Power: "):
+        mon.hp_type = line[14:]
+    elif line.startswith("Dynamax Level: "):
+        mon.dynamax_level = int(line[15:]) if line[15:].strip().isdigit() else None
+    elif line == "Gigantamax: Yes":
+        mon.gigantamax = True
+    elif line.startswith("Tera Type: "):
+        mon.tera_type = line[11:]
+    elif line.startswith("EVs: "):
+        mon.evs = _parse_stats(line[5:].split("(")[0], 0)
+    elif line.startswith("IVs: "):
+        mon.ivs = _parse_stats(line[5:], 31)
+    elif re.match(r"^[A-Za-z]+ [Nn]ature", line):
+        index = line.find(" Nature")
+        if index < 0:
+            index = line.find(" nature")
+        if line[:index] != "undefined":
+            mon.nature = line[:index]
+    elif line.startswith("-") or line.startswith("~"):
+        move = line[2:] if line[1:2] == " " else line[1:]
+        if move.startswith("Hidden Power ["):
+            hp_type = move[14:-1]
+            move = "Hidden Power " + hp_type
+            if mon.ivs is None and hp_type in HIDDEN_POWER_IVS:
+                mon.ivs = {stat: 31 for stat in STAT_IDS}
+                mon.ivs.update(HIDDEN_POWER_IVS[hp_type])
+        if move == "Frustration" and mon.happiness is None:
+            mon.happiness = 0
+        mon.moves.append(move)
+
+
+def import_team(text: str) -> List[PokemonSet]:
+    """Parse Showdown export text (blank-line separated sets, optional === headers)."""
+    team: List[PokemonSet] = []
+    current: Optional[PokemonSet] = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line == "---":
+            current = None
+        elif line.startswith("===") or line.startswith("//"):
+            continue
+        elif current is None:
+            current = _parse_header(line)
+            team.append(current)
+        else:
+            _parse_line(line, current)
+    return team
+
+
+def export_set(mon: PokemonSet) -> str:
+    out = f"{mon.name} ({mon.species})" if mon.name and mon.name != mon.species else mon.species
+    if mon.gender in ("M", "F"):
+        out += f" ({mon.gender})"
+    if mon.item:
+        out += f" @ {mon.item}"
+    out += "  \n"
+    if mon.ability:
+        out += f"Ability: {mon.ability}  \n"
+    if mon.level and mon.level != 100:
+        out += f"Level: {mon.level}  \n"
+    if mon.shiny:
+        out += "Shiny: Yes  \n"
+    if mon.happiness is not None and mon.happiness != 255:
+        out += f"Happiness: {mon.happiness}  \n"
+    if mon.pokeball:
+        out += f"Pokeball: {mon.pokeball}  \n"
+    if mon.hp_type:
+        out += f"Hidden Power: {mon.hp_type}  \n"
+    if mon.dynamax_level is not None and mon.dynamax_level != 10:
+        out += f"Dynamax Level: {mon.dynamax_level}  \n"
+    if mon.gigantamax:
+        out += "Gigantamax: Yes  \n"
+    if mon.tera_type:
+        out += f"Tera Type: {mon.tera_type}  \n"
+    if mon.evs:
+        evs = [f"{mon.evs[s]} {STAT_NAMES[s]}" for s in STAT_IDS if mon.evs.get(s)]
+        if evs:
+            out += f"EVs: {' / '.join(evs)}  \n"
+    if mon.nature:
+        out += f"{mon.nature} Nature  \n"
+    if mon.ivs:
+        ivs = [f"{mon.ivs[s] or 0} {STAT_NAMES[s]}" for s in STAT_IDS if mon.ivs.get(s, 31) != 31]
+        if ivs:
+            out += f"IVs: {' / '.join(ivs)}  \n"
+    for move in mon.moves:
+        if move.startswith("Hidden Power ") and move[13:14] != "[":
+            move = f"Hidden Power [{move[13:]}]"
+        out += f"- {move}  \n"
+    return out
+
+
+def export_team(team: List[PokemonSet]) -> str:
+    return "".join(export_set(mon) + "\n" for mon in team)
+
+
+# ---- Packed format ----
+
+def _pack_stats(stats: Optional[Dict[str, int]], default: int) -> str:
+    if not stats:
+        return ""
+    packed = ",".join("" if stats.get(s, default) == default else str(stats[s]) for s in STAT_IDS)
+    return "" if packed == ",,,,," else packed
+
+
+def pack_team(team: List[PokemonSet]) -> str:
+    """Showdown's packed team string (the "team" of a >player command)."""
+    sets = []
+    for mon in team:
+        species_id = pack_name(mon.species or mon.name)
+        fields = [
+            mon.name or mon.species,
+            "" if pack_name(mon.name or mon.species) == species_id else species_id,
+            pack_name(mon.item),
+            pack_name(mon.ability),
+            ",".join(pack_name(move) for move in mon.moves),
+            mon.nature or "",
+            _pack_stats(mon.evs, 0),
+            mon.gender or "",
+            _pack_stats(mon.ivs, 31),
+            "S" if mon.shiny else "",
+            str(mon.level) if mon.level and mon.level != 100 else "",
+            str(mon.happiness) if mon.happiness is not None and mon.happiness != 255 else "",
+        ]
+        packed = "|".join(fields)
+        dynamax = mon.dynamax_level is not None and mon.dynamax_level != 10
+        if mon.pokeball or mon.hp_type or mon.gigantamax or dynamax or mon.tera_type:
+            packed += "," + ",".join([
+                mon.hp_type or "",
+                pack_name(mon.pokeball),
+                "G" if mon.gigantamax else "",
+                str(mon.dynamax_level) if dynamax else "",
+                mon.tera_type or "",
+            ])
+        sets.append(packed)
+    return "]".join(sets)
+
+
+def _unpack_stats(spec: str, default: int) -> Dict[str, int]:
+    values = spec.split(",", 5) + [""] * 6
+    stats = {}
+    for stat, value in zip(STAT_IDS, values):
+        if value == "":
+            stats[stat] = default
+        else:
+            try:
+                stats[stat] = int(value)
+            except ValueError:
+                stats[stat] = 0
+    return stats
+
+
+def unpack_team(packed: str) -> List[PokemonSet]:
+    """Parse a packed team string; raises ValueError if it is malformed."""
+    team: List[PokemonSet] = []
+    for chunk in packed.split("]") if packed else []:
+        fields = chunk.split("|")
+        if len(fields) < 12:
+            raise ValueError(f"Malformed packed set: {chunk!r}")
+        name, species, item, ability, moves, nature, evs, gender, ivs, shiny, level, misc = fields[:12]
+        mon = PokemonSet(
+            species=species or name,
+            name=name,
+            item=item,
+            ability=ability,
+            moves=moves.split(",") if moves else [],
+            nature=nature,
+            gender=gender,
+            evs=_unpack_stats(evs, 0) if evs else None,
+            ivs=_unpack_stats(ivs, 31) if ivs else None,
+            shiny=bool(shiny),
+            level=int(level) if level.isdigit() else 100,
+        )
+        if misc:
+            extra = misc.split(",", 5) + [""] * 6
+            mon.happiness = int(extra[0]) if extra[0].isdigit() else 255
+            mon.hp_type = extra[1]
+            mon.pokeball = extra[2]
+            mon.gigantamax = bool(extra[3])
+            mon.dynamax_level = int(extra[4]) if extra[4].isdigit() else 10
+            mon.tera_type = extra[5]
+        team.append(mon)
+    return team
+
+
+def is_packed(text: str) -> bool:
+    """True if ``text`` looks like a packed team rather than export text."""
+    first = text.strip().split("\n", 1)[0]
+    return first.count("|") >= 11
+
+
+def parse_team(text: str) -> List[PokemonSet]:
+    """Parse a team file in either format; packed sets may also be one per line."""
+    if is_packed(text):
+        return unpack_team("]".join(line.strip() for line in text.strip().splitlines() if line.strip()))
+    return import_team(text)
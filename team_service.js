@@ -0,0 +1,79 @@
+// team_service.js
+// Long-lived team worker: keeps Showdown's dex and team validators loaded so
+// packing and validating a team does not pay a Node cold start each time.
+// Reads one JSON request per line on stdin and answers with one JSON line:
+//   {"id": 1, "op": "pack_validate", "format": "gen9ou", "teams": ["<export text>", ...]}
+//   -> {"id": 1, "results": [{"packed": "...", "errors": null}, ...]}
+// Ops: "pack" (no validation), "pack_validate", "validate" (errors only), and
+// "generate", which takes {"count": n} instead of teams and returns n random
+// teams for the format as [{"packed": "..."}, ...].
+// A team that cannot be processed gets {"error": "..."} in place of a result.
+// Usage: node team_service.js [path/to/pokemon-showdown]
+import { createRequire } from 'module';
+import path from 'path';
+import readline from 'readline';
+
+const require = createRequire(import.meta.url);
+const psPath = path.resolve(process.argv[2] || 'pokemon-showdown');
+const { Teams, TeamValidator } = require(path.join(psPath, 'dist/sim'));
+
+const validators = new Map();
+
+function validatorFor(format) {
+    if (!validators.has(format)) validators.set(format, TeamValidator.get(format));
+    return validators.get(format);
+}
+
+function processTeam(op, format, text) {
+    const team = Teams.import(text);
+    if (!team) return { error: 'Could not parse team' };
+    const result = {};
+    if (op !== 'validate') result.packed = Teams.pack(team);
+    if (op !== 'pack') result.errors = validatorFor(format).validateTeam(team);
+    return result;
+}
+
+function handle(request) {
+    const { op, format } = request;
+    if (op === 'generate') {
+        const results = Array.from({ length: request.count || 1 }, () => {
+            try {
+                return { packed: Teams.pack(Teams.generate(format)) };
+            } catch (err) {
+                return { error: err.message };
+            }
+        });
+        return { results };
+    }
+    if (!['pack', 'pack_validate', 'validate'].includes(op)) {
+        return { error: `Unknown op: ${op}` };
+    }
+    const results = (request.teams || []).map(text => {
+        try {
+            return processTeam(op, format, text);
+        } catch (err) {
+            return { error: err.message };
+        }
+    });
+    return { results };
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on('line', (line) => {
+    if (!line.trim()) return;
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (err) {
+        process.stdout.write(JSON.stringify({ id: null, error: `Bad request: ${err.message}` }) + '\n');
+        return;
+    }
+    let response;
+    try {
+        response = handle(request);
+    } catch (err) {
+        response = { error: err.message };
+    }
+    process.stdout.write(JSON.stringify({ id: request.id, ...response }) + '\n');
+});
+rl.on('close', () => process.exit(0));
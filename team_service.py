@@ -0,0 +1,119 @@
+import itertools
+import json
+import queue
+import subprocess
+import threading
+
+from showdown_wrapper import debug_print
+
+
+class TeamService:
+    """Client for team_service.js, a Node process that keeps Showdown's dex
+    and team validators loaded between requests.
+
+    Every call sends a batch of teams in Showdown's export format and gets
+    one result per team: ``{"packed": str, "errors": list | None}``, or
+    ``{"error": str}`` if the team could not be processed at all.
+    """
+
+    def __init__(self, ps_path="pokemon-showdown", script="team_service.js"):
+        debug_print(f"Starting team service with path: {ps_path}", "TEAMS")
+        self.ps_path = ps_path
+        self.proc = subprocess.Popen(
+            ["node", script, ps_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._responses = queue.Queue()
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        try:
+            for line in self.proc.stdout:
+                try:
+                    self._responses.put(json.loads(line))
+                except json.JSONDecodeError as e:
+                    debug_print(f"Malformed team service response: {e}", "TEAMS")
+        except Exception as e:
+            debug_print(f"Error in team service reader: {e}", "TEAMS")
+        self._responses.put(None)
+
+    def _read_stderr(self):
+        try:
+            for line in self.proc.stderr:
+                debug_print(f"[team service stderr] {line.strip()}", "TEAMS")
+        except Exception:
+            pass
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _call(self, op: str, formatid: str, teams=(), timeout=30.0, **extra):
+        request_id = next(self._ids)
+        request = {"id": request_id, "op": op, "format": formatid, "teams": list(teams), **extra}
+        with self._lock:
+            if not self.alive():
+                raise RuntimeError("Team service is not running (is pokemon-showdown built?)")
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+            while True:
+                try:
+                    response = self._responses.get(timeout=timeout)
+                except queue.Empty:
+                    raise RuntimeError(f"Team service did not answer within {timeout}s")
+                if response is None:
+                    self._responses.put(None)
+                    raise RuntimeError("Team service exited")
+                if response.get("id") == request_id:
+                    break
+        if "error" in response:
+            raise RuntimeError(f"Team service error: {response['error']}")
+        return response["results"]
+
+    def pack(self, teams, formatid="gen7ou", timeout=30.0):
+        """Pack export-format teams without validating them."""
+        return self._call("pack", formatid, teams, timeout)
+
+    def pack_validate(self, teams, formatid="gen7ou", timeout=30.0):
+        """Pack export-format teams and validate them against ``formatid``."""
+        return self._call("pack_validate", formatid, teams, timeout)
+
+    def validate(self, teams, formatid="gen7ou", timeout=30.0):
+        """Validate export-format teams; results hold only ``errors``."""
+        return self._call("validate", formatid, teams, timeout)
+
+    def generate(self, formatid="gen7randombattle", count=1, timeout=30.0):
+        """Generate ``count`` packed random teams for ``formatid``."""
+        results = self._call("generate", formatid, timeout=timeout, count=count)
+        errors = [r["error"] for r in results if "error" in r]
+        if errors:
+            raise RuntimeError(f"Failed to generate {formatid} teams: {errors[0]}")
+        return [r["packed"] for r in results]
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.terminate()
+        except Exception:
+            pass
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_team_service(ps_path="pokemon-showdown") -> TeamService:
+    """Shared TeamService for ``ps_path``, respawned if it has died."""
+    with _services_lock:
+        service = _services.get(ps_path)
+        if service is None or not service.alive():
+            service = TeamService(ps_path)
+            _services[ps_path] = service
+        return service
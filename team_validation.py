@@ -0,0 +1,232 @@
+"""Bulk validation of a team library: ``python cli.py validate-teams <dir>``.
+
+Team files are read, looked up in the team cache, and whatever is left is
+sent in batches to ``--jobs`` team service processes running side by side,
+one per worker thread. One JSON line per team is streamed as results come
+in, and a summary of failures grouped by error type is written at the end.
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from showdown_wrapper import debug_print
+from team_cache import get_team_cache
+from team_service import TeamService
+
+# Showdown validator messages, most specific first; the first match wins
+ERROR_TYPES = (
+    ("banned", re.compile(r"\bbanned\b|not allowed|isn't allowed|is not legal in", re.I)),
+    ("clause", re.compile(r"\bclause\b|limited to one|more than one", re.I)),
+    ("move", re.compile(r"can't learn|learnset|\bmoves?\b", re.I)),
+    ("ability", re.compile(r"\babilit(y|ies)\b", re.I)),
+    ("item", re.compile(r"\bitem\b", re.I)),
+    ("evs_ivs", re.compile(r"\b[EI]Vs?\b", re.I)),
+    ("level", re.compile(r"\blevel\b", re.I)),
+    ("team_size", re.compile(r"your team|at least \d+ pok|more than \d+ pok", re.I)),
+    ("unknown_name", re.compile(r"does not exist|not a valid|unrecognized|doesn't exist", re.I)),
+)
+
+
+def classify_error(message: str) -> str:
+    """Bucket a validator message into a coarse error type for the summary."""
+    for error_type, pattern in ERROR_TYPES:
+        if pattern.search(message):
+            return error_type
+    return "other"
+
+
+def find_team_files(root: str, suffix=".txt"):
+    """Every ``*.txt`` under ``root`` (or ``root`` itself if it is a file), sorted."""
+    if os.path.isfile(root):
+        return [root]
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith(suffix))
+    return paths
+
+
+class LibraryValidator:
+    """Validates many team files across ``jobs`` team service processes.
+
+    Each worker thread owns one TeamService and sends it ``batch_size``
+    teams per request, so Node's dex and validator stay warm and the
+    per-request overhead is paid once per batch. Verdicts are written to
+    (and read from) the shared team cache.
+    """
+
+    def __init__(self, formatid, ps_path="pokemon-showdown", jobs=None, batch_size=32, use_cache=True):
+        self.formatid = formatid
+        self.ps_path = ps_path
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.batch_size = max(1, batch_size)
+        self.cache = get_team_cache(ps_path) if use_cache else None
+        self.counts = Counter()
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def _record(self, out, record):
+        if record.get("error"):
+            kinds = [record["error_type"]]
+        else:
+            kinds = sorted({classify_error(e) for e in record.get("errors") or []})
+        with self._lock:
+            self.counts["total"] += 1
+            if record.get("cached"):
+                self.counts["cached"] += 1
+            if record.get("valid"):
+                self.counts["valid"] += 1
+            else:
+                self.counts["invalid"] += 1
+                for kind in kinds:
+                    self.failures.setdefault(kind, []).append(record["path"])
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    def _read(self, path, out):
+        """(path, text) for a team that still needs Node, or None if handled here."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            self._record(out, {"path": path, "valid": False, "error": str(e), "error_type": "read_error"})
+            return None
+        if self.cache is not None:
+            hit = self.cache.get(text, self.formatid)
+            if hit is not None:
+                errors = hit.get("errors")
+                self._record(out, {"path": path, "valid": not errors, "errors": errors or [], "cached": True})
+                return None
+        return path, text
+
+    def _worker(self, batches, out):
+        service = None
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            try:
+                if service is None or not service.alive():
+                    service = TeamService(self.ps_path)
+                results = service.pack_validate([text for _, text in batch], self.formatid, timeout=120.0)
+            except (OSError, RuntimeError) as e:
+                debug_print(f"Team service failed on a batch of {len(batch)}: {e}", "VALIDATE")
+                results = [{"error": str(e), "service_failed": True}] * len(batch)
+            for (path, text), result in zip(batch, results):
+                if "error" in result:
+                    error_type = "service_error" if result.get("service_failed") else "parse_error"
+                    self._record(out, {"path": path, "valid": False, "error": result["error"], "error_type": error_type})
+                    continue
+                errors = result.get("errors")
+                if self.cache is not None:
+                    try:
+                        self.cache.put(text, self.formatid, result["packed"], errors)
+                    except OSError as e:
+                        debug_print(f"Could not cache team {path}: {e}", "VALIDATE")
+                self._record(out, {"path": path, "valid": not errors, "errors": errors or [], "cached": False})
+        if service is not None:
+            service.close()
+
+    def run(self, paths, out=sys.stdout) -> dict:
+        """Validate ``paths``, streaming JSONL records to ``out``; returns the summary."""
+        start = time.perf_counter()
+        batches = queue.Queue(maxsize=self.jobs * 2)
+        workers = [
+            threading.Thread(target=self._worker, args=(batches, out), daemon=True)
+            for _ in range(self.jobs)
+        ]
+        for worker in workers:
+            worker.start()
+        batch = []
+        for path in paths:
+            pending = self._read(path, out)
+            if pending is None:
+                continue
+            batch.append(pending)
+            if len(batch) >= self.batch_size:
+                batches.put(batch)
+                batch = []
+        if batch:
+            batches.put(batch)
+        for _ in workers:
+            batches.put(None)
+        for worker in workers:
+            worker.join()
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, seconds=0.0) -> dict:
+        with self._lock:
+            return {
+                "format": self.formatid,
+                "total": self.counts["total"],
+                "valid": self.counts["valid"],
+                "invalid": self.counts["invalid"],
+                "cached": self.counts["cached"],
+                "seconds": round(seconds, 3),
+                "failures_by_type": {
+                    kind: {"count": len(paths), "files": sorted(paths)}
+                    for kind, paths in sorted(self.failures.items(), key=lambda item: -len(item[1]))
+                },
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cli.py validate-teams",
+        description="Validate every team file in a directory and report failures by error type.",
+    )
+    parser.add_argument("directory", help="Directory of team files (searched recursively for *.txt)")
+    parser.add_argument("--format", default="gen7ou")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Team service processes to run in parallel (default: CPU count)",
+    )
+    parser.add_argument("--batch-size", type=int, default=32, help="Teams per team service request")
+    parser.add_argument("--output", metavar="PATH", default=None, help="Write JSONL results here instead of stdout")
+    parser.add_argument(
+        "--summary",
+        metavar="PATH",
+        default=None,
+        help="Write the failure summary as JSON (default: <output>.summary.json; not written when results go to stdout)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the team cache")
+    parser.add_argument("--ps-path", default="pokemon-showdown", help="Path to the pokemon-showdown checkout")
+    args = parser.parse_args(argv)
+
+    paths = find_team_files(args.directory)
+    if not paths:
+        print(f"No team files found in {args.directory}", file=sys.stderr)
+        return 1
+
+    validator = LibraryValidator(
+        args.format, args.ps_path, jobs=args.jobs, batch_size=args.batch_size, use_cache=not args.no_cache
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            summary = validator.run(paths, out)
+    else:
+        summary = validator.run(paths, sys.stdout)
+
+    summary_path = args.summary or (f"{args.output}.summary.json" if args.output else None)
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    print(
+        f"Validated {summary['total']} team(s) for {args.format} in {summary['seconds']}s: "
+        f"{summary['valid']} valid, {summary['invalid']} invalid, {summary['cached']} from cache",
+        file=sys.stderr,
+    )
+    for kind, failures in summary["failures_by_type"].items():
+        print(f"  {kind}: {failures['count']}", file=sys.stderr)
+    if summary_path:
+        print(f"Summary written to {summary_path}", file=sys.stderr)
+    return 0 if summary["invalid"] == 0 else 2
@@ -0,0 +1,25 @@
+import asyncio
+
+from async_showdown import MAX_QUEUED_BLOCKS, AsyncShowdownWrapper
+
+
+def test_overflow_keeps_requests_errors_and_end():
+    async def run():
+        sim = AsyncShowdownWrapper()
+        sim._dispatch(["sideupdate\n", "p1\n", '|request|{"rqid":1}\n', "\n"])
+        sim._dispatch(["sideupdate\n", "p2\n", "|error|[Invalid choice]\n", "\n"])
+        for turn in range(MAX_QUEUED_BLOCKS * 2):
+            sim._dispatch(["update\n", f"|turn|{turn}\n", "\n"])
+        sim._dispatch(["update\n", "|win|P1\n", "\n"])
+        sim._dispatch(["end\n", "{}\n", "\n"])
+        sim._enqueue(None)
+        return [block async for block in sim], sim
+
+    blocks, sim = asyncio.run(run())
+    kinds = [block[0].strip() for block in blocks]
+    assert kinds[:2] == ["sideupdate", "sideupdate"]
+    assert blocks[-2][1] == "|win|P1\n"
+    assert kinds[-1] == "end"
+    assert len(blocks) <= MAX_QUEUED_BLOCKS + 1
+    assert sim.dropped_blocks > 0
+    assert sim.requests["p1"] == {"rqid": 1}
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import random_team_pool
+from random_team_pool import RandomTeamPool
+
+
+class FakeTeamService:
+    """Stands in for team_service.js: ``gen9bad`` never generates."""
+
+    calls = []
+    lock = threading.Lock()
+
+    def __init__(self, ps_path):
+        pass
+
+    def alive(self):
+        return True
+
+    def generate(self, formatid, count):
+        with self.lock:
+            self.calls.append(formatid)
+        if formatid == "gen9bad":
+            raise RuntimeError(f"Unknown format {formatid}")
+        return [f"{formatid}-team"] * count
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeTeamService.calls = []
+    monkeypatch.setattr(random_team_pool, "TeamService", FakeTeamService)
+    pool = RandomTeamPool(target=2, low_water=0)
+    yield pool
+    pool.close()
+
+
+def test_failing_format_does_not_starve_others(pool):
+    with pytest.raises(RuntimeError, match="Unknown format"):
+        pool.get("gen9bad", timeout=5)
+    assert pool.get("gen9randombattle", timeout=5) == "gen9randombattle-team"
+    assert pool.get("gen9randombattle", timeout=5) == "gen9randombattle-team"
+    # The failed format is only retried when someone asks for it again
+    assert FakeTeamService.calls.count("gen9bad") == 1
+    with pytest.raises(RuntimeError):
+        pool.get("gen9bad", timeout=5)
+    assert FakeTeamService.calls.count("gen9bad") == 2
+
+
+def test_formats_are_refilled_round_robin(pool):
+    for formatid in ("gen9randombattle", "gen8randombattle", "gen7randombattle"):
+        pool.warm(formatid)
+    for formatid in ("gen9randombattle", "gen8randombattle", "gen7randombattle"):
+        assert pool.get(formatid, timeout=5) == f"{formatid}-team"
+
+
+def test_is_random_format():
+    assert random_team_pool.is_random_format("gen9randombattle")
+    assert not random_team_pool.is_random_format("gen9ou")